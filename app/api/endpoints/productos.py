@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.core.database import get_db
 from app.services.producto_service import ProductoService
-from app.schemas.producto import ProductoResponse, ComparacionProducto
+from app.schemas.producto import ProductoResponse, ComparacionProducto, PrecioHistorialResponse
 
 router = APIRouter()
 
@@ -45,6 +45,16 @@ async def obtener_producto(
     return producto
 
 
+@router.get("/productos/{producto_id}/historial", response_model=List[PrecioHistorialResponse])
+async def historial_precios(
+    producto_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    service: ProductoService = Depends(get_service)
+):
+    """Historial de cambios de precio de un producto"""
+    return await service.get_historial(producto_id, limit)
+
+
 @router.get("/productos/buscar/{termino}", response_model=List[ProductoResponse])
 async def buscar_productos(
     termino: str,
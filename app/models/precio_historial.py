@@ -0,0 +1,29 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Index, DECIMAL, PrimaryKeyConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class PrecioHistorial(Base):
+    """Historial append-only de precios: una fila solo cuando el precio cambia
+    
+    Tabla angosta separada de productos: las consultas de series de tiempo usan
+    el indice clustered (producto_id, fecha_observacion) sin tocar la tabla ancha
+    con URLs de 2000 caracteres. No tiene FK a productos para que la limpieza
+    de productos antiguos no quede bloqueada por el historial.
+    """
+    __tablename__ = "precio_historial"
+    
+    __table_args__ = (
+        PrimaryKeyConstraint('id', mssql_clustered=False),
+        Index('idx_historial_producto_fecha', 'producto_id', 'fecha_observacion', mssql_clustered=True),
+        {'schema': 'Hardos'},
+    )
+    
+    id = Column(BigInteger, autoincrement=True)
+    producto_id = Column(Integer, nullable=False)
+    supermercado = Column(String(100), nullable=False)
+    precio = Column(DECIMAL(10, 2), nullable=False)
+    descuento_porcentaje = Column(DECIMAL(5, 2), nullable=True)
+    fecha_observacion = Column(DateTime, nullable=False, server_default=func.getdate())
+    
+    def __repr__(self):
+        return f"<PrecioHistorial(producto_id={self.producto_id}, precio={self.precio}, fecha={self.fecha_observacion})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Index, DECIMAL
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index, DECIMAL
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -26,6 +26,13 @@ class Producto(Base):
     url = Column(String(2000))
     imagen_url = Column(String(2000))
     
+    # Identificadores de la tienda (APIs VTEX/FastStore); null si el spider no los tiene
+    sku = Column(String(50), nullable=True)
+    ean = Column(String(20), nullable=True)
+    
+    # Hash de precio, descuento, presentacion, urls y sku/ean: si no cambia no se reescribe la fila
+    hash_contenido = Column(BigInteger, nullable=True)
+    
     fecha_extraccion = Column(DateTime, server_default=func.getdate())
     fecha_actualizacion = Column(DateTime, onupdate=func.getdate())
     
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 
 from app.models.producto import Producto
+from app.models.precio_historial import PrecioHistorial
 
 
 class ProductoRepository:
@@ -131,4 +132,17 @@ class ProductoRepository:
             )
         )
         result = await self.db.execute(query)
-        return result.scalar() > 0
\ No newline at end of file
+        return result.scalar() > 0
+    
+    async def get_historial(
+        self,
+        producto_id: int,
+        limit: int = 100
+    ) -> List[PrecioHistorial]:
+        """Obtener historial de precios de un producto (mas reciente primero)"""
+        query = select(PrecioHistorial).where(
+            PrecioHistorial.producto_id == producto_id
+        ).order_by(PrecioHistorial.fecha_observacion.desc()).limit(limit)
+        
+        result = await self.db.execute(query)
+        return result.scalars().all()
\ No newline at end of file
@@ -13,6 +13,8 @@ class ProductoBase(BaseModel):
     descuento_porcentaje: Optional[float] = None
     url: Optional[str] = None
     imagen_url: Optional[str] = None
+    sku: Optional[str] = Field(None, max_length=50)
+    ean: Optional[str] = Field(None, max_length=20)
 
 class ProductoCreate(ProductoBase):
     pass
@@ -30,6 +32,16 @@ class ProductoResponse(ProductoBase):
     class Config:
         from_attributes = True
 
+class PrecioHistorialResponse(BaseModel):
+    producto_id: int
+    supermercado: str
+    precio: float
+    descuento_porcentaje: Optional[float] = None
+    fecha_observacion: datetime
+    
+    class Config:
+        from_attributes = True
+
 class ComparacionProducto(BaseModel):
     nombre: str
     mejor_precio: float
@@ -76,6 +76,10 @@ class ProductoService:
             precios_por_supermercado=precios_por_super
         )
     
+    async def get_historial(self, producto_id: int, limit: int = 100):
+        """Obtener historial de precios de un producto"""
+        return await self.repository.get_historial(producto_id, limit)
+    
     async def get_supermercados(self) -> List[str]:
         """Obtener lista de supermercados"""
         return await self.repository.get_supermercados()
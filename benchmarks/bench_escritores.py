@@ -0,0 +1,127 @@
+"""Benchmark de SQLServerSink con 1..N escritores en paralelo
+
+Uso (desde la raiz del repo):
+    python benchmarks/bench_escritores.py                  # SQL Server simulado
+    python benchmarks/bench_escritores.py --real           # usa DATABASE_URL (escribe en Hardos.productos)
+    python benchmarks/bench_escritores.py --escritores 1 2 4 8 --items 20000
+
+El modo simulado reemplaza el engine por uno que espera `--latencia-ms` por
+sentencia (red) mas `--ms-por-fila` por cada fila del VALUES (trabajo del
+servidor), suficiente para ver como escala el paralelismo sin una base de datos. Los productos se generan con un supermercado propio del
+benchmark para no mezclarse con datos reales.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrappers.precio_scrapers.pipelines import preparar_fila  # noqa: E402
+from scrappers.precio_scrapers.sinks import SQLServerSink  # noqa: E402
+
+
+class _ResultadoSimulado:
+    def __init__(self, filas=()):
+        self._filas = list(filas)
+
+    def fetchall(self):
+        return self._filas
+
+    def __iter__(self):
+        return iter(self._filas)
+
+
+class ConexionSimulada:
+    def __init__(self, latencia, por_fila):
+        self.latencia = latencia
+        self.por_fila = por_fila
+        self.siguiente_id = 0
+
+    def execute(self, sentencia, params=None):
+        sql = getattr(sentencia, 'text', '')
+        filas_values = sql.count('(:')
+        time.sleep(self.latencia + filas_values * self.por_fila)
+        if 'OUTPUT INSERTED.id' in sql:
+            # Devuelve una fila por cada tupla del VALUES, como SQL Server
+            filas = []
+            for i in range(sum(clave.startswith('supermercado_') for clave in params)):
+                self.siguiente_id += 1
+                filas.append((self.siguiente_id, params[f'supermercado_{i}'], params[f'nombre_{i}'],
+                              params[f'precio_actual_{i}'], params[f'descuento_{i}'],
+                              params[f'hash_contenido_{i}']))
+            return _ResultadoSimulado(filas)
+        return _ResultadoSimulado()
+
+
+class EngineSimulado:
+    def __init__(self, latencia, por_fila):
+        self.latencia = latencia
+        self.por_fila = por_fila
+
+    @contextmanager
+    def begin(self):
+        time.sleep(self.latencia)  # BEGIN/COMMIT
+        yield ConexionSimulada(self.latencia, self.por_fila)
+
+    connect = begin
+
+    def dispose(self):
+        pass
+
+
+def generar_items(total, supermercado):
+    return [
+        preparar_fila({
+            'supermercado': supermercado,
+            'nombre': f"Producto benchmark {i}",
+            'precio_actual': 1000 + i % 500,
+            'url': f"https://benchmark.local/p/{i}",
+        })
+        for i in range(total)
+    ]
+
+
+def medir(escritores, filas, batch_size, latencia, por_fila, real):
+    sink = SQLServerSink(escritores=escritores)
+    if not real:
+        sink.engine = EngineSimulado(latencia, por_fila)
+    inicio = time.perf_counter()
+    for i in range(0, len(filas), batch_size):
+        resumen = sink.escribir(filas[i:i + batch_size])
+        if resumen.get('lotes_fallidos'):
+            raise SystemExit(f"Fallo un lote - revisar el spool en {sink.spool_dir}/")
+    duracion = time.perf_counter() - inicio
+    if sink.pool_escritores is not None:
+        sink.pool_escritores.shutdown()
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escritores', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--latencia-ms', type=float, default=20.0)
+    parser.add_argument('--ms-por-fila', type=float, default=0.2)
+    parser.add_argument('--real', action='store_true')
+    args = parser.parse_args()
+    if not args.real:
+        # Sin DATABASE_URL el sink no intenta crear un engine de pyodbc
+        os.environ['DATABASE_URL'] = ''
+        logging.getLogger('scrappers').setLevel(logging.ERROR)
+
+    print(f"{'escritores':>10} {'segundos':>10} {'items/s':>10} {'speedup':>8}")
+    base = None
+    for n in args.escritores:
+        # Supermercado distinto por corrida: todas miden inserciones, no updates
+        filas = generar_items(args.items, f"Benchmark-{n}")
+        duracion = medir(n, filas, args.batch_size, args.latencia_ms / 1000, args.ms_por_fila / 1000, args.real)
+        base = base or duracion
+        print(f"{n:>10} {duracion:>10.2f} {args.items / duracion:>10.0f} {base / duracion:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark de extraccion: productos por segundo por tienda y backend
+
+Uso (desde la raiz del repo):
+    python benchmarks/bench_extraccion.py
+    python benchmarks/bench_extraccion.py --repeticiones 200
+
+Usa las paginas guardadas en scrappers/precio_scrapers/*_page.html (Exito y D1
+no tienen pagina guardada). "parsel" es la forma anterior: una cadena de
+.css().get() por campo y por producto.
+
+- extraccion: productos/s sobre una pagina ya parseada (en Scrapy parsel la
+  parsea una vez por respuesta, con o sin el motor de extraccion)
+- pagina: productos/s parseando el HTML desde cero en cada repeticion; aqui
+  es donde selectolax puede ganar
+"""
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'scrappers'))
+
+from parsel import Selector  # noqa: E402
+
+from precio_scrapers.extraccion import backend_disponible  # noqa: E402
+from precio_scrapers.spiders.carulla_spider import CarullaSpider  # noqa: E402
+from precio_scrapers.spiders.mercar_spider import MercarSpider  # noqa: E402
+from precio_scrapers.spiders.surtifamiliar_spider import SurtifamiliarSpider  # noqa: E402
+
+PAGINAS = {
+    'carulla': (CarullaSpider, 'carulla_page.html'),
+    'mercar': (MercarSpider, 'mercar_page.html'),
+    'surtifamiliar': (SurtifamiliarSpider, 'surtifamiliar_page.html'),
+}
+
+
+def extraer_con_parsel(espec, documento):
+    """Extraccion anterior: parsel evalua cada selector CSS desde cero en cada llamada"""
+    if isinstance(documento, str):
+        documento = Selector(text=documento)
+    productos = []
+    for css in espec.contenedor:
+        productos = documento.css(css)
+        if productos:
+            break
+    filas = []
+    for producto in productos:
+        fila = {}
+        for nombre, selectores in espec.campos.items():
+            valor = None
+            for css in selectores:
+                valor = producto.css(css).get() if '::' in css else ''.join(producto.css(css).xpath('.//text()').getall())
+                if valor:
+                    break
+            fila[nombre] = valor
+        filas.append(fila)
+    return filas
+
+
+def medir(extraer, documento, repeticiones):
+    productos = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        productos += len(extraer(documento))
+    return productos / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=100)
+    args = parser.parse_args()
+
+    backends = ['lxml'] + (['selectolax'] if backend_disponible('selectolax') == 'selectolax' else [])
+    print(f"{'tienda':>14} {'productos':>9} {'backend':>11} {'extraccion/s':>13} {'speedup':>8} "
+          f"{'pagina/s':>10} {'speedup':>8}")
+    for tienda, (spider, archivo) in PAGINAS.items():
+        with open(os.path.join(RAIZ, 'scrappers', 'precio_scrapers', archivo), encoding='utf-8') as f:
+            html = f.read()
+        parseado = Selector(text=html)
+        espec = spider.ESPEC
+        total = len(espec.extraer(html))
+
+        base_extraccion = medir(lambda d: extraer_con_parsel(espec, d), parseado, args.repeticiones)
+        base_pagina = medir(lambda d: extraer_con_parsel(espec, d), html, args.repeticiones)
+        print(f"{tienda:>14} {total:>9} {'parsel':>11} {base_extraccion:>13.0f} {1:>7.2f}x "
+              f"{base_pagina:>10.0f} {1:>7.2f}x")
+        for backend in backends:
+            # selectolax no reutiliza el arbol de parsel: siempre parsea
+            documento = parseado if backend == 'lxml' else html
+            extraccion = medir(lambda d: espec.extraer(d, backend), documento, args.repeticiones)
+            pagina = medir(lambda d: espec.extraer(d, backend), html, args.repeticiones)
+            print(f"{tienda:>14} {total:>9} {backend:>11} {extraccion:>13.0f} {extraccion / base_extraccion:>7.2f}x "
+                  f"{pagina:>10.0f} {pagina / base_pagina:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
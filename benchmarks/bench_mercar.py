@@ -0,0 +1,91 @@
+"""Benchmark de Mercar: Store API de WooCommerce contra paginas con Playwright
+
+Uso (desde la raiz del repo, con red y Chromium instalado):
+    python benchmarks/bench_mercar.py
+    python benchmarks/bench_mercar.py --categorias 3 --modos api navegador
+
+Corre el spider mercar una vez por modo (cada uno en su propio proceso, el
+reactor de Twisted no se puede reiniciar) sobre las primeras --categorias
+categorias, sin pipelines, y compara el tiempo de reloj, los productos y las
+peticiones. El modo "navegador" es WOOCOMMERCE_API_ENABLED=False.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPPERS = os.path.join(RAIZ, 'scrappers')
+
+
+def correr(modo, categorias):
+    """Crawl de un modo en este proceso; imprime una linea JSON con el resultado"""
+    sys.path.insert(0, SCRAPPERS)
+    os.chdir(SCRAPPERS)
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'precio_scrapers.settings')
+
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from precio_scrapers.spiders.mercar_spider import MercarSpider
+
+    class MercarBench(MercarSpider):
+        CATEGORIAS = MercarSpider.CATEGORIAS[:categorias]
+
+        # Scrapy >= 2.13 arranca desde start()
+        async def start(self):
+            for request in self.start_requests():
+                yield request
+
+    settings = get_project_settings()
+    settings.setdict({
+        'WOOCOMMERCE_API_ENABLED': modo == 'api',
+        'ITEM_PIPELINES': {},
+        'LOG_LEVEL': 'WARNING',
+    }, priority='cmdline')
+    proceso = CrawlerProcess(settings)
+    crawler = proceso.create_crawler(MercarBench)
+    proceso.crawl(crawler)
+    inicio = time.monotonic()
+    proceso.start()
+    stats = crawler.stats.get_stats()
+    print(json.dumps({
+        'modo': modo,
+        'segundos': time.monotonic() - inicio,
+        'productos': stats.get('item_scraped_count', 0),
+        'peticiones': stats.get('downloader/request_count', 0),
+        'fallback': stats.get('woocommerce/fallback_playwright', 0),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categorias', type=int, default=2)
+    parser.add_argument('--modos', nargs='+', choices=['api', 'navegador'], default=['api', 'navegador'])
+    parser.add_argument('--correr', choices=['api', 'navegador'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.correr:
+        correr(args.correr, args.categorias)
+        return
+
+    resultados = []
+    for modo in args.modos:
+        salida = subprocess.run(
+            [sys.executable, __file__, '--correr', modo, '--categorias', str(args.categorias)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        resultados.append(json.loads(salida.strip().splitlines()[-1]))
+
+    base = resultados[-1]['segundos']
+    print(f"{'modo':>10} {'segundos':>9} {'productos':>9} {'peticiones':>10} {'productos/s':>11} "
+          f"{'fallback':>8} {'speedup':>8}")
+    for r in resultados:
+        print(f"{r['modo']:>10} {r['segundos']:>9.1f} {r['productos']:>9} {r['peticiones']:>10} "
+              f"{r['productos'] / r['segundos']:>11.1f} {r['fallback']:>8} {base / r['segundos']:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark de parseo sobre una grabacion (GRABACION_MODO="reproducir")
+
+Uso (desde la raiz del repo):
+    # una vez, con red y Chromium instalado
+    cd scrappers && scrapy crawl carulla -s GRABACION_MODO=grabar
+    # despues, sin red ni navegador
+    python benchmarks/bench_reproduccion.py carulla
+    python benchmarks/bench_reproduccion.py carulla mercar --repeticiones 5
+
+Corre el spider sobre sus respuestas grabadas (cada repeticion en su propio
+proceso, el reactor de Twisted no se puede reiniciar), sin pipelines, y mide el
+tiempo de reloj, los productos y las respuestas reproducidas. Las peticiones
+que no estan en la grabacion se descartan (columna "faltan"). La grabacion
+guarda tambien el JSON capturado en el navegador (CAPTURA_JSON_ENABLED), asi
+Exito, Carulla y D1 se miden por el mismo camino que en vivo ("capturas" es el
+numero de paginas leidas de ese JSON).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPPERS = os.path.join(RAIZ, 'scrappers')
+
+
+def correr(nombre):
+    """Reproduce un spider en este proceso; imprime una linea JSON con el resultado"""
+    sys.path.insert(0, SCRAPPERS)
+    os.chdir(SCRAPPERS)
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'precio_scrapers.settings')
+
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.spiderloader import SpiderLoader
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.setdict({
+        'GRABACION_MODO': 'reproducir',
+        'ITEM_PIPELINES': {},
+        'LOG_LEVEL': 'WARNING',
+    }, priority='cmdline')
+    spidercls = SpiderLoader.from_settings(settings).load(nombre)
+
+    class Reproduccion(spidercls):
+        # Scrapy >= 2.13 arranca desde start()
+        async def start(self):
+            for request in self.start_requests():
+                yield request
+
+    proceso = CrawlerProcess(settings)
+    crawler = proceso.create_crawler(Reproduccion)
+    proceso.crawl(crawler)
+    inicio = time.monotonic()
+    proceso.start()
+    stats = crawler.stats.get_stats()
+    print(json.dumps({
+        'segundos': time.monotonic() - inicio,
+        'productos': stats.get('item_scraped_count', 0),
+        'respuestas': stats.get('httpcache/hit', 0),
+        'faltan': stats.get('httpcache/ignore', 0),
+        'capturas': stats.get('captura/paginas', 0),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spiders', nargs='+')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--correr', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.correr:
+        correr(args.correr)
+        return
+
+    print(f"{'spider':>14} {'segundos':>9} {'productos':>9} {'respuestas':>10} {'faltan':>6} {'capturas':>8} "
+          f"{'productos/s':>11}")
+    for nombre in args.spiders:
+        corridas = []
+        for _ in range(args.repeticiones):
+            salida = subprocess.run(
+                [sys.executable, __file__, nombre, '--correr', nombre],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            corridas.append(json.loads(salida.strip().splitlines()[-1]))
+        segundos = statistics.median(c['segundos'] for c in corridas)
+        r = corridas[-1]
+        print(f"{nombre:>14} {segundos:>9.2f} {r['productos']:>9} {r['respuestas']:>10} {r['faltan']:>6} "
+              f"{r['capturas']:>8} {r['productos'] / segundos:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import productos
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.models import precio_historial  # noqa: F401 - registra la tabla para create_all
 from app.middleware.rate_limit import rate_limit_middleware
 import logging
 
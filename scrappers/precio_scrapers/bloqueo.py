@@ -0,0 +1,85 @@
+import logging
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class BloqueoRecursos:
+    """Predicado para PLAYWRIGHT_ABORT_REQUEST: descarta recursos que los parsers no usan
+
+    Bloquea por tipo de recurso de Playwright (image, font, media, ...) y por
+    dominio (incluye subdominios). Una peticion bloqueada no se descarga, asi que
+    los bytes ahorrados se estiman con el tamano medio por tipo de `bytes_por_tipo`.
+    """
+
+    def __init__(self, tipos=(), dominios=(), bytes_por_tipo=None, stats=None):
+        self.tipos = frozenset(tipos)
+        self.dominios = tuple(d.lower().lstrip('.') for d in dominios)
+        self.bytes_por_tipo = bytes_por_tipo or {}
+        self.stats = stats
+        self._hosts = {}
+
+    @classmethod
+    def from_settings(cls, settings, stats=None):
+        return cls(
+            tipos=settings.getlist('BLOQUEO_TIPOS'),
+            dominios=settings.getlist('BLOQUEO_DOMINIOS') + settings.getlist('BLOQUEO_DOMINIOS_TIENDA'),
+            bytes_por_tipo=settings.getdict('BLOQUEO_BYTES_POR_TIPO'),
+            stats=stats,
+        )
+
+    def dominio_bloqueado(self, url):
+        """Entrada de la lista que cubre el host de la URL, o None"""
+        host = urlsplit(url).hostname or ''
+        if host not in self._hosts:
+            self._hosts[host] = next(
+                (d for d in self.dominios if host == d or host.endswith(f'.{d}')), None
+            )
+        return self._hosts[host]
+
+    def __call__(self, request):
+        tipo = request.resource_type
+        if tipo in self.tipos:
+            motivo = f'tipo/{tipo}'
+        else:
+            dominio = self.dominio_bloqueado(request.url)
+            if dominio is None:
+                return False
+            motivo = f'dominio/{dominio}'
+        if self.stats is not None:
+            self.stats.inc_value('bloqueo/peticiones')
+            self.stats.inc_value(f'bloqueo/{motivo}')
+            self.stats.inc_value('bloqueo/bytes_estimados', self.bytes_por_tipo.get(tipo, 0))
+        return True
+
+
+class BloqueoRecursosAddon:
+    """Instala BloqueoRecursos como PLAYWRIGHT_ABORT_REQUEST con los BLOQUEO_* del spider
+
+    Si PLAYWRIGHT_ABORT_REQUEST ya esta definido no lo reemplaza.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.bloqueo = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('BLOQUEO_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def update_settings(self, settings):
+        if settings.get('PLAYWRIGHT_ABORT_REQUEST'):
+            logger.info("PLAYWRIGHT_ABORT_REQUEST ya esta definido - no se instala el bloqueo de recursos")
+            return
+        self.bloqueo = BloqueoRecursos.from_settings(settings)
+        settings.set('PLAYWRIGHT_ABORT_REQUEST', self.bloqueo, priority='addon')
+        # Las stats del crawler se crean despues de los addons
+        self.crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+    
+    def spider_opened(self, spider):
+        self.bloqueo.stats = self.crawler.stats
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+
+from scrapy_playwright.page import PageMethod
+
+from .vtex import productos_vtex
+
+logger = logging.getLogger(__name__)
+
+# Llamadas con las que las tiendas VTEX llenan la grilla de productos
+PATRONES_VTEX = (
+    '/api/graphql',  # FastStore (Exito, Carulla)
+    'productSearch',  # VTEX IO (store-framework)
+    '/intelligent-search/product_search',
+    '/api/catalog_system/pub/products/search',
+)
+
+# Una respuesta JSON mas grande que esto no se lee (no es una pagina de productos)
+MAX_BYTES = 5 * 1024 * 1024
+
+
+class CapturaJson:
+    """Guarda el JSON de las llamadas XHR/fetch de una pagina de Playwright
+
+    Se registra como manejador del evento 'response' de la pagina
+    (playwright_page_event_handlers) y lee las respuestas cuya URL contiene alguno
+    de `patrones`, a medida que llegan durante la espera y el scroll. El
+    PageMethod de metodo() va al final de playwright_page_methods: espera a que
+    terminen de leerse antes de entregar la respuesta a Scrapy.
+    """
+
+    def __init__(self, patrones=PATRONES_VTEX):
+        self.patrones = tuple(patrones)
+        self.payloads = []
+        self.errores = 0
+        self._pendientes = set()
+
+    def __call__(self, response):
+        if response.request.resource_type not in ('xhr', 'fetch') or response.status != 200:
+            return
+        if not any(patron in response.url for patron in self.patrones):
+            return
+        tarea = asyncio.ensure_future(self._leer(response))
+        self._pendientes.add(tarea)
+        tarea.add_done_callback(self._pendientes.discard)
+
+    async def _leer(self, response):
+        try:
+            largo = (await response.all_headers()).get('content-length')
+            if largo and int(largo) > MAX_BYTES:
+                return
+            self.payloads.append(await response.json())
+        except Exception as e:
+            # Respuestas que no son JSON o cuyo cuerpo ya no esta disponible
+            self.errores += 1
+            logger.debug(f"No se pudo leer {response.url}: {e}")
+
+    async def esperar(self, page):
+        if self._pendientes:
+            await asyncio.gather(*self._pendientes, return_exceptions=True)
+        return {'capturas': len(self.payloads)}
+
+    def meta(self):
+        """Claves de request.meta que instalan la captura en la pagina
+
+        Sin navegador no hay XHR que capturar: la peticion no pasa por el
+        renderizado hibrido.
+        """
+        return {'playwright_page_event_handlers': {'response': self}, 'captura_json': self, 'hibrido': False}
+
+    def metodo(self):
+        return PageMethod(self.esperar)
+
+
+def productos_faststore(nodos):
+    """Productos de la API GraphQL de FastStore con las claves de productos_vtex"""
+    productos = []
+    for nodo in nodos:
+        ofertas = nodo.get('offers') or {}
+        oferta = (ofertas.get('offers') or [{}])[0]
+        precio = ofertas.get('lowPrice') or oferta.get('price')
+        nombre = (nodo.get('isVariantOf') or {}).get('name') or nodo.get('name')
+        if not nombre or not precio:
+            continue
+        imagenes = nodo.get('image') or []
+        slug = nodo.get('slug')
+        productos.append({
+            'nombre': nombre,
+            'marca': (nodo.get('brand') or {}).get('name') or None,
+            'precio': float(precio),
+            'precio_lista': float(oferta['listPrice']) if oferta.get('listPrice') else None,
+            'sku': nodo.get('sku') or None,
+            'ean': nodo.get('gtin') or None,
+            'imagen': imagenes[0].get('url') if imagenes else None,
+            'url': f'/{slug}/p' if slug else None,
+            'vendedor': (oferta.get('seller') or {}).get('identifier'),
+        })
+    return productos
+
+
+def _listas_de_productos(datos, profundidad=8):
+    """Listas de productos dentro de un payload, en formato catalogo VTEX o FastStore"""
+    if profundidad < 0:
+        return
+    if isinstance(datos, list):
+        primero = datos[0] if datos else None
+        if isinstance(primero, dict) and 'productName' in primero and 'items' in primero:
+            yield productos_vtex(datos)
+            return
+        if isinstance(primero, dict) and isinstance(primero.get('node'), dict) and 'offers' in primero['node']:
+            yield productos_faststore(arista['node'] for arista in datos if isinstance(arista, dict))
+            return
+        valores = datos
+    elif isinstance(datos, dict):
+        valores = datos.values()
+    else:
+        return
+    for valor in valores:
+        yield from _listas_de_productos(valor, profundidad - 1)
+
+
+def productos_capturados(payloads):
+    """Productos de todos los payloads capturados, sin repetidos (por URL o nombre)"""
+    productos, vistos = [], set()
+    for payload in payloads:
+        for lista in _listas_de_productos(payload):
+            for producto in lista:
+                clave = producto['url'] or producto['nombre']
+                if clave not in vistos:
+                    vistos.add(clave)
+                    productos.append(producto)
+    return productos
+
+
+class CapturaJsonMixin:
+    """Productos desde el JSON que la tienda pide al renderizar, con el DOM de respaldo
+
+    Con CAPTURA_JSON_ENABLED, meta_captura() instala un CapturaJson para las
+    llamadas de PATRONES_CAPTURA en la peticion de Playwright. En el callback,
+    productos_capturados(response) devuelve los productos de esos payloads (con
+    las claves de productos_vtex: precio de lista, marca, SKU, EAN) o una lista
+    vacia si no se vio ninguno, y el spider extrae del DOM como antes.
+    """
+
+    PATRONES_CAPTURA = PATRONES_VTEX
+
+    def meta_captura(self, metodos):
+        """playwright_page_methods (y la captura, si esta activa) para el meta de la peticion"""
+        if not self.settings.getbool('CAPTURA_JSON_ENABLED'):
+            return {'playwright_page_methods': metodos}
+        captura = CapturaJson(self.PATRONES_CAPTURA)
+        return {**captura.meta(), 'playwright_page_methods': [*metodos, captura.metodo()]}
+
+    def productos_capturados(self, response):
+        captura = response.meta.get('captura_json')
+        if captura is None:
+            return []
+        productos = productos_capturados(captura.payloads)
+        stats = self.crawler.stats
+        if productos:
+            stats.inc_value('captura/paginas')
+            stats.inc_value('captura/productos', len(productos))
+        else:
+            stats.inc_value('captura/fallback_dom')
+            self.logger.info(f"Sin JSON de productos ({len(captura.payloads)} capturas) - se extrae del DOM")
+        return productos
@@ -0,0 +1 @@
+# Comandos propios del proyecto (COMMANDS_MODULE en settings.py)
@@ -0,0 +1,59 @@
+import logging
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from ..sinks import SQLServerSink, resolver_database_url
+
+logger = logging.getLogger(__name__)
+
+
+class Command(ScrapyCommand):
+    """Carga en SQL Server un spool escrito mientras la BD no estaba disponible"""
+
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return "<archivo> [<archivo> ...]"
+
+    def short_desc(self):
+        return "Carga en SQL Server los productos guardados en un spool"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="filas por transaccion (por defecto INGESTION_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="no renombrar el spool a .cargado despues de cargarlo",
+        )
+
+    def run(self, args, opts):
+        if not args:
+            raise UsageError()
+
+        batch_size = opts.batch_size or self.settings.getint('INGESTION_BATCH_SIZE', 500)
+        # Las filas se escriben directamente, sin staging
+        sink = SQLServerSink(modo='batch', database_url=resolver_database_url(self.settings))
+        if sink.engine is None or not sink._probar_conexion():
+            logger.error("SQL Server sigue sin responder - el spool no se modifica")
+            self.exitcode = 1
+            return
+
+        try:
+            for ruta in args:
+                try:
+                    total = sink.reproducir_spool(ruta, batch_size)
+                except Exception as e:
+                    logger.error(f"Error cargando {ruta}: {e} - el archivo se conserva")
+                    self.exitcode = 1
+                    continue
+                logger.info(f"{ruta}: {total} filas cargadas")
+                if not opts.keep:
+                    os.replace(ruta, f"{ruta}.cargado")
+        finally:
+            sink.engine.dispose()
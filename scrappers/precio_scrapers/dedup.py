@@ -0,0 +1,85 @@
+from array import array
+import hashlib
+import math
+from urllib.parse import urlsplit, urlunsplit
+
+from .key_index import clave_producto
+
+
+def normalizar_url(url):
+    """URL canonica de un producto: esquema y host en minusculas, sin query, fragmento ni '/' final"""
+    partes = urlsplit(url.strip())
+    ruta = partes.path.rstrip('/') or '/'
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), ruta, '', ''))
+
+
+def clave_item(item, campo='nombre'):
+    """Clave de deduplicacion: la URL normalizada o (supermercado, nombre)"""
+    if campo == 'url' and item.get('url'):
+        return normalizar_url(item['url'])
+    tienda, producto = clave_producto(item['supermercado'], item['nombre'])
+    return f"{tienda}\x00{producto}"
+
+
+def _digest(clave):
+    return hashlib.blake2b(clave.encode('utf-8'), digest_size=16).digest()
+
+
+class ConjuntoHashes:
+    """Conjunto exacto de claves guardadas como hashes de 64 bits
+
+    Ademas de la pertenencia recuerda la primera categoria de cada clave, para
+    informar que categorias se solapan.
+    """
+
+    def __init__(self):
+        self._categorias = {}
+        self._nombres = []
+        self._ids = {}
+
+    def agregar(self, clave, categoria=None):
+        """Registra la clave; devuelve (es_nueva, categoria de la primera vez)"""
+        hash_clave = int.from_bytes(_digest(clave)[:8], 'little')
+        primera = self._categorias.get(hash_clave)
+        if primera is not None:
+            return False, self._nombres[primera]
+        if categoria not in self._ids:
+            self._ids[categoria] = len(self._nombres)
+            self._nombres.append(categoria)
+        self._categorias[hash_clave] = self._ids[categoria]
+        return True, categoria
+
+    def __len__(self):
+        return len(self._categorias)
+
+
+class BloomFilter:
+    """Filtro de Bloom de tamano fijo (bits calculados para capacidad y error)
+
+    No guarda categorias y con probabilidad `error` descarta un item nuevo.
+    """
+
+    def __init__(self, capacidad=1_000_000, error=1e-6):
+        self.bits = max(8, int(-capacidad * math.log(error) / (math.log(2) ** 2)))
+        self.funciones = max(1, round(self.bits / capacidad * math.log(2)))
+        self._tabla = array('B', bytes((self.bits + 7) // 8))
+        self._total = 0
+
+    def agregar(self, clave, categoria=None):
+        # Doble hashing: h1 + i*h2 con las dos mitades de un digest de 128 bits
+        digest = _digest(clave)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        nueva = False
+        for i in range(self.funciones):
+            bit = (h1 + i * h2) % self.bits
+            byte, mascara = bit >> 3, 1 << (bit & 7)
+            if not self._tabla[byte] & mascara:
+                self._tabla[byte] |= mascara
+                nueva = True
+        if nueva:
+            self._total += 1
+        return nueva, None
+
+    def __len__(self):
+        return self._total
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from scrapy_playwright.page import PageMethod
+
+
+async def esperar_productos(page, selector=None, timeout_ms=30000, estable_ms=1000, intervalo_ms=250, scroll=True):
+    """Espera a que la pagina tenga productos en lugar de dormir un tiempo fijo
+
+    Con selector: espera a que aparezca y a que la cantidad de productos no cambie
+    durante `estable_ms` (con scroll al final en cada consulta, para el lazy
+    loading). Sin selector: espera a que la red quede inactiva. Nunca pasa de
+    `timeout_ms`; si se agota no falla, la pagina se procesa con lo que haya.
+
+    Devuelve {'espera_ms', 'productos', 'motivo'} con motivo 'estable',
+    'red_inactiva' o 'timeout'.
+    """
+    inicio = time.monotonic()
+    limite = inicio + timeout_ms / 1000
+
+    def resultado(productos, motivo):
+        return {'espera_ms': round((time.monotonic() - inicio) * 1000), 'productos': productos, 'motivo': motivo}
+
+    if selector is None:
+        try:
+            await page.wait_for_load_state('networkidle', timeout=timeout_ms)
+        except PlaywrightTimeoutError:
+            return resultado(None, 'timeout')
+        return resultado(None, 'red_inactiva')
+
+    try:
+        await page.wait_for_selector(selector, timeout=timeout_ms)
+    except PlaywrightTimeoutError:
+        return resultado(0, 'timeout')
+
+    anterior, desde = -1, time.monotonic()
+    while True:
+        if scroll:
+            await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+        productos = await page.locator(selector).count()
+        ahora = time.monotonic()
+        if productos != anterior:
+            anterior, desde = productos, ahora
+        elif (ahora - desde) * 1000 >= estable_ms:
+            return resultado(productos, 'estable')
+        if ahora >= limite:
+            return resultado(productos, 'timeout')
+        await asyncio.sleep(intervalo_ms / 1000)
+
+
+# Hay productos nuevos: mas coincidencias de `selector` que las `n` ya vistas
+_CRECIO = '([selector, n]) => document.querySelectorAll(selector).length > n'
+
+
+async def scroll_infinito(page, selector, timeout_ms=60000, pasos_sin_cambio=3, espera_ms=1000):
+    """Baja hasta el final mientras el scroll infinito siga trayendo productos
+
+    En cada paso hace scroll al final y espera hasta `espera_ms` a que aumente la
+    cantidad de `selector`; si aumenta antes sigue enseguida, sin dormir un tiempo
+    fijo. Termina cuando `pasos_sin_cambio` pasos seguidos no traen productos o al
+    llegar a `timeout_ms`.
+
+    Devuelve lo mismo que esperar_productos mas 'pasos': la cantidad de productos
+    despues de cada scroll.
+    """
+    inicio = time.monotonic()
+    limite = inicio + timeout_ms / 1000
+    pasos = []
+
+    def resultado(productos, motivo):
+        return {
+            'espera_ms': round((time.monotonic() - inicio) * 1000),
+            'productos': productos,
+            'motivo': motivo,
+            'pasos': pasos,
+        }
+
+    try:
+        await page.wait_for_selector(selector, timeout=timeout_ms)
+    except PlaywrightTimeoutError:
+        return resultado(0, 'timeout')
+
+    productos = await page.locator(selector).count()
+    sin_cambio = 0
+    while sin_cambio < pasos_sin_cambio:
+        restante_ms = (limite - time.monotonic()) * 1000
+        if restante_ms <= 0:
+            return resultado(productos, 'timeout')
+        await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+        try:
+            await page.wait_for_function(_CRECIO, arg=[selector, productos], timeout=min(espera_ms, restante_ms))
+        except PlaywrightTimeoutError:
+            pass
+        actual = await page.locator(selector).count()
+        sin_cambio = 0 if actual > productos else sin_cambio + 1
+        productos = actual
+        pasos.append(actual)
+    return resultado(productos, 'estable')
+
+
+def metodos_espera(selector=None, settings=None, scroll=True):
+    """playwright_page_methods que esperan a los productos con los limites de ESPERA_*"""
+    opciones = {}
+    if settings is not None:
+        opciones = {
+            'timeout_ms': settings.getint('ESPERA_TIMEOUT_MS', 30000),
+            'estable_ms': settings.getint('ESPERA_ESTABLE_MS', 1000),
+            'intervalo_ms': settings.getint('ESPERA_INTERVALO_MS', 250),
+        }
+    return [PageMethod(esperar_productos, selector, scroll=scroll, **opciones)]
+
+
+def metodos_scroll(selector, settings=None):
+    """playwright_page_methods de scroll_infinito con los limites de SCROLL_*"""
+    opciones = {}
+    if settings is not None:
+        opciones = {
+            'timeout_ms': settings.getint('SCROLL_TIMEOUT_MS', 60000),
+            'pasos_sin_cambio': settings.getint('SCROLL_PASOS_SIN_CAMBIO', 3),
+            'espera_ms': settings.getint('SCROLL_ESPERA_MS', 1000),
+        }
+    return [PageMethod(scroll_infinito, selector, **opciones)]
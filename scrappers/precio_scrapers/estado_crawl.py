@@ -0,0 +1,134 @@
+import hashlib
+import sqlite3
+import time
+import weakref
+
+from scrapy.exceptions import IgnoreRequest
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS categorias (
+    spider TEXT NOT NULL,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    hash_productos TEXT,
+    segundos REAL NOT NULL DEFAULT 0,
+    cambio REAL,
+    completo REAL,
+    PRIMARY KEY (spider, url)
+);
+"""
+
+_ESTADOS = weakref.WeakKeyDictionary()
+
+
+class SinCambios(IgnoreRequest):
+    """La primera pagina de la categoria respondio 304: no hay nada que procesar"""
+
+
+def pagina_de(meta):
+    """Numero de pagina de la peticion ('page' o 'pageNumber' segun el spider)"""
+    return meta.get('page', meta.get('pageNumber'))
+
+
+def huella_productos(items):
+    """Hash de la lista de productos (nombre y precio), sin importar el orden"""
+    filas = sorted(f"{item.get('nombre', '')}\x1f{item.get('precio_actual', '')}" for item in items)
+    return hashlib.blake2b('\x1e'.join(filas).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class EstadoCrawl:
+    """Huella de cada categoria entre crawls, en SQLite
+
+    Por (spider, URL de la primera pagina): ETag y Last-Modified de la respuesta,
+    hash de los productos de la primera pagina, cuando cambio por ultima vez, cuando
+    se recorrio completa y cuanto tardaron sus demas paginas (para estimar el
+    tiempo ahorrado al saltarla). Se lee al abrir el spider y se escribe al cerrar.
+    """
+
+    def __init__(self, ruta, max_dias=7):
+        self.ruta = ruta
+        self.max_edad = max_dias * 86400
+        self.spider = None
+        self.filas = {}
+        self.cambios = {}
+
+    @classmethod
+    def de_crawler(cls, crawler, ruta, max_dias=7):
+        """Un solo estado por crawler, compartido por los middlewares que lo usan"""
+        if crawler not in _ESTADOS:
+            _ESTADOS[crawler] = cls(ruta, max_dias)
+        return _ESTADOS[crawler]
+
+    def abrir(self, spider):
+        if self.spider == spider:
+            return
+        self.spider = spider
+        conn = sqlite3.connect(self.ruta)
+        try:
+            conn.executescript(ESQUEMA)
+            conn.row_factory = sqlite3.Row
+            self.filas = {
+                fila['url']: dict(fila)
+                for fila in conn.execute("SELECT * FROM categorias WHERE spider = ?", (spider,))
+            }
+        finally:
+            conn.close()
+
+    def fila(self, url):
+        return self.filas.get(url)
+
+    def vigente(self, url):
+        """La categoria se recorrio completa hace menos de max_dias"""
+        fila = self.filas.get(url)
+        return bool(fila and fila['completo'] and time.time() - fila['completo'] < self.max_edad)
+
+    def pendiente(self, url):
+        return self.cambios.setdefault(url, {'segundos': 0.0})
+
+    def registrar_validadores(self, url, etag, last_modified):
+        if etag or last_modified:
+            self.pendiente(url).update(etag=etag, last_modified=last_modified)
+
+    def registrar_huella(self, url, huella):
+        self.pendiente(url)['hash_productos'] = huella
+
+    def sumar_segundos(self, url, segundos):
+        self.pendiente(url)['segundos'] += segundos
+
+    def marcar_sin_cambios(self, url):
+        """Categoria saltada: conserva cuando se recorrio completa y cuanto tardo"""
+        self.pendiente(url)['sin_cambios'] = True
+
+    def guardar(self, completo=True):
+        """Escribe las categorias recorridas; con completo=False no se marcan como completas"""
+        if not self.cambios:
+            return
+        ahora = time.time()
+        conn = sqlite3.connect(self.ruta)
+        try:
+            with conn:
+                conn.executescript(ESQUEMA)
+                for url, cambios in self.cambios.items():
+                    anterior = self.filas.get(url) or {}
+                    recorrida = completo and not cambios.get('sin_cambios')
+                    huella = cambios.get('hash_productos', anterior.get('hash_productos'))
+                    conn.execute(
+                        """
+                        INSERT OR REPLACE INTO categorias
+                            (spider, url, etag, last_modified, hash_productos, segundos, cambio, completo)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            self.spider, url,
+                            cambios.get('etag', anterior.get('etag')),
+                            cambios.get('last_modified', anterior.get('last_modified')),
+                            huella,
+                            cambios['segundos'] if recorrida else anterior.get('segundos', 0),
+                            ahora if huella != anterior.get('hash_productos') else anterior.get('cambio'),
+                            ahora if recorrida else anterior.get('completo'),
+                        ),
+                    )
+        finally:
+            conn.close()
+        self.cambios = {}
@@ -0,0 +1,110 @@
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = {
+    None: '.jsonl',
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+}
+
+
+def _abrir_comprimido(crudo, compresion):
+    if compresion == 'gzip':
+        return gzip.GzipFile(fileobj=crudo, mode='wb')
+    if compresion == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(crudo, closefd=False)
+    return None
+
+
+class RotatingJSONLWriter:
+    """Escribe items como JSON Lines a medida que llegan, rotando archivos por tamano
+
+    Los archivos se llaman <nombre>-00001.jsonl[.gz|.zst] y <nombre>.index.json
+    registra cuantos items tiene cada uno; se reescribe en cada rotacion, asi
+    despues de una caida el indice describe todos los archivos ya cerrados.
+
+    Sin compresion cada item llega al disco al escribirse; comprimido, cada
+    `flush_items` items (vaciar el compresor por item empeora la compresion).
+    """
+
+    def __init__(self, directorio, nombre, compresion=None, max_bytes=64 * 1024 * 1024, flush_items=None):
+        if compresion not in EXTENSIONES:
+            raise ValueError(f"Compresion invalida: {compresion} (opciones: gzip, zstd)")
+        if compresion == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                logger.warning("zstandard no esta instalado - se usa gzip")
+                compresion = 'gzip'
+
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.nombre = nombre
+        self.compresion = compresion
+        self.max_bytes = max_bytes
+        self.flush_items = flush_items or (100 if compresion else 1)
+        self.archivos = []
+        self.total = 0
+        self._crudo = None
+        self._salida = None
+        self._items = 0
+
+    @property
+    def ruta_indice(self):
+        return os.path.join(self.directorio, f"{self.nombre}.index.json")
+
+    def escribir(self, item):
+        if self._crudo is None:
+            self._abrir()
+        linea = (json.dumps(item, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        (self._salida or self._crudo).write(linea)
+        self._items += 1
+        self.total += 1
+        if self._items % self.flush_items == 0:
+            self.flush()
+        # Con compresion se mide lo que ya llego al disco, no el texto sin comprimir
+        if self._crudo.tell() >= self.max_bytes:
+            self._cerrar_archivo()
+
+    def flush(self):
+        """Lleva al disco lo escrito (el bloque comprimido queda legible hasta ese punto)"""
+        if self._crudo is None:
+            return
+        if self._salida is not None:
+            self._salida.flush()
+        self._crudo.flush()
+
+    def cerrar(self):
+        if self._crudo is not None:
+            self._cerrar_archivo()
+        else:
+            self._escribir_indice()
+
+    def _abrir(self):
+        numero = len(self.archivos) + 1
+        archivo = f"{self.nombre}-{numero:05d}{EXTENSIONES[self.compresion]}"
+        self._crudo = open(os.path.join(self.directorio, archivo), 'wb')
+        self._salida = _abrir_comprimido(self._crudo, self.compresion)
+        self._items = 0
+        self.archivos.append({'archivo': archivo, 'items': 0, 'bytes': 0})
+
+    def _cerrar_archivo(self):
+        if self._salida is not None:
+            self._salida.close()
+        self.archivos[-1]['items'] = self._items
+        self.archivos[-1]['bytes'] = self._crudo.tell()
+        self._crudo.close()
+        self._crudo = None
+        self._salida = None
+        self._escribir_indice()
+
+    def _escribir_indice(self):
+        temporal = f"{self.ruta_indice}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'total': self.total, 'archivos': self.archivos}, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta_indice)
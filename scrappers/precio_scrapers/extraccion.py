@@ -0,0 +1,130 @@
+from functools import lru_cache
+import logging
+import re
+
+from lxml import etree
+from parsel import Selector
+from parsel.csstranslator import HTMLTranslator
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('lxml', 'selectolax')
+
+_traductor = HTMLTranslator()
+_PSEUDO = re.compile(r'^(?P<css>.*?)(?:::text|::attr\((?P<atributo>[^)]+)\))?$')
+
+
+class EspecExtraccion:
+    """Contenedor de producto y campos de una tienda
+
+    Cada campo es un selector CSS o una tupla de selectores en orden de preferencia:
+    gana el primero con texto. Admiten ::text y ::attr(nombre) como en Scrapy; sin
+    pseudo-elemento se toma todo el texto del elemento. Los selectores se compilan
+    una vez por backend y se reutilizan en cada pagina.
+    """
+
+    def __init__(self, contenedor, campos):
+        self.contenedor = (contenedor,) if isinstance(contenedor, str) else tuple(contenedor)
+        self.campos = {
+            nombre: (selectores,) if isinstance(selectores, str) else tuple(selectores)
+            for nombre, selectores in campos.items()
+        }
+        self._compilados = {}
+
+    def compilar(self, backend='lxml'):
+        if backend not in self._compilados:
+            compilar = _compilar_lxml if backend == 'lxml' else _compilar_selectolax
+            self._compilados[backend] = (
+                [compilar(css) for css in self.contenedor],
+                [(nombre, [compilar(css) for css in selectores]) for nombre, selectores in self.campos.items()],
+            )
+        return self._compilados[backend]
+
+    def extraer(self, documento, backend='lxml'):
+        """Devuelve un dict por producto con el texto crudo de cada campo (None si falta)
+
+        `documento` es una respuesta de Scrapy, un Selector de parsel o el HTML como texto.
+        """
+        backend = backend_disponible(backend)
+        contenedores, campos = self.compilar(backend)
+        if backend == 'lxml':
+            raiz, buscar, valores = _raiz_lxml(documento), _buscar_lxml, _valores_lxml
+        else:
+            raiz, buscar, valores = _raiz_selectolax(documento), _buscar_selectolax, _valores_selectolax
+
+        productos = []
+        for selector in contenedores:
+            productos = buscar(raiz, selector)
+            if productos:
+                break
+
+        filas = []
+        for producto in productos:
+            fila = {}
+            for nombre, selectores in campos:
+                fila[nombre] = None
+                for selector in selectores:
+                    valor = next((t for t in valores(producto, selector) if t.strip()), None)
+                    if valor is not None:
+                        fila[nombre] = valor
+                        break
+            filas.append(fila)
+        return filas
+
+
+@lru_cache(maxsize=None)
+def backend_disponible(backend):
+    """Valida el backend; sin selectolax instalado avisa una vez y usa lxml"""
+    if backend not in BACKENDS:
+        raise ValueError(f"EXTRACCION_BACKEND invalido: {backend} (opciones: {', '.join(BACKENDS)})")
+    if backend == 'selectolax':
+        try:
+            import selectolax.lexbor  # noqa: F401
+        except ImportError:
+            logger.warning("selectolax no esta instalado - se usa lxml")
+            return 'lxml'
+    return backend
+
+
+def _compilar_lxml(css):
+    return etree.XPath(_traductor.css_to_xpath(css), smart_strings=False)
+
+
+def _raiz_lxml(documento):
+    if isinstance(documento, str):
+        documento = Selector(text=documento)
+    # Respuesta de Scrapy o Selector: se reutiliza el arbol que ya parseo parsel
+    return getattr(documento, 'selector', documento).root
+
+
+def _buscar_lxml(raiz, xpath):
+    return xpath(raiz)
+
+
+def _valores_lxml(nodo, xpath):
+    return [r if isinstance(r, str) else ''.join(r.itertext()) for r in xpath(nodo)]
+
+
+def _compilar_selectolax(css):
+    partes = _PSEUDO.match(css.strip())
+    atributo = partes.group('atributo')
+    modo = 'atributo' if atributo else 'texto' if css.rstrip().endswith('::text') else 'nodo'
+    return partes.group('css').strip(), modo, atributo
+
+
+def _raiz_selectolax(documento):
+    from selectolax.lexbor import LexborHTMLParser
+    return LexborHTMLParser(documento if isinstance(documento, str) else documento.text)
+
+
+def _buscar_selectolax(raiz, selector):
+    return raiz.css(selector[0] or '*')
+
+
+def _valores_selectolax(nodo, selector):
+    css, modo, atributo = selector
+    # Sin CSS (p. ej. '::attr(data-precio)') el valor es del propio contenedor
+    nodos = nodo.css(css) if css else [nodo]
+    if modo == 'atributo':
+        return [n.attributes.get(atributo) or '' for n in nodos]
+    return [n.text(deep=modo == 'nodo') or '' for n in nodos]
@@ -0,0 +1,158 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.settings import SETTINGS_PRIORITIES
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+GRABAR = 'grabar'
+REPRODUCIR = 'reproducir'
+MODOS = (GRABAR, REPRODUCIR)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    huella TEXT PRIMARY KEY,
+    metodo TEXT NOT NULL,
+    url TEXT NOT NULL,
+    url_respuesta TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    cabeceras BLOB NOT NULL,
+    cuerpo BLOB NOT NULL,
+    fecha REAL NOT NULL,
+    capturas BLOB
+);
+"""
+
+
+def _comprimir(datos):
+    return gzip.compress(datos, compresslevel=6, mtime=0)
+
+
+class AlmacenGrabacion:
+    """HTTPCACHE_STORAGE de las grabaciones: un SQLite por spider en HTTPCACHE_DIR
+
+    Cada respuesta se guarda con su cuerpo comprimido con gzip, por huella de la
+    peticion (request_fingerprinter del crawler, la misma para la peticion por
+    HTTP y con Playwright). Con GRABACION_MODO="grabar" nunca devuelve lo
+    grabado: cada descarga reemplaza la anterior.
+    
+    Si la peticion lleva un CapturaJson (meta['captura_json']) tambien se graban
+    los JSON que capturo en el navegador, y al reproducir se devuelven a la
+    captura de la peticion: el spider toma el mismo camino que en vivo.
+    """
+
+    def __init__(self, settings):
+        self.directorio = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.solo_grabar = settings.get('GRABACION_MODO') == GRABAR
+        self.conn = None
+        self._fingerprinter = None
+
+    def ruta(self, spider):
+        return os.path.join(self.directorio, f'{spider.name}.sqlite')
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.conn = sqlite3.connect(self.ruta(spider))
+        self.conn.executescript(ESQUEMA)
+        # Grabaciones anteriores a la columna capturas
+        columnas = {fila[1] for fila in self.conn.execute("PRAGMA table_info(respuestas)")}
+        if 'capturas' not in columnas:
+            self.conn.execute("ALTER TABLE respuestas ADD COLUMN capturas BLOB")
+        total, = self.conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()
+        logger.info(f"Grabacion {self.ruta(spider)}: {total} respuestas")
+
+    def close_spider(self, spider):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def huella(self, request):
+        return self._fingerprinter.fingerprint(request).hex()
+
+    def retrieve_response(self, spider, request):
+        if self.solo_grabar:
+            return None
+        fila = self.conn.execute(
+            "SELECT url_respuesta, status, cabeceras, cuerpo, capturas FROM respuestas WHERE huella = ?",
+            (self.huella(request),),
+        ).fetchone()
+        if fila is None:
+            return None
+        url, status, cabeceras, cuerpo, capturas = fila
+        captura = request.meta.get('captura_json')
+        if captura is not None and capturas is not None:
+            captura.payloads.extend(json.loads(gzip.decompress(capturas)))
+        headers = Headers(headers_raw_to_dict(cabeceras))
+        body = gzip.decompress(cuerpo)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, status=status, headers=headers, body=body)
+
+    def store_response(self, spider, request, response):
+        captura = request.meta.get('captura_json')
+        capturas = _comprimir(json.dumps(captura.payloads).encode('utf-8')) if captura is not None else None
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.huella(request), request.method, request.url, response.url, response.status,
+                    headers_dict_to_raw(response.headers), _comprimir(response.body), time.time(), capturas,
+                ),
+            )
+
+
+class GrabacionAddon:
+    """Modo grabar/reproducir (GRABACION_MODO) sobre el HttpCacheMiddleware de Scrapy
+
+    "grabar": crawl normal (con Playwright) que guarda cada respuesta, con el
+    JSON capturado en el navegador, en GRABACION_DIR. "reproducir": sirve solo lo grabado, sin navegador ni red; lo
+    que no se grabo se descarta (httpcache/ignore). Los ajustes se aplican con la
+    prioridad con la que se definio GRABACION_MODO, asi `-s GRABACION_MODO=...`
+    tambien pisa los custom_settings de los spiders.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        modo = crawler.settings.get('GRABACION_MODO')
+        if not modo:
+            raise NotConfigured
+        if modo not in MODOS:
+            raise ValueError(f"GRABACION_MODO invalido: {modo} (opciones: {', '.join(MODOS)})")
+        return cls()
+
+    def update_settings(self, settings):
+        modo = settings.get('GRABACION_MODO')
+        ajustes = {
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_STORAGE': f'{__name__}.AlmacenGrabacion',
+            'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.DummyPolicy',
+            'HTTPCACHE_DIR': settings.get('GRABACION_DIR'),
+            'HTTPCACHE_EXPIRATION_SECS': 0,
+            # Los errores transitorios no se graban
+            'HTTPCACHE_IGNORE_HTTP_CODES': settings.getlist('RETRY_HTTP_CODES'),
+            # Se graban todas las paginas de cada categoria
+            'INCREMENTAL_ENABLED': False,
+        }
+        if modo == REPRODUCIR:
+            ajustes.update({
+                'HTTPCACHE_IGNORE_MISSING': True,
+                # La respuesta grabada ya es la renderizada: sin aprender decisiones ni abrir paginas
+                'HIBRIDO_ENABLED': False,
+                'PAGINAS_POOL_ENABLED': False,
+                'ROBOTSTXT_OBEY': False,
+                'AUTOTHROTTLE_ENABLED': False,
+                'DOWNLOAD_DELAY': 0,
+                'CONCURRENT_REQUESTS': 32,
+                'CONCURRENT_REQUESTS_PER_DOMAIN': 32,
+            })
+        prioridad = max(settings.getpriority('GRABACION_MODO'), SETTINGS_PRIORITIES['addon'])
+        settings.setdict(ajustes, priority=prioridad)
+        logger.info(f"Modo {modo}: respuestas en {data_path(ajustes['HTTPCACHE_DIR'])}")
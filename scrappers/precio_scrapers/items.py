@@ -3,8 +3,18 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+from datetime import datetime
+
 import scrapy
 
+# Formato de fecha_extraccion en todos los items (hora local, como GETDATE() en SQL Server)
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def fecha_extraccion():
+    """Momento actual para el campo fecha_extraccion de un item"""
+    return datetime.now().strftime(FORMATO_FECHA)
+
 
 class PrecioScrapersItem(scrapy.Item):
     # define the fields for your item here like:
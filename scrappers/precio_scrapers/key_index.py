@@ -0,0 +1,130 @@
+from array import array
+import hashlib
+import sys
+
+
+def clave_producto(supermercado, nombre):
+    """Clave (supermercado, nombre) con la misma igualdad que la collation de SQL Server
+
+    La collation por defecto no distingue mayusculas ni espacios finales.
+    """
+    return (supermercado.rstrip().lower(), nombre.rstrip().lower())
+
+
+def _hash_64(texto):
+    digest = hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def hash_producto(supermercado, nombre):
+    """Hash de 64 bits de la clave (supermercado, nombre)"""
+    tienda, producto = clave_producto(supermercado, nombre)
+    return _hash_64(f"{tienda}\x00{producto}")
+
+
+def _numero(valor):
+    return '' if valor is None else f"{float(valor):.2f}"
+
+
+def hash_contenido(precio_actual, descuento, presentacion, url, imagen_url, sku=None, ean=None):
+    """Hash de 64 bits (BIGINT) del contenido que cambia entre crawls
+
+    Si coincide con el guardado en Hardos.productos la fila no necesita escribirse.
+    sku y ean solo entran si vienen, asi las filas sin identificadores conservan
+    el hash que ya tenian.
+    """
+    partes = [_numero(precio_actual), _numero(descuento), presentacion or '', url or '', imagen_url or '']
+    if sku or ean:
+        partes += [sku or '', ean or '']
+    return _hash_64('\x1f'.join(partes))
+
+
+class ProductoKeyIndex:
+    """Mapa en memoria (nombre, supermercado) -> (id, precio_actual, hash_contenido)
+
+    Se carga una vez por supermercado y se mantiene al dia con cada escritura,
+    asi las comprobaciones de existencia y de cambio de precio no consultan la BD.
+    Para que ~50k productos ocupen poco, la clave es un hash de 64 bits y los
+    valores se guardan en arrays tipados en lugar de tuplas.
+    """
+
+    def __init__(self):
+        self._posiciones = {}
+        self._ids = array('q')
+        self._precios = array('d')
+        self._hashes = array('q')
+        self._supermercados = set()
+
+    @staticmethod
+    def _hash(supermercado, nombre):
+        return hash_producto(supermercado, nombre)
+
+    def cargado(self, supermercado):
+        return supermercado.rstrip().lower() in self._supermercados
+
+    def cargar(self, supermercado, filas):
+        """Registra las filas (id, nombre, precio_actual, hash_contenido) de un supermercado"""
+        self._supermercados.add(supermercado.rstrip().lower())
+        total = 0
+        for producto_id, nombre, precio, hash_fila in filas:
+            self.set(supermercado, nombre, producto_id, precio, hash_fila)
+            total += 1
+        return total
+
+    def get(self, supermercado, nombre):
+        """Devuelve (id, precio_actual, hash_contenido) o None si el producto no existe
+
+        Un hash_contenido desconocido (NULL en la BD) se devuelve como None.
+        """
+        posicion = self._posiciones.get(self._hash(supermercado, nombre))
+        if posicion is None:
+            return None
+        hash_fila = self._hashes[posicion]
+        return self._ids[posicion], self._precios[posicion], hash_fila or None
+
+    def set(self, supermercado, nombre, producto_id, precio, hash_fila=None):
+        clave = self._hash(supermercado, nombre)
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            self._posiciones[clave] = len(self._ids)
+            self._ids.append(producto_id)
+            self._precios.append(float(precio))
+            self._hashes.append(hash_fila or 0)
+        else:
+            self._ids[posicion] = producto_id
+            self._precios[posicion] = float(precio)
+            self._hashes[posicion] = hash_fila or 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def memoria_bytes(self):
+        """Tamano aproximado del indice en memoria"""
+        claves = sum(sys.getsizeof(clave) for clave in self._posiciones)
+        posiciones = sum(sys.getsizeof(posicion) for posicion in self._posiciones.values())
+        return (
+            sys.getsizeof(self._posiciones) + claves + posiciones
+            + self._ids.buffer_info()[1] * self._ids.itemsize
+            + self._precios.buffer_info()[1] * self._precios.itemsize
+            + self._hashes.buffer_info()[1] * self._hashes.itemsize
+        )
+
+
+def deduplicar_filas(filas):
+    """Deja una fila por producto; la ultima vista gana"""
+    unicas = {}
+    for fila in filas:
+        unicas[clave_producto(fila['supermercado'], fila['nombre'])] = fila
+    return list(unicas.values())
+
+
+def particionar_filas(filas, particiones):
+    """Reparte las filas en `particiones` grupos disjuntos por hash(supermercado, nombre)
+
+    Un mismo producto cae siempre en el mismo grupo, asi dos escritores nunca
+    tocan la misma fila.
+    """
+    grupos = [[] for _ in range(particiones)]
+    for fila in filas:
+        grupos[hash_producto(fila['supermercado'], fila['nombre']) % particiones].append(fila)
+    return grupos
@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango mas cercano; None si no hay valores"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicion = max(0, -(-len(ordenados) * p // 100) - 1)
+    return ordenados[int(posicion)]
+
+
+class MetricasIngestion:
+    """Acumula las metricas de un crawl: items, lotes, latencias y filas escritas"""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.items = 0
+        self.tamanos_lote = []
+        self.latencias_ms = []
+        self.filas = Counter()
+
+    def registrar_item(self):
+        self.items += 1
+
+    def registrar_lote(self, tamano, latencia_ms, resumen):
+        self.tamanos_lote.append(tamano)
+        self.latencias_ms.append(latencia_ms)
+        self.filas.update(resumen)
+
+    def resumen(self, round_trips=0):
+        duracion = time.monotonic() - self.inicio
+        return {
+            'duracion_s': round(duracion, 2),
+            'items': self.items,
+            'items_por_segundo': round(self.items / duracion, 2) if duracion > 0 else None,
+            'round_trips': round_trips,
+            'round_trips_por_item': round(round_trips / self.items, 4) if self.items else None,
+            'lotes': len(self.tamanos_lote),
+            'lote_promedio': round(sum(self.tamanos_lote) / len(self.tamanos_lote), 1) if self.tamanos_lote else None,
+            'lote_max': max(self.tamanos_lote, default=None),
+            'latencia_ms_p50': percentil(self.latencias_ms, 50),
+            'latencia_ms_p99': percentil(self.latencias_ms, 99),
+            'latencia_ms_max': max(self.latencias_ms, default=None),
+            'insertados': self.filas['insertados'],
+            'actualizados': self.filas['actualizados'],
+            'sin_cambios': self.filas['escrituras_evitadas'],
+        }
+
+
+def guardar_resumen(directorio, nombre, resumen):
+    """Escribe el resumen de la ejecucion como JSON y devuelve la ruta"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{nombre}_{time.strftime('%Y%m%d_%H%M%S')}_ingestion.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    return ruta
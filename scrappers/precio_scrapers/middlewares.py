@@ -3,11 +3,18 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import TextResponse
+from scrapy.utils.project import data_path
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from .estado_crawl import EstadoCrawl, SinCambios, huella_productos, pagina_de
+from .paginas import PoolPaginas
+from .renderizado import HTTP, NAVEGADOR, DecisionesRenderizado, patron_url
+
 
 class PrecioScrapersSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -98,3 +105,370 @@ class PrecioScrapersDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class EsperaStatsMiddleware:
+    """Registra cuanto espero cada pagina de Playwright hasta tener productos
+
+    Lee el resultado de esperar_productos o scroll_infinito (precio_scrapers.espera)
+    y lo deja en request.meta['espera'] y en las stats playwright/espera/* (y
+    playwright/scroll/* con los pasos del scroll).
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        for metodo in request.meta.get('playwright_page_methods') or ():
+            resultado = getattr(metodo, 'result', None)
+            if isinstance(resultado, dict) and 'espera_ms' in resultado:
+                self.registrar(request, resultado, spider)
+        return response
+
+    def registrar(self, request, resultado, spider):
+        request.meta['espera'] = resultado
+        self.stats.inc_value('playwright/espera/paginas')
+        self.stats.inc_value('playwright/espera/ms_total', resultado['espera_ms'])
+        self.stats.max_value('playwright/espera/ms_max', resultado['espera_ms'])
+        self.stats.inc_value(f"playwright/espera/{resultado['motivo']}")
+        pasos = resultado.get('pasos')
+        if pasos is not None:
+            self.stats.inc_value('playwright/scroll/paginas')
+            self.stats.inc_value('playwright/scroll/pasos', len(pasos))
+            self.stats.max_value('playwright/scroll/pasos_max', len(pasos))
+        spider.logger.debug(
+            f"Espera de {resultado['espera_ms']} ms ({resultado['motivo']}, "
+            f"{resultado['productos']} productos): {request.url}"
+        )
+
+
+class PoolPaginasMiddleware:
+    """Reutiliza las paginas de Playwright entre peticiones y garantiza que se cierren
+
+    Las peticiones con 'playwright' que no piden la pagina (playwright_include_page)
+    toman una del PoolPaginas y la devuelven al recibir la respuesta. Si la descarga
+    falla la pagina se cierra, tambien cuando el spider la habia pedido, antes de
+    llegar al errback. Publica las paginas y contextos vivos en playwright/pool/*.
+    """
+
+    def __init__(self, stats, pool):
+        self.stats = stats
+        self.pool = pool
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PAGINAS_POOL_ENABLED'):
+            raise NotConfigured
+        max_paginas = settings.getint('PLAYWRIGHT_MAX_PAGES_PER_CONTEXT') or settings.getint('CONCURRENT_REQUESTS')
+        return cls(crawler.stats, PoolPaginas(max_paginas, settings.getint('PAGINAS_MAX_USOS', 50)))
+
+    @staticmethod
+    def contexto(request):
+        return request.meta.get('playwright_context', 'default')
+
+    async def process_request(self, request, spider):
+        if not request.meta.get('playwright'):
+            return None
+        # Solo la primera vez: los reintentos copian el meta con playwright_include_page ya puesto
+        if request.meta.setdefault('pool_paginas', not request.meta.get('playwright_include_page')):
+            request.meta['playwright_include_page'] = True
+            pagina = await self.pool.tomar(self.contexto(request))
+            if pagina is not None:
+                request.meta['playwright_page'] = pagina
+                self.stats.inc_value('playwright/pool/reutilizadas')
+        return None
+
+    async def process_response(self, request, response, spider):
+        if request.meta.get('playwright') and request.meta.get('pool_paginas'):
+            pagina = request.meta.pop('playwright_page', None)
+            if pagina is None:
+                await self.pool.descartar(self.contexto(request))
+            else:
+                self.quitar_manejadores(request, pagina, spider)
+                self.publicar(pagina)
+                if not await self.pool.devolver(self.contexto(request), pagina):
+                    self.stats.inc_value('playwright/pool/recicladas')
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        if not request.meta.get('playwright'):
+            return None
+        pagina = request.meta.pop('playwright_page', None)
+        if request.meta.get('pool_paginas'):
+            await self.pool.descartar(self.contexto(request), pagina)
+        elif pagina is not None and not pagina.is_closed():
+            await pagina.close()
+        if pagina is not None:
+            self.stats.inc_value('playwright/pool/cerradas_por_error')
+        return None
+
+    @staticmethod
+    def quitar_manejadores(request, pagina, spider):
+        """Los playwright_page_event_handlers de la peticion no pasan a la siguiente"""
+        for evento, manejador in (request.meta.get('playwright_page_event_handlers') or {}).items():
+            if isinstance(manejador, str):
+                manejador = getattr(spider, manejador, None)
+            if manejador is not None:
+                pagina.remove_listener(evento, manejador)
+
+    def publicar(self, pagina):
+        self.stats.set_value('playwright/pool/libres', self.pool.total_libres())
+        navegador = pagina.context.browser
+        if navegador is None:
+            return
+        contextos = navegador.contexts
+        vivas = sum(len(contexto.pages) for contexto in contextos)
+        self.stats.set_value('playwright/pool/paginas_vivas', vivas)
+        self.stats.max_value('playwright/pool/paginas_vivas_max', vivas)
+        self.stats.set_value('playwright/pool/contextos_vivos', len(contextos))
+        self.stats.max_value('playwright/pool/contextos_vivos_max', len(contextos))
+
+
+class RenderizadoHibridoMiddleware:
+    """Descarga primero por HTTP y usa Playwright solo donde hace falta
+
+    Las peticiones con 'playwright' de spiders con PRODUCT_SELECTOR se piden sin
+    navegador, salvo que su patron de URL ya este marcado como 'navegador'. Si la
+    respuesta HTTP trae el selector se entrega al spider; si no, la peticion se
+    repite con Playwright y, cuando el navegador si encuentra productos, el patron
+    queda marcado. Las decisiones se guardan en HIBRIDO_CACHE_PATH entre ejecuciones.
+    Las peticiones con meta['hibrido'] = False (scroll, captura de JSON) van
+    siempre con el navegador.
+    """
+
+    ESCALADO = 'escalado'
+
+    def __init__(self, stats, ruta, ttl_dias=7):
+        self.stats = stats
+        self.ruta = ruta
+        self.ttl_dias = ttl_dias
+        self.decisiones = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('HIBRIDO_ENABLED'):
+            raise NotConfigured
+        ruta = settings.get('HIBRIDO_CACHE_PATH') or data_path('renderizado.json', createdir=True)
+        middleware = cls(crawler.stats, ruta, settings.getint('HIBRIDO_TTL_DIAS', 7))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.decisiones = DecisionesRenderizado(self.ruta, spider.name, self.ttl_dias).cargar()
+
+    def spider_closed(self, spider):
+        self.decisiones.guardar()
+
+    def process_request(self, request, spider):
+        meta = request.meta
+        # Reintentos, peticiones ya escaladas y las que solo sirven con navegador conservan su modo
+        if 'hibrido' in meta or not meta.get('playwright') or meta.get('playwright_include_page'):
+            return None
+        if not getattr(spider, 'PRODUCT_SELECTOR', None):
+            return None
+        if self.decisiones.modo(patron_url(request.url)) == NAVEGADOR:
+            meta['hibrido'] = NAVEGADOR
+            self.stats.inc_value('hibrido/navegador_aprendido')
+            return None
+        meta['hibrido'] = HTTP
+        meta['playwright'] = False
+        return None
+
+    def process_response(self, request, response, spider):
+        modo = request.meta.get('hibrido')
+        if modo not in (HTTP, self.ESCALADO):
+            return response
+        productos = (
+            response.status == 200
+            and isinstance(response, TextResponse)
+            and bool(response.css(spider.PRODUCT_SELECTOR))
+        )
+        if modo == HTTP:
+            if productos:
+                self.decisiones.registrar(patron_url(request.url), HTTP)
+                self.stats.inc_value('hibrido/http')
+                return response
+            spider.logger.info(f"Sin productos por HTTP ({response.status}), se usa Playwright: {request.url}")
+            return self.escalar(request)
+        # Si el navegador tampoco encuentra productos la pagina esta vacia: no se aprende nada
+        if productos:
+            self.decisiones.registrar(patron_url(request.url), NAVEGADOR)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get('hibrido') == HTTP:
+            spider.logger.info(f"Error por HTTP ({exception!r}), se usa Playwright: {request.url}")
+            return self.escalar(request)
+        return None
+
+    def escalar(self, request):
+        self.stats.inc_value('hibrido/escalados')
+        return request.replace(
+            meta={**request.meta, 'playwright': True, 'hibrido': self.ESCALADO},
+            dont_filter=True,
+        )
+
+
+def estado_incremental(crawler):
+    """EstadoCrawl del crawler, o NotConfigured si el crawl incremental esta apagado"""
+    settings = crawler.settings
+    if not settings.getbool('INCREMENTAL_ENABLED'):
+        raise NotConfigured
+    ruta = settings.get('INCREMENTAL_DB_PATH') or data_path('estado_crawl.sqlite', createdir=True)
+    return EstadoCrawl.de_crawler(crawler, ruta, settings.getint('INCREMENTAL_MAX_DIAS', 7))
+
+
+class CrawlIncrementalMiddleware:
+    """Spider middleware: salta las demas paginas de las categorias que no cambiaron
+
+    Compara la huella de los productos de la primera pagina de cada categoria con
+    la del ultimo crawl completo (precio_scrapers.estado_crawl.EstadoCrawl). Si es
+    igual y ese crawl tiene menos de INCREMENTAL_MAX_DIAS, se descartan las
+    peticiones de las paginas siguientes de la categoria. Registra las categorias
+    saltadas y el tiempo que tardaron sus paginas la ultima vez en incremental/*.
+    """
+
+    def __init__(self, estado, stats):
+        self.estado = estado
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(estado_incremental(crawler), crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.estado.abrir(spider.name)
+
+    def spider_closed(self, spider, reason):
+        # Un crawl interrumpido no deja categorias como recorridas completas
+        self.estado.guardar(completo=reason == 'finished')
+
+    # Solo la salida de la primera pagina se junta (la decision necesita todos sus
+    # productos); la de las demas pasa item a item
+    def process_spider_output(self, response, result, spider):
+        if pagina_de(response.meta) == 1:
+            yield from self.filtrar(response, list(result), spider)
+            return
+        clave = self.pagina_siguiente(response)
+        for s in result:
+            yield self.marcar(s, clave)
+
+    async def process_spider_output_async(self, response, result, spider):
+        if pagina_de(response.meta) == 1:
+            salida = [s async for s in result]
+            for s in self.filtrar(response, salida, spider):
+                yield s
+            return
+        clave = self.pagina_siguiente(response)
+        async for s in result:
+            yield self.marcar(s, clave)
+
+    def pagina_siguiente(self, response):
+        """Suma la descarga de una pagina > 1 al tiempo de su categoria y devuelve la clave"""
+        clave = response.meta.get('incremental_categoria')
+        if clave:
+            self.estado.sumar_segundos(clave, response.meta.get('download_latency', 0))
+        return clave
+
+    @staticmethod
+    def marcar(salida, clave):
+        if clave and isinstance(salida, Request):
+            salida.meta.setdefault('incremental_categoria', clave)
+        return salida
+
+    def filtrar(self, response, salida, spider):
+        """Salida de la primera pagina sin las paginas siguientes si la categoria no cambio"""
+        meta = response.meta
+        clave = response.request.url
+        items = [s for s in salida if not isinstance(s, Request)]
+        huella = huella_productos(items)
+        fila = self.estado.fila(clave)
+        sin_cambios = bool(items) and fila is not None and fila['hash_productos'] == huella and self.estado.vigente(clave)
+        if sin_cambios:
+            self.estado.marcar_sin_cambios(clave)
+            self.stats.inc_value('incremental/categorias_sin_cambios')
+            self.stats.inc_value('incremental/segundos_ahorrados', fila['segundos'])
+        else:
+            self.estado.registrar_huella(clave, huella)
+            self.stats.inc_value('incremental/categorias_recorridas')
+
+        omitidas = 0
+        for s in salida:
+            if isinstance(s, Request) and self.es_paginacion(s, meta):
+                if sin_cambios:
+                    omitidas += 1
+                    continue
+                s.meta.setdefault('incremental_categoria', clave)
+            yield s
+        if omitidas:
+            self.stats.inc_value('incremental/paginas_omitidas', omitidas)
+            spider.logger.info(f"Categoria sin cambios, se omiten {omitidas} paginas: {clave}")
+
+    @staticmethod
+    def es_paginacion(request, meta):
+        """Pagina siguiente de la misma categoria que la respuesta"""
+        pagina = pagina_de(request.meta)
+        return pagina is not None and pagina > 1 and request.meta.get('categoria') == meta.get('categoria')
+
+
+class PeticionesCondicionalesMiddleware:
+    """Downloader middleware: If-None-Match / If-Modified-Since en las primeras paginas
+
+    Solo para descargas por HTTP (API o renderizado hibrido), no con Playwright. Si
+    la tienda responde 304 la categoria no cambio desde el ultimo crawl completo y
+    la peticion termina con SinCambios (una IgnoreRequest) sin llegar al callback.
+    """
+
+    def __init__(self, estado, stats):
+        self.estado = estado
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(estado_incremental(crawler), crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.estado.abrir(spider.name)
+
+    @staticmethod
+    def aplica(request):
+        return pagina_de(request.meta) == 1 and not request.meta.get('playwright')
+
+    def process_request(self, request, spider):
+        if not self.aplica(request) or not self.estado.vigente(request.url):
+            return None
+        fila = self.estado.fila(request.url)
+        if fila['etag']:
+            request.headers['If-None-Match'] = fila['etag']
+        if fila['last_modified']:
+            request.headers['If-Modified-Since'] = fila['last_modified']
+        return None
+
+    def process_response(self, request, response, spider):
+        if not self.aplica(request):
+            return response
+        if response.status == 304:
+            fila = self.estado.fila(request.url)
+            self.estado.marcar_sin_cambios(request.url)
+            self.stats.inc_value('incremental/categorias_sin_cambios')
+            self.stats.inc_value('incremental/respuestas_304')
+            self.stats.inc_value('incremental/segundos_ahorrados', fila['segundos'] if fila else 0)
+            raise SinCambios(f"Sin cambios (304): {request.url}")
+        self.estado.registrar_validadores(
+            request.url,
+            (response.headers.get('ETag') or b'').decode('latin-1') or None,
+            (response.headers.get('Last-Modified') or b'').decode('latin-1') or None,
+        )
+        return response
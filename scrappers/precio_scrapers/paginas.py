@@ -0,0 +1,64 @@
+import asyncio
+from collections import Counter, defaultdict
+
+
+class PoolPaginas:
+    """Paginas de Playwright reutilizables, a lo sumo `max_paginas` vivas por contexto
+
+    Una pagina libre se entrega a la siguiente peticion del mismo contexto, que
+    conserva cookies y banners ya aceptados. Si no hay libres y el contexto ya
+    tiene `max_paginas`, la peticion espera a que se libere una. Cada pagina se
+    cierra despues de `max_usos` navegaciones para que la memoria no crezca.
+    """
+
+    def __init__(self, max_paginas=4, max_usos=50):
+        self.max_paginas = max_paginas
+        self.max_usos = max_usos
+        self.libres = defaultdict(list)
+        self.vivas = Counter()
+        self.usos = {}
+        self._cambio = asyncio.Condition()
+
+    async def tomar(self, contexto):
+        """Devuelve una pagina libre o None si la peticion puede crear una nueva
+
+        En el segundo caso el lugar queda reservado hasta devolver() o descartar().
+        """
+        async with self._cambio:
+            while True:
+                while self.libres[contexto]:
+                    pagina = self.libres[contexto].pop()
+                    if not pagina.is_closed():
+                        return pagina
+                    self.usos.pop(pagina, None)
+                    self.vivas[contexto] -= 1
+                if self.vivas[contexto] < self.max_paginas:
+                    self.vivas[contexto] += 1
+                    return None
+                await self._cambio.wait()
+
+    async def devolver(self, contexto, pagina):
+        """Deja la pagina libre para otra peticion; devuelve False si se cerro por max_usos"""
+        usos = self.usos.get(pagina, 0) + 1
+        if pagina.is_closed() or usos >= self.max_usos:
+            await self.descartar(contexto, pagina)
+            return False
+        self.usos[pagina] = usos
+        async with self._cambio:
+            self.libres[contexto].append(pagina)
+            self._cambio.notify()
+        return True
+
+    async def descartar(self, contexto, pagina=None):
+        """Cierra la pagina (si llego a crearse) y libera su lugar"""
+        self.usos.pop(pagina, None)
+        try:
+            if pagina is not None and not pagina.is_closed():
+                await pagina.close()
+        finally:
+            async with self._cambio:
+                self.vivas[contexto] -= 1
+                self._cambio.notify()
+
+    def total_libres(self):
+        return sum(len(paginas) for paginas in self.libres.values())
@@ -1,9 +1,16 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from decimal import Decimal
-import json
-import os
+from scrapy.exceptions import DropItem
+from scrapy.logformatter import LogFormatter
+from twisted.internet import defer, threads
 import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+from .dedup import BloomFilter, ConjuntoHashes, clave_item
+from .key_index import deduplicar_filas, hash_contenido
+from .metrics import MetricasIngestion, guardar_resumen
+from .sinks import crear_sink
 
 logger = logging.getLogger(__name__)
 
@@ -30,123 +37,405 @@ class DataCleaningPipeline:
         return item
 
 
-class SQLServerPipeline:
-    """Pipeline para guardar productos en SQL Server"""
+class ProductoRepetido(DropItem):
+    """Item descartado por DeduplicationPipeline"""
+
+
+class FormatoLog(LogFormatter):
+    """LOG_FORMATTER que registra en DEBUG los productos repetidos descartados
     
-    def __init__(self):
-        self.test_mode = True
-        self.items = []
-        self.engine = None
-        self.Session = None
-        
-        db_url = os.environ.get(
-            'DATABASE_URL', 
-            'mssql+pyodbc://HARDOS/precio_comparador?driver=ODBC+Driver+18+for+SQL+Server&Trusted_Connection=yes&TrustServerCertificate=yes'
+    Son miles por crawl y ya quedan en la stat dedup/descartados; los demas
+    DropItem siguen en el nivel por defecto de Scrapy.
+    """
+    
+    def dropped(self, item, exception, response, spider):
+        resultado = super().dropped(item, exception, response, spider)
+        if isinstance(exception, ProductoRepetido):
+            resultado['level'] = logging.DEBUG
+        return resultado
+
+
+class DeduplicationPipeline:
+    """Descarta items repetidos dentro de un crawl
+    
+    Las categorias padre e hija (p. ej. /delicatessen y /delicatessen/quesos)
+    devuelven los mismos productos. La clave es (supermercado, nombre) o la URL
+    normalizada (DEDUP_KEY = 'url'); con DEDUP_BACKEND = 'bloom' la memoria
+    queda fija a costa de una tasa de falsos positivos DEDUP_BLOOM_ERROR.
+    """
+    
+    def __init__(self, campo='nombre', backend='set', capacidad=1_000_000, error=1e-6):
+        if campo not in ('nombre', 'url'):
+            raise ValueError(f"DEDUP_KEY invalido: {campo} (opciones: nombre, url)")
+        if backend == 'set':
+            self.vistos = ConjuntoHashes()
+        elif backend == 'bloom':
+            self.vistos = BloomFilter(capacidad, error)
+        else:
+            raise ValueError(f"DEDUP_BACKEND invalido: {backend} (opciones: set, bloom)")
+        self.campo = campo
+        self.solapamientos = Counter()
+        self.descartados = 0
+        self.stats = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            campo=crawler.settings.get('DEDUP_KEY', 'nombre'),
+            backend=crawler.settings.get('DEDUP_BACKEND', 'set'),
+            capacidad=crawler.settings.getint('DEDUP_BLOOM_CAPACITY', 1_000_000),
+            error=crawler.settings.getfloat('DEDUP_BLOOM_ERROR', 1e-6),
         )
+        pipeline.stats = crawler.stats
+        return pipeline
+    
+    def process_item(self, item, spider):
+        categoria = item.get('categoria')
+        nuevo, primera = self.vistos.agregar(clave_item(item, self.campo), categoria)
+        if nuevo:
+            return item
         
-        if db_url and 'mssql' in db_url:
-            try:
-                if '+aioodbc://' in db_url:
-                    db_url = db_url.replace('+aioodbc://', '+pyodbc://')
-                
-                self.engine = create_engine(
-                    db_url,
-                    connect_args={"timeout": 30},
-                    pool_pre_ping=True,
-                    pool_recycle=3600,
-                )
-                self.Session = sessionmaker(bind=self.engine)
-                self.test_mode = False
-                logger.info(f"Conexion a SQL Server establecida: {db_url[:50]}...")
-            except Exception as e:
-                logger.warning(f"No se pudo conectar a BD: {e} - Modo prueba activo")
-                self.test_mode = True
-        else:
-            logger.warning("DATABASE_URL no configurada - Modo prueba activo")
+        self.descartados += 1
+        if self.stats is not None:
+            self.stats.inc_value('dedup/descartados')
+        if primera is not None and primera != categoria:
+            self.solapamientos[(primera, categoria)] += 1
+        raise ProductoRepetido(f"Producto repetido en el crawl: {item.get('nombre')}")
+    
+    def close_spider(self, spider):
+        logger.info(f"Deduplicacion: {len(self.vistos)} productos unicos, {self.descartados} repetidos descartados")
+        for (primera, otra), total in self.solapamientos.most_common(10):
+            logger.info(f"  {total} productos de '{otra}' ya vistos en '{primera}'")
+        if self.stats is not None:
+            self.stats.set_value('dedup/unicos', len(self.vistos))
+            self.stats.set_value('dedup/solapamientos', {
+                f"{primera} -> {otra}": total for (primera, otra), total in self.solapamientos.items()
+            })
+
+
+class IngestionPipeline:
+    """Pipeline unico de ingestion: convierte, deduplica y agrupa items en lotes
+    
+    Los items se acumulan en memoria y se escriben por lotes: cuando el buffer
+    llega a INGESTION_BATCH_SIZE items o su item mas antiguo supera
+    INGESTION_FLUSH_INTERVAL segundos, el lote deduplicado se entrega al sink.
+    El destino se elige con INGESTION_SINK: 'sqlserver', 'sqlite', 'ndjson',
+    'parquet' o la ruta a una subclase de sinks.Sink.
+    
+    Al cerrar publica en las stats (ingestion/*) y en un JSON en
+    INGESTION_SUMMARY_DIR items/s, round trips por item, tamanos de lote,
+    latencias p50/p99 de escritura y filas insertadas/actualizadas/sin cambios.
+    """
+    
+    # Fija el sink sin importar INGESTION_SINK (subclases de compatibilidad)
+    SINK = None
+    
+    def __init__(self, sink, batch_size=500, flush_interval=30.0, summary_dir=None, log_sample=1000):
+        self.sink = sink
+        self.sink.inc_stat = self._inc_stat
+        self.sink.set_stat = self._set_stat
+        self.prefijo = sink.nombre
+        self.stats = None
+        
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffer_desde = None
+        
+        self.metricas = MetricasIngestion()
+        self.summary_dir = summary_dir
+        self.log_sample = max(1, log_sample)
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        sink = crear_sink(crawler.settings, cls.SINK)
+        pipeline = cls(sink, **cls.opciones_desde_settings(crawler.settings))
+        pipeline.stats = crawler.stats
+        return pipeline
+    
+    @staticmethod
+    def opciones_desde_settings(settings):
+        return {
+            'batch_size': settings.getint('INGESTION_BATCH_SIZE', 500),
+            'flush_interval': settings.getfloat('INGESTION_FLUSH_INTERVAL', 30.0),
+            'summary_dir': settings.get('INGESTION_SUMMARY_DIR'),
+            'log_sample': settings.getint('INGESTION_LOG_SAMPLE', 1000),
+        }
     
     def open_spider(self, spider):
-        logger.info(f"Spider {spider.name} iniciado - Modo: {'Prueba' if self.test_mode else 'Producción'}")
+        logger.info(f"Spider {spider.name} iniciado - Sink: {self.sink.nombre}")
+        if not self.sink.streaming:
+            logger.info(f"Escritura por lotes: {self.batch_size} items o {self.flush_interval}s")
+        self.metricas = MetricasIngestion()
+        self.sink.abrir(spider)
     
     def close_spider(self, spider):
-        if self.test_mode:
-            output_file = f"{spider.name}_productos.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(self.items, f, ensure_ascii=False, indent=2)
-            logger.info(f"Guardados {len(self.items)} productos en {output_file}")
-        
-        if self.engine:
-            self.engine.dispose()
+        if self.buffer:
+            self.flush()
+        self.sink.cerrar(spider)
+        self._publicar_resumen(spider)
         logger.info(f"Spider {spider.name} finalizado")
     
     def process_item(self, item, spider):
-        if self.test_mode:
-            self.items.append(dict(item))
-            logger.info(f"Producto agregado (prueba): {item['nombre'][:50]}...")
+        fila = self._preparar(item)
+        if fila is not None:
+            self._agregar_al_buffer(fila)
+        return item
+    
+    def _preparar(self, item):
+        try:
+            fila = preparar_item(item) if self.sink.items_completos else preparar_fila(item)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Error preparando producto {item.get('nombre', 'UNKNOWN')}: {e}")
+            return None
+        
+        self.metricas.registrar_item()
+        # Un log por item cuesta mas que el item: solo se muestrea uno de cada log_sample
+        if self.metricas.items % self.log_sample == 0:
+            logger.debug(f"Item {self.metricas.items}: {item['nombre'][:30]}...")
+        return fila
+    
+    def _agregar_al_buffer(self, fila):
+        if not self.buffer:
+            self.buffer_desde = time.monotonic()
+        self.buffer.append(fila)
+        
+        if self.sink.streaming or self._buffer_lleno():
+            self.flush()
+    
+    def _buffer_lleno(self):
+        if len(self.buffer) >= self.batch_size:
+            return True
+        return time.monotonic() - self.buffer_desde >= self.flush_interval
+    
+    def flush(self):
+        """Entrega el buffer deduplicado al sink"""
+        lote = deduplicar_filas(self.buffer)
+        self.buffer = []
+        self.buffer_desde = None
+        
+        inicio = time.monotonic()
+        try:
+            resumen = self.sink.escribir(lote)
+        except Exception as e:
+            logger.error(f"Error escribiendo lote de {len(lote)} productos en {self.sink.nombre}: {e}")
+            self._inc_stat(f'{self.prefijo}/lotes_fallidos')
+            self._inc_stat(f'{self.prefijo}/items_perdidos', len(lote))
+            return
+        
+        if not self.sink.streaming:
+            latencia = time.monotonic() - inicio
+            self.metricas.registrar_lote(len(lote), int(latencia * 1000), resumen)
+            detalle = ', '.join(f"{clave}={valor}" for clave, valor in resumen.items())
+            logger.info(f"Lote guardado en {self.sink.nombre}: {len(lote)} items en {latencia:.2f}s ({detalle})")
+        self._inc_stat(f'{self.prefijo}/lotes')
+        for clave, valor in resumen.items():
+            self._inc_stat(f'{self.prefijo}/{clave}', valor)
+    
+    def _publicar_resumen(self, spider):
+        resumen = self.metricas.resumen(round_trips=self.sink.round_trips)
+        resumen.update(spider=spider.name, sink=self.sink.nombre)
+        for clave, valor in resumen.items():
+            if valor is not None:
+                self._set_stat(f'ingestion/{clave}', valor)
+        logger.info(
+            f"Ingestion: {resumen['items']} items a {resumen['items_por_segundo']} items/s, "
+            f"{resumen['round_trips_por_item']} round trips/item, "
+            f"escritura p50={resumen['latencia_ms_p50']}ms p99={resumen['latencia_ms_p99']}ms"
+        )
+        if self.summary_dir:
+            try:
+                ruta = guardar_resumen(self.summary_dir, spider.name, resumen)
+                logger.info(f"Resumen de ingestion guardado en {ruta}")
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el resumen de ingestion: {e}")
+    
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+    
+    def _set_stat(self, key, value):
+        if self.stats is not None:
+            self.stats.set_value(key, value)
+
+
+_FIN_DE_COLA = object()
+
+
+class AsyncIngestionPipeline(IngestionPipeline):
+    """IngestionPipeline que escribe en el sink desde un hilo dedicado
+    
+    process_item solo encola el item y devuelve el control al reactor; el hilo
+    escritor arma los lotes y ejecuta las escrituras (p. ej. llamadas a pyodbc),
+    asi no frenan Playwright ni las descargas. La cola tiene tamano fijo
+    (INGESTION_QUEUE_SIZE): si esta llena, process_item devuelve un Deferred que
+    se resuelve cuando el escritor libera espacio, y Scrapy deja de procesar
+    items de esa respuesta hasta entonces.
+    """
+    
+    def __init__(self, sink, queue_size=2000, **kwargs):
+        super().__init__(sink, **kwargs)
+        self.cola = queue.Queue(maxsize=max(1, queue_size))
+        self.esperando = deque()
+        self.escritor = None
+        self.reactor = None
+    
+    @staticmethod
+    def opciones_desde_settings(settings):
+        opciones = IngestionPipeline.opciones_desde_settings(settings)
+        opciones['queue_size'] = settings.getint('INGESTION_QUEUE_SIZE', 2000)
+        return opciones
+    
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.reactor is None:
+            from twisted.internet import reactor
+            self.reactor = reactor
+        self.escritor = threading.Thread(
+            target=self._bucle_escritor, name=f"{self.prefijo}-{spider.name}", daemon=True
+        )
+        self.escritor.start()
+    
+    def close_spider(self, spider):
+        if self.escritor is None:
+            return super().close_spider(spider)
+        return threads.deferToThread(self._cerrar_en_hilo, spider)
+    
+    def _cerrar_en_hilo(self, spider):
+        """Espera a que el escritor vacie la cola y cierra como el pipeline sincrono"""
+        self.cola.put(_FIN_DE_COLA)
+        self.escritor.join()
+        self.escritor = None
+        super().close_spider(spider)
+    
+    def process_item(self, item, spider):
+        if self.escritor is None:
+            return super().process_item(item, spider)
+        
+        fila = self._preparar(item)
+        if fila is None:
             return item
         
-        session = self.Session()
+        if not self.esperando and self._encolar(fila):
+            return item
         
+        espera = defer.Deferred()
+        self.esperando.append((espera, fila, item))
+        self._inc_stat(f'{self.prefijo}/cola/esperas')
+        return espera
+    
+    def _encolar(self, fila):
         try:
-            precio_actual = float(item['precio_actual'])
-            precio_anterior = float(item['precio_anterior']) if item.get('precio_anterior') else None
-            descuento = float(item['descuento_porcentaje']) if item.get('descuento_porcentaje') else None
+            self.cola.put_nowait(fila)
+        except queue.Full:
+            return False
+        if self.stats is not None:
+            self.stats.max_value(f'{self.prefijo}/cola/profundidad_max', self.cola.qsize())
+        return True
+    
+    def _liberar_esperas(self):
+        """Encola items retenidos por backpressure mientras haya espacio (hilo del reactor)"""
+        while self.esperando:
+            espera, fila, item = self.esperando[0]
+            if not self._encolar(fila):
+                break
+            self.esperando.popleft()
+            espera.callback(item)
+    
+    def _bucle_escritor(self):
+        while True:
+            if self.buffer:
+                restante = self.flush_interval - (time.monotonic() - self.buffer_desde)
+                timeout = min(max(restante, 0), 1.0)
+            else:
+                timeout = 1.0
             
-            logger.debug(f"Procesando: {item['nombre'][:30]}...")
+            try:
+                fila = self.cola.get(timeout=timeout)
+            except queue.Empty:
+                fila = None
             
-            check_query = text("""
-                SELECT id FROM Hardos.productos 
-                WHERE nombre = :nombre AND supermercado = :supermercado
-            """)
-            existente = session.execute(check_query, {
-                'nombre': item['nombre'],
-                'supermercado': item['supermercado']
-            }).fetchone()
+            if self.esperando:
+                self.reactor.callFromThread(self._liberar_esperas)
             
-            if existente:
-                if precio_anterior is not None:
-                    update_query = text("""
-                        UPDATE Hardos.productos 
-                        SET precio_anterior = precio_actual,
-                            precio_actual = :precio_actual,
-                            descuento_porcentaje = :descuento,
-                            fecha_extraccion = GETDATE()
-                        WHERE id = :id
-                    """)
-                    session.execute(update_query, {
-                        'precio_actual': precio_actual,
-                        'descuento': descuento,
-                        'id': existente[0]
-                    })
-                    session.commit()
-                    logger.info(f"Precio actualizado: {item['nombre'][:50]}...")
-            else:
-                insert_query = text("""
-                    INSERT INTO Hardos.productos 
-                    (supermercado, nombre, marca, categoria, presentacion, 
-                     precio_actual, precio_anterior, descuento_porcentaje, url, imagen_url)
-                    VALUES 
-                    (:supermercado, :nombre, :marca, :categoria, :presentacion,
-                     :precio_actual, :precio_anterior, :descuento, :url, :imagen_url)
-                """)
-                session.execute(insert_query, {
-                    'supermercado': item['supermercado'],
-                    'nombre': item['nombre'],
-                    'marca': item.get('marca'),
-                    'categoria': item.get('categoria'),
-                    'presentacion': item.get('presentacion'),
-                    'precio_actual': precio_actual,
-                    'precio_anterior': precio_anterior,
-                    'descuento': descuento,
-                    'url': item.get('url'),
-                    'imagen_url': item.get('imagen_url'),
-                })
-                session.commit()
-                logger.info(f"Nuevo producto: {item['nombre'][:50]}...")
+            if fila is _FIN_DE_COLA:
+                if self.buffer:
+                    self.flush()
+                return
             
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error guardando producto {item.get('nombre', 'UNKNOWN')}: {e}")
-        finally:
-            session.close()
-        
-        return item
+            try:
+                if fila is not None:
+                    self._agregar_al_buffer(fila)
+                elif self.buffer and self._buffer_lleno():
+                    self.flush()
+            except Exception as e:
+                # El hilo no puede morir: la cola se llenaria y el crawl quedaria bloqueado
+                logger.error(f"Error en el escritor de {self.sink.nombre}: {e}")
+    
+    def flush(self):
+        inicio = time.monotonic()
+        super().flush()
+        latencia_ms = int((time.monotonic() - inicio) * 1000)
+        self._inc_stat(f'{self.prefijo}/escritor/latencia_ms_total', latencia_ms)
+        self._max_stat(f'{self.prefijo}/escritor/latencia_ms_max', latencia_ms)
+    
+    def _inc_stat(self, key, count=1):
+        # Las stats se actualizan siempre desde el hilo del reactor
+        if self.stats is not None and self.reactor is not None:
+            self.reactor.callFromThread(self.stats.inc_value, key, count)
+        else:
+            super()._inc_stat(key, count)
+    
+    def _set_stat(self, key, value):
+        if self.stats is not None and self.reactor is not None:
+            self.reactor.callFromThread(self.stats.set_value, key, value)
+        else:
+            super()._set_stat(key, value)
+    
+    def _max_stat(self, key, value):
+        if self.stats is not None and self.reactor is not None:
+            self.reactor.callFromThread(self.stats.max_value, key, value)
+
+
+class SQLServerPipeline(IngestionPipeline):
+    """IngestionPipeline que siempre escribe en SQL Server"""
+    
+    SINK = 'sqlserver'
+
+
+class AsyncSQLServerPipeline(AsyncIngestionPipeline):
+    """AsyncIngestionPipeline que siempre escribe en SQL Server"""
+    
+    SINK = 'sqlserver'
+
+
+def preparar_item(item):
+    """Copia del item completo para los sinks de archivos (items_completos)"""
+    # La deduplicacion del lote usa (supermercado, nombre)
+    for campo in ('supermercado', 'nombre'):
+        if not item.get(campo):
+            raise KeyError(campo)
+    return dict(item)
+
+
+def preparar_fila(item):
+    """Convierte un item en la fila que reciben los sinks (columnas de Hardos.productos)"""
+    fila = {
+        'supermercado': item['supermercado'],
+        'nombre': item['nombre'],
+        'marca': item.get('marca'),
+        'categoria': item.get('categoria'),
+        'presentacion': item.get('presentacion'),
+        'precio_actual': float(item['precio_actual']),
+        'precio_anterior': float(item['precio_anterior']) if item.get('precio_anterior') else None,
+        'descuento': float(item['descuento_porcentaje']) if item.get('descuento_porcentaje') else None,
+        'url': item.get('url'),
+        'imagen_url': item.get('imagen_url'),
+        'sku': str(item['sku']) if item.get('sku') else None,
+        'ean': str(item['ean']) if item.get('ean') else None,
+    }
+    fila['hash_contenido'] = hash_contenido(
+        fila['precio_actual'], fila['descuento'], fila['presentacion'], fila['url'], fila['imagen_url'],
+        fila['sku'], fila['ean'],
+    )
+    return fila
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+HTTP = 'http'
+NAVEGADOR = 'navegador'
+
+
+def patron_url(url):
+    """Forma de la URL: host, cantidad de segmentos de la ruta y nombres de los parametros
+
+    https://surtifamiliar.com/verduras/products?page=2 -> surtifamiliar.com/*/*?page
+    Las categorias de una tienda comparten patron, asi una decision sirve para todas.
+    """
+    partes = urlsplit(url)
+    segmentos = [s for s in partes.path.split('/') if s]
+    patron = f"{partes.hostname or ''}/{'/'.join('*' for _ in segmentos)}"
+    parametros = sorted({nombre for nombre, _ in parse_qsl(partes.query, keep_blank_values=True)})
+    return f"{patron}?{'&'.join(parametros)}" if parametros else patron
+
+
+class DecisionesRenderizado:
+    """Decision HTTP/navegador por spider y patron de URL, guardada entre ejecuciones
+
+    Archivo JSON {spider: {patron: {'modo': 'http'|'navegador', 'fecha': epoch}}}.
+    Las decisiones con mas de `ttl_dias` se olvidan y el patron se vuelve a probar
+    por HTTP. Al guardar se relee el archivo y solo se reemplaza el spider propio,
+    para no pisar lo que guardaron otros spiders mientras tanto.
+    """
+
+    def __init__(self, ruta, spider, ttl_dias=7):
+        self.ruta = ruta
+        self.spider = spider
+        self.ttl = ttl_dias * 86400
+        self.decisiones = {}
+        self.cambios = False
+
+    def _leer(self):
+        try:
+            with open(self.ruta, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer {self.ruta}: {e} - se empieza sin decisiones")
+            return {}
+
+    def cargar(self):
+        vigentes = time.time() - self.ttl
+        self.decisiones = {
+            patron: decision for patron, decision in self._leer().get(self.spider, {}).items()
+            if decision.get('fecha', 0) >= vigentes
+        }
+        return self
+
+    def modo(self, patron):
+        decision = self.decisiones.get(patron)
+        return decision['modo'] if decision else None
+
+    def registrar(self, patron, modo):
+        if self.modo(patron) != modo:
+            self.decisiones[patron] = {'modo': modo, 'fecha': time.time()}
+            self.cambios = True
+
+    def guardar(self):
+        if not self.cambios:
+            return
+        datos = self._leer()
+        datos[self.spider] = self.decisiones
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, sort_keys=True)
+        os.replace(temporal, self.ruta)
+        self.cambios = False
@@ -2,8 +2,12 @@ BOT_NAME = "precio_scrapers"
 
 SPIDER_MODULES = ["precio_scrapers.spiders"]
 NEWSPIDER_MODULE = "precio_scrapers.spiders"
+COMMANDS_MODULE = "precio_scrapers.commands"
 
-ADDONS = {}
+ADDONS = {
+    "precio_scrapers.bloqueo.BloqueoRecursosAddon": 100,
+    "precio_scrapers.grabacion.GrabacionAddon": 200,
+}
 
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
@@ -20,9 +24,180 @@ DOWNLOAD_HANDLERS = {
 
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
+DOWNLOADER_MIDDLEWARES = {
+    "precio_scrapers.middlewares.RenderizadoHibridoMiddleware": 500,
+    "precio_scrapers.middlewares.PeticionesCondicionalesMiddleware": 520,
+    "precio_scrapers.middlewares.EsperaStatsMiddleware": 543,
+    "precio_scrapers.middlewares.PoolPaginasMiddleware": 950,
+}
+
+SPIDER_MIDDLEWARES = {
+    "precio_scrapers.middlewares.CrawlIncrementalMiddleware": 550,
+}
+
+# Exito y Carulla (tiendas VTEX): cada categoria se pide a la API de busqueda
+# del catalogo (JSON, sin navegador) en paginas de VTEX_TAMANO_PAGINA productos
+# (maximo 50). Si la API falla o no trae productos se usa Playwright
+VTEX_API_ENABLED = True
+VTEX_TAMANO_PAGINA = 50
+
+# Mercar (WooCommerce): cada categoria se pide a la Store API en paginas de
+# WOOCOMMERCE_POR_PAGINA productos (maximo 100), por HTTP y en su propio slot de
+# descarga, con mas concurrencia y menos delay que las paginas con Playwright.
+# Si la API falla o no trae productos se usa Playwright
+WOOCOMMERCE_API_ENABLED = True
+WOOCOMMERCE_POR_PAGINA = 100
+WOOCOMMERCE_SLOT = "woocommerce-api"
+DOWNLOAD_SLOTS = {
+    "woocommerce-api": {"concurrency": 8, "delay": 0.25},
+}
+
+# Renderizado hibrido: las peticiones con Playwright se prueban antes por HTTP y
+# solo usan el navegador si la respuesta no trae el PRODUCT_SELECTOR del spider.
+# La decision se recuerda por spider y patron de URL en HIBRIDO_CACHE_PATH (por
+# defecto .scrapy/renderizado.json) durante HIBRIDO_TTL_DIAS
+HIBRIDO_ENABLED = True
+HIBRIDO_CACHE_PATH = None
+HIBRIDO_TTL_DIAS = 7
+
+# Crawl incremental: por categoria se guarda en INCREMENTAL_DB_PATH (por defecto
+# .scrapy/estado_crawl.sqlite) el ETag/Last-Modified y un hash de los productos de
+# la primera pagina. Si la tienda responde 304 o el hash no cambio, se saltan las
+# demas paginas. Despues de INCREMENTAL_MAX_DIAS se recorre la categoria completa
+INCREMENTAL_ENABLED = True
+INCREMENTAL_DB_PATH = None
+INCREMENTAL_MAX_DIAS = 7
+
+# Grabacion para trabajar sin red: con GRABACION_MODO="grabar" cada respuesta
+# (ya renderizada, con el JSON de CAPTURA_JSON_ENABLED) se guarda comprimida en
+# .scrapy/GRABACION_DIR/<spider>.sqlite; con "reproducir" el spider corre solo
+# sobre lo grabado, sin navegador. Ej.:
+#   scrapy crawl carulla -s GRABACION_MODO=grabar
+#   scrapy crawl carulla -s GRABACION_MODO=reproducir
+GRABACION_MODO = None
+GRABACION_DIR = "grabaciones"
+
+# Pool de paginas de Playwright: como maximo PLAYWRIGHT_MAX_PAGES_PER_CONTEXT
+# paginas vivas por contexto, reutilizadas entre peticiones y recreadas cada
+# PAGINAS_MAX_USOS navegaciones
+PAGINAS_POOL_ENABLED = True
+PLAYWRIGHT_MAX_PAGES_PER_CONTEXT = 4
+PAGINAS_MAX_USOS = 50
+
+# Espera de cada pagina de Playwright (precio_scrapers.espera): hasta que el
+# numero de productos no cambie durante ESPERA_ESTABLE_MS, consultando cada
+# ESPERA_INTERVALO_MS, con un maximo de ESPERA_TIMEOUT_MS
+ESPERA_TIMEOUT_MS = 30000
+ESPERA_ESTABLE_MS = 1000
+ESPERA_INTERVALO_MS = 250
+
+# Scroll infinito (Carulla): scroll al final y hasta SCROLL_ESPERA_MS esperando
+# productos nuevos; termina tras SCROLL_PASOS_SIN_CAMBIO pasos sin productos
+# nuevos o a los SCROLL_TIMEOUT_MS
+SCROLL_TIMEOUT_MS = 60000
+SCROLL_PASOS_SIN_CAMBIO = 3
+SCROLL_ESPERA_MS = 1000
+
+# Exito, Carulla y D1 con Playwright: los productos se toman del JSON que la
+# tienda pide para llenar la grilla (XHR/fetch capturados en la pagina); si no
+# se ve ninguno se extraen del DOM
+CAPTURA_JSON_ENABLED = True
+
 ITEM_PIPELINES = {
     "precio_scrapers.pipelines.DataCleaningPipeline": 100,
-    "precio_scrapers.pipelines.SQLServerPipeline": 300,
+    "precio_scrapers.pipelines.DeduplicationPipeline": 200,
+    "precio_scrapers.pipelines.AsyncIngestionPipeline": 300,
+}
+
+# Descarte de productos repetidos entre categorias que se solapan. Clave:
+# "nombre" (supermercado, nombre) o "url" normalizada. "set" es exacto; "bloom"
+# usa memoria fija (DEDUP_BLOOM_CAPACITY items con DEDUP_BLOOM_ERROR de falsos positivos)
+DEDUP_KEY = "nombre"
+DEDUP_BACKEND = "set"
+DEDUP_BLOOM_CAPACITY = 1_000_000
+DEDUP_BLOOM_ERROR = 1e-6
+# Los repetidos descartados se registran en DEBUG
+LOG_FORMATTER = "precio_scrapers.pipelines.FormatoLog"
+
+# Destino de los items: "sqlserver", "sqlite", "ndjson", "parquet" o la ruta a
+# una subclase de precio_scrapers.sinks.Sink. Sin DATABASE_URL, "sqlserver" pasa
+# a "ndjson" (modo prueba)
+INGESTION_SINK = "sqlserver"
+
+# Escritura por lotes: se guarda al llegar a N items o cuando el item mas
+# antiguo del buffer supera el intervalo (segundos)
+INGESTION_BATCH_SIZE = 500
+INGESTION_FLUSH_INTERVAL = 30
+
+# AsyncIngestionPipeline: items en cola antes de frenar al scraper (backpressure)
+INGESTION_QUEUE_SIZE = 2000
+
+# Resumen JSON de cada ejecucion (items/s, round trips, latencias) y log de debug
+# de 1 de cada N items
+INGESTION_SUMMARY_DIR = "output"
+INGESTION_LOG_SAMPLE = 1000
+
+# Conexion a SQL Server. Si no se define aqui (o con -s) se usa DATABASE_URL de la
+# configuracion de la app (variable de entorno o .env) y luego la variable de entorno
+DATABASE_URL = None
+
+# "batch": escribe cada lote directamente en Hardos.productos
+# "staging": carga los lotes en una tabla de staging y hace un MERGE al final
+# (se puede cambiar por spider en custom_settings)
+SQLSERVER_INGESTION_MODE = "batch"
+
+# Conexiones que escriben cada lote en paralelo, particionado por
+# hash(supermercado, nombre) (solo modo "batch")
+SQLSERVER_WRITERS = 1
+
+# Si SQL Server no responde los lotes se guardan aqui (ndjson, ndjson.gz o sqlite)
+# y se cargan despues con: scrapy replay_spool <archivo>
+SQLSERVER_SPOOL_DIR = "spool"
+SQLSERVER_SPOOL_FORMAT = "ndjson.gz"
+
+# Sink "sqlite": base local con el mismo upsert que SQL Server
+SQLITE_SINK_PATH = "productos.sqlite"
+
+# Sinks "ndjson" y "parquet" (y modo prueba): archivos en EXPORT_DIR. NDJSON
+# escribe cada item al llegar y rota cada EXPORT_MAX_BYTES (None, "gzip" o "zstd")
+EXPORT_DIR = "output"
+EXPORT_COMPRESSION = None
+EXPORT_MAX_BYTES = 64 * 1024 * 1024
+
+# Parser de las paginas de producto: "lxml" (XPath precompilado sobre el arbol
+# de parsel) o "selectolax" (mas rapido; si no esta instalado se usa lxml)
+EXTRACCION_BACKEND = "lxml"
+
+# Recursos que Playwright no descarga (los parsers solo leen atributos como
+# img::attr(src)). Tipos de recurso de Playwright y dominios de analitica y
+# publicidad; cada spider puede agregar los suyos en BLOQUEO_DOMINIOS_TIENDA o
+# cambiar BLOQUEO_TIPOS en custom_settings. BLOQUEO_BYTES_POR_TIPO es el tamano
+# medio aproximado por peticion, para estimar los bytes ahorrados
+BLOQUEO_ENABLED = True
+BLOQUEO_TIPOS = ["image", "font", "media"]
+BLOQUEO_DOMINIOS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "analytics.tiktok.com",
+    "bat.bing.com",
+    "cdn.segment.com",
+    "newrelic.com",
+    "nr-data.net",
+]
+BLOQUEO_DOMINIOS_TIENDA = []
+BLOQUEO_BYTES_POR_TIPO = {
+    "image": 40_000,
+    "font": 30_000,
+    "media": 500_000,
+    "script": 25_000,
+    "stylesheet": 15_000,
 }
 
 AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,952 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from sqlalchemy import bindparam, create_engine, event, text
+
+from .export import RotatingJSONLWriter
+from .key_index import ProductoKeyIndex, deduplicar_filas, particionar_filas
+from .spool import abrir_spool, leer_spool, ruta_spool
+
+logger = logging.getLogger(__name__)
+
+URL_POR_DEFECTO = (
+    'mssql+pyodbc://HARDOS/precio_comparador?driver=ODBC+Driver+18+for+SQL+Server'
+    '&Trusted_Connection=yes&TrustServerCertificate=yes'
+)
+
+
+def resolver_database_url(settings=None):
+    """URL de SQL Server: setting DATABASE_URL, configuracion de la app (.env) o variable de entorno
+    
+    La configuracion de la app (app.core.config) ya da prioridad a la variable
+    de entorno sobre el .env; si el paquete app no se puede importar (scrapy
+    corrido desde scrappers/) el .env se busca desde el directorio actual.
+    Registra de donde salio la URL.
+    """
+    if settings is not None and settings.get('DATABASE_URL') is not None:
+        logger.info("DATABASE_URL tomada del setting DATABASE_URL")
+        return settings.get('DATABASE_URL')
+    
+    en_entorno = 'DATABASE_URL' in os.environ
+    try:
+        from app.core.config import Settings
+        archivo = Settings._get_env_file()
+        url = Settings.from_env().DATABASE_URL
+    except Exception as e:
+        logger.debug(f"Sin la configuracion de la app ({e}) - se lee el .env directamente")
+        from dotenv import dotenv_values, find_dotenv
+        archivo = find_dotenv(usecwd=True)
+        url = dotenv_values(archivo).get('DATABASE_URL') if archivo else None
+    
+    if en_entorno:
+        logger.info("DATABASE_URL tomada de la variable de entorno")
+        return os.environ['DATABASE_URL']
+    if url:
+        logger.info(f"DATABASE_URL tomada de {archivo}")
+        return url
+    logger.warning("DATABASE_URL no definida en settings, .env ni el entorno - se usa la conexion de confianza a HARDOS")
+    return URL_POR_DEFECTO
+
+
+class Sink:
+    """Destino de los lotes que arma IngestionPipeline
+    
+    escribir() recibe filas ya convertidas y deduplicadas y devuelve un dict de
+    contadores que el pipeline suma en las stats como <nombre>/<contador>.
+    Con streaming = True el pipeline entrega cada fila apenas llega, sin buffer.
+    Con items_completos = True las filas son el item completo del spider (campos
+    y nombres originales) en lugar de las columnas de Hardos.productos.
+    """
+    
+    nombre = 'sink'
+    streaming = False
+    items_completos = False
+    # Sentencias enviadas al servidor (solo los sinks con base de datos remota)
+    round_trips = 0
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+    
+    def abrir(self, spider):
+        pass
+    
+    def escribir(self, lote):
+        raise NotImplementedError
+    
+    def cerrar(self, spider):
+        pass
+    
+    # El pipeline reemplaza estos hooks por los suyos (thread-safe en el modo asincrono)
+    def inc_stat(self, key, count=1):
+        pass
+    
+    def set_stat(self, key, value):
+        pass
+
+
+class SQLServerSink(Sink):
+    """Sink que hace upsert en Hardos.productos
+    
+    La existencia de cada producto se resuelve con un ProductoKeyIndex cargado
+    al abrir el spider, sin consultas por item ni por lote.
+    
+    Con SQLSERVER_INGESTION_MODE = 'staging' (configurable por spider en
+    custom_settings) los lotes solo se cargan con fast_executemany en una tabla
+    de staging propia de la ejecucion, y al cerrar el spider un unico MERGE
+    reconcilia todo con Hardos.productos.
+    
+    Si SQL Server no responde al abrir el spider, o un lote falla durante el
+    crawl, las filas se escriben en un spool local (SQLSERVER_SPOOL_DIR) en lugar
+    de perderse; `scrapy replay_spool <archivo>` las carga despues con la misma
+    logica de upsert.
+    
+    Con SQLSERVER_WRITERS > 1 cada lote se reparte por hash(supermercado, nombre)
+    entre varias conexiones que escriben en paralelo, cada una en su propia
+    transaccion; como las particiones son disjuntas no compiten por las mismas
+    filas de idx_nombre_supermercado.
+    """
+    
+    nombre = 'sqlserver'
+    
+    # SQL Server admite como maximo 2100 parametros por sentencia y 1000 filas por VALUES
+    MAX_PARAMETROS = 2000
+    MAX_FILAS_VALUES = 1000
+    
+    MODOS = ('batch', 'staging')
+    
+    def __init__(self, modo='batch', spool_dir='spool', spool_format='ndjson.gz', escritores=1, database_url=None):
+        if modo not in self.MODOS:
+            raise ValueError(f"SQLSERVER_INGESTION_MODE invalido: {modo} (opciones: {', '.join(self.MODOS)})")
+        
+        self.test_mode = True
+        self.engine = None
+        self.indice = ProductoKeyIndex()
+        self.modo = modo
+        self.tabla_staging = None
+        
+        self.sin_conexion = False
+        self.spool = None
+        self.spool_dir = spool_dir
+        self.spool_format = spool_format
+        self.nombre_spool = None
+        
+        self.escritores = max(1, escritores)
+        self.pool_escritores = None
+        self._lock_round_trips = threading.Lock()
+        
+        db_url = resolver_database_url() if database_url is None else database_url
+        
+        if db_url and 'mssql' in db_url:
+            try:
+                if '+aioodbc://' in db_url:
+                    db_url = db_url.replace('+aioodbc://', '+pyodbc://')
+                
+                self.engine = create_engine(
+                    db_url,
+                    connect_args={"timeout": 30},
+                    pool_pre_ping=True,
+                    pool_recycle=3600,
+                    pool_size=max(5, self.escritores + 1),
+                    fast_executemany=True,
+                )
+                event.listen(self.engine, 'before_cursor_execute', self._contar_round_trip)
+                self.test_mode = False
+                logger.info(f"Conexion a SQL Server establecida: {db_url[:50]}...")
+            except Exception as e:
+                logger.warning(f"No se pudo crear el engine de SQL Server: {e} - los items iran al spool")
+                self.test_mode = False
+                self.sin_conexion = True
+        else:
+            logger.warning("DATABASE_URL no configurada - Modo prueba activo")
+    
+    def _contar_round_trip(self, conn, cursor, statement, parameters, context, executemany):
+        # executemany con fast_executemany tambien es un solo envio
+        with self._lock_round_trips:
+            self.round_trips += 1
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            modo=settings.get('SQLSERVER_INGESTION_MODE', 'batch'),
+            spool_dir=settings.get('SQLSERVER_SPOOL_DIR', 'spool'),
+            spool_format=settings.get('SQLSERVER_SPOOL_FORMAT', 'ndjson.gz'),
+            escritores=settings.getint('SQLSERVER_WRITERS', 1),
+            database_url=resolver_database_url(settings),
+        )
+    
+    def abrir(self, spider):
+        self.nombre_spool = f"{spider.name}_{time.strftime('%Y%m%d_%H%M%S')}"
+        if not self.sin_conexion and not self._probar_conexion():
+            self.sin_conexion = True
+        if self.sin_conexion:
+            logger.warning(f"SQL Server no disponible - los items se guardaran en {self.spool_dir}/")
+            return
+        
+        self._asegurar_esquema()
+        if self.modo == 'staging':
+            self._crear_staging(spider)
+            return
+        
+        supermercado = getattr(spider, 'supermercado', None)
+        if supermercado:
+            try:
+                with self.engine.connect() as conn:
+                    self._cargar_indice(conn, supermercado)
+            except Exception as e:
+                logger.warning(f"No se pudo precargar el indice de {supermercado}: {e}")
+    
+    def escribir(self, lote):
+        """Escribe el lote en una sola transaccion; si falla, lo manda al spool"""
+        if self.sin_conexion:
+            self._enviar_a_spool(lote)
+            return {}
+        if self.modo == 'batch' and self.escritores > 1 and len(lote) > 1:
+            return self._escribir_en_paralelo(lote)
+        
+        try:
+            with self.engine.begin() as conn:
+                if self.modo == 'staging':
+                    self._cargar_staging(conn, lote)
+                    return {'staging/filas': len(lote)}
+                resumen, cambios = self._escribir_lote(conn, lote)
+        except Exception as e:
+            logger.error(f"Error guardando lote de {len(lote)} productos: {e}")
+            self._enviar_a_spool(lote)
+            return {'lotes_fallidos': 1}
+        
+        # El indice solo se actualiza si la transaccion se confirmo
+        for supermercado, nombre, producto_id, precio, hash_fila in cambios:
+            self.indice.set(supermercado, nombre, producto_id, precio, hash_fila)
+        return resumen
+    
+    def _escribir_en_paralelo(self, lote):
+        """Escribe cada particion del lote en su propia conexion y transaccion
+        
+        Si una particion falla solo esa va al spool; las demas quedan confirmadas.
+        """
+        # El indice se carga antes: los hilos solo lo leen
+        supermercados = {fila['supermercado'] for fila in lote}
+        try:
+            with self.engine.connect() as conn:
+                for supermercado in supermercados:
+                    if not self.indice.cargado(supermercado):
+                        self._cargar_indice(conn, supermercado)
+        except Exception as e:
+            logger.error(f"Error cargando el indice para un lote de {len(lote)} productos: {e}")
+            self._enviar_a_spool(lote)
+            return {'lotes_fallidos': 1}
+        
+        if self.pool_escritores is None:
+            self.pool_escritores = ThreadPoolExecutor(
+                max_workers=self.escritores, thread_name_prefix='sqlserver-escritor'
+            )
+        particiones = [p for p in particionar_filas(lote, self.escritores) if p]
+        futuros = [(p, self.pool_escritores.submit(self._escribir_particion, p)) for p in particiones]
+        
+        resumen = Counter()
+        for particion, futuro in futuros:
+            try:
+                parcial, cambios = futuro.result()
+            except Exception as e:
+                logger.error(f"Error guardando particion de {len(particion)} productos: {e}")
+                self._enviar_a_spool(particion)
+                resumen['lotes_fallidos'] += 1
+                continue
+            for supermercado, nombre, producto_id, precio, hash_fila in cambios:
+                self.indice.set(supermercado, nombre, producto_id, precio, hash_fila)
+            resumen.update(parcial)
+        resumen['particiones'] = len(particiones)
+        return dict(resumen)
+    
+    def _escribir_particion(self, particion):
+        with self.engine.begin() as conn:
+            return self._escribir_lote(conn, particion)
+    
+    def cerrar(self, spider):
+        if self.pool_escritores is not None:
+            self.pool_escritores.shutdown(wait=True)
+            self.pool_escritores = None
+        
+        if self.sin_conexion:
+            pass
+        elif self.modo == 'staging':
+            self._merge_staging()
+        else:
+            memoria_kb = self.indice.memoria_bytes() / 1024
+            logger.info(f"Indice de productos: {len(self.indice)} claves, ~{memoria_kb:.0f} KB")
+            self.set_stat('sqlserver/indice/productos', len(self.indice))
+            self.set_stat('sqlserver/indice/bytes', self.indice.memoria_bytes())
+        
+        if self.spool is not None:
+            self.spool.cerrar()
+            logger.warning(
+                f"Hay filas pendientes en {self.spool.ruta} - cargalas con: scrapy replay_spool {self.spool.ruta}"
+            )
+            self.spool = None
+        if self.engine:
+            self.engine.dispose()
+    
+    def _enviar_a_spool(self, lote):
+        """Agrega el lote al spool local; solo si tambien falla el disco se pierden items"""
+        try:
+            if self.spool is None:
+                ruta = ruta_spool(self.spool_dir, self.nombre_spool or 'productos', self.spool_format)
+                self.spool = abrir_spool(ruta)
+            self.spool.escribir(lote)
+        except Exception as e:
+            logger.error(f"Error escribiendo {len(lote)} productos en el spool: {e}")
+            self.inc_stat('sqlserver/items_perdidos', len(lote))
+            return
+        self.inc_stat('sqlserver/spool/filas', len(lote))
+    
+    def _probar_conexion(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo conectar a SQL Server: {e}")
+            return False
+    
+    def reproducir_spool(self, ruta, batch_size=500):
+        """Carga en Hardos.productos las filas de un spool, por lotes de batch_size
+        
+        Cada lote usa el mismo upsert que el crawl y su propia transaccion; si uno
+        falla la excepcion se propaga y los lotes previos quedan confirmados (volver
+        a cargarlos no duplica productos). Devuelve el total de filas cargadas.
+        """
+        self._asegurar_esquema()
+        total = 0
+        lote = []
+        for fila in leer_spool(ruta):
+            lote.append(fila)
+            if len(lote) >= batch_size:
+                total += self._reproducir_lote(lote)
+                lote = []
+        if lote:
+            total += self._reproducir_lote(lote)
+        return total
+    
+    def _reproducir_lote(self, filas):
+        # Los spools anteriores a las columnas sku/ean no las traen
+        for fila in filas:
+            fila.setdefault('sku', None)
+            fila.setdefault('ean', None)
+        lote = deduplicar_filas(filas)
+        with self.engine.begin() as conn:
+            resumen, cambios = self._escribir_lote(conn, lote)
+        for supermercado, nombre, producto_id, precio, hash_fila in cambios:
+            self.indice.set(supermercado, nombre, producto_id, precio, hash_fila)
+        logger.info(
+            f"Spool: {resumen['insertados']} nuevos, {resumen['actualizados']} actualizados, "
+            f"{resumen['escrituras_evitadas']} sin cambios"
+        )
+        return len(filas)
+    
+    def _escribir_lote(self, conn, lote):
+        """Escribe el lote y devuelve (resumen de escrituras, cambios para el indice)
+        
+        Solo se reescriben los productos cuyo hash_contenido cambio; al resto se le
+        actualiza fecha_extraccion con un unico UPDATE por grupo de ids.
+        """
+        for supermercado in {fila['supermercado'] for fila in lote}:
+            if not self.indice.cargado(supermercado):
+                self._cargar_indice(conn, supermercado)
+        
+        insertar, actualizar, vistos, historial = clasificar_filas(self.indice, lote)
+        cambios = [
+            (fila['supermercado'], fila['nombre'], fila['id'], fila['precio_actual'], fila['hash_contenido'])
+            for fila in actualizar
+        ]
+        
+        columnas = ('id', 'precio_actual', 'descuento', 'presentacion', 'url', 'imagen_url', 'sku', 'ean',
+                    'hash_contenido')
+        for grupo in self._chunks(actualizar, len(columnas)):
+            valores, params = construir_values(grupo, columnas)
+            conn.execute(sql_values(f"""
+                UPDATE p
+                SET precio_anterior = CASE WHEN p.precio_actual <> v.precio_actual
+                                           THEN p.precio_actual ELSE p.precio_anterior END,
+                    precio_actual = v.precio_actual,
+                    descuento_porcentaje = CAST(v.descuento AS DECIMAL(5, 2)),
+                    presentacion = COALESCE(v.presentacion, p.presentacion),
+                    url = COALESCE(v.url, p.url),
+                    imagen_url = COALESCE(v.imagen_url, p.imagen_url),
+                    sku = COALESCE(v.sku, p.sku),
+                    ean = COALESCE(v.ean, p.ean),
+                    hash_contenido = v.hash_contenido,
+                    fecha_extraccion = GETDATE()
+                FROM Hardos.productos AS p
+                JOIN (VALUES {valores}) AS v (id, precio_actual, descuento, presentacion,
+                                             url, imagen_url, sku, ean, hash_contenido)
+                    ON p.id = v.id
+            """), params)
+        
+        marcar_vistos = text("""
+            UPDATE Hardos.productos SET fecha_extraccion = GETDATE()
+            WHERE id IN :ids
+        """).bindparams(bindparam('ids', expanding=True))
+        for i in range(0, len(vistos), self.MAX_PARAMETROS):
+            conn.execute(marcar_vistos, {'ids': vistos[i:i + self.MAX_PARAMETROS]})
+        
+        columnas = ('supermercado', 'nombre', 'marca', 'categoria', 'presentacion',
+                    'precio_actual', 'precio_anterior', 'descuento', 'url', 'imagen_url',
+                    'sku', 'ean', 'hash_contenido')
+        for grupo in self._chunks(insertar, len(columnas)):
+            valores, params = construir_values(grupo, columnas)
+            nuevos = conn.execute(sql_values(f"""
+                INSERT INTO Hardos.productos 
+                (supermercado, nombre, marca, categoria, presentacion, 
+                 precio_actual, precio_anterior, descuento_porcentaje, url, imagen_url,
+                 sku, ean, hash_contenido)
+                OUTPUT INSERTED.id, INSERTED.supermercado, INSERTED.nombre,
+                       INSERTED.precio_actual, INSERTED.descuento_porcentaje,
+                       INSERTED.hash_contenido
+                VALUES {valores}
+            """), params).fetchall()
+            for producto_id, supermercado, nombre, precio, descuento, hash_fila in nuevos:
+                cambios.append((supermercado, nombre, producto_id, precio, hash_fila))
+                historial.append({
+                    'producto_id': producto_id,
+                    'supermercado': supermercado,
+                    'precio': precio,
+                    'descuento': descuento,
+                })
+        
+        self._insertar_historial(conn, historial)
+        
+        resumen = {
+            'insertados': len(insertar),
+            'actualizados': len(actualizar),
+            'escrituras_evitadas': len(vistos),
+            'historial': len(historial),
+        }
+        return resumen, cambios
+    
+    def _insertar_historial(self, conn, historial):
+        """Agrega a Hardos.precio_historial las observaciones con precio nuevo"""
+        columnas = ('producto_id', 'supermercado', 'precio', 'descuento')
+        for grupo in self._chunks(historial, len(columnas)):
+            valores, params = construir_values(grupo, columnas)
+            conn.execute(sql_values(f"""
+                INSERT INTO Hardos.precio_historial
+                (producto_id, supermercado, precio, descuento_porcentaje)
+                VALUES {valores}
+            """), params)
+    
+    def _cargar_indice(self, conn, supermercado):
+        """Carga (id, nombre, precio_actual, hash_contenido) de todos los productos de un supermercado"""
+        inicio = time.monotonic()
+        filas = conn.execute(text("""
+            SELECT id, nombre, precio_actual, hash_contenido FROM Hardos.productos 
+            WHERE supermercado = :supermercado
+        """), {'supermercado': supermercado})
+        total = self.indice.cargar(supermercado, filas)
+        logger.info(f"Indice de {supermercado} cargado: {total} productos en {time.monotonic() - inicio:.2f}s")
+    
+    def _asegurar_esquema(self):
+        """Agrega hash_contenido, sku y ean a Hardos.productos y crea Hardos.precio_historial si no existen"""
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("""
+                    IF COL_LENGTH('Hardos.productos', 'hash_contenido') IS NULL
+                        ALTER TABLE Hardos.productos ADD hash_contenido BIGINT NULL;
+                    IF COL_LENGTH('Hardos.productos', 'sku') IS NULL
+                        ALTER TABLE Hardos.productos ADD sku NVARCHAR(50) NULL;
+                    IF COL_LENGTH('Hardos.productos', 'ean') IS NULL
+                        ALTER TABLE Hardos.productos ADD ean NVARCHAR(20) NULL;
+                """))
+        except Exception as e:
+            logger.warning(f"No se pudieron verificar las columnas de Hardos.productos: {e}")
+        
+        # Mismo esquema que app.models.precio_historial (la API puede no haber corrido create_all)
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("""
+                    IF OBJECT_ID('Hardos.precio_historial', 'U') IS NULL
+                    BEGIN
+                        CREATE TABLE Hardos.precio_historial (
+                            id BIGINT IDENTITY(1, 1) NOT NULL,
+                            producto_id INT NOT NULL,
+                            supermercado NVARCHAR(100) NOT NULL,
+                            precio DECIMAL(10, 2) NOT NULL,
+                            descuento_porcentaje DECIMAL(5, 2) NULL,
+                            fecha_observacion DATETIME NOT NULL DEFAULT GETDATE(),
+                            CONSTRAINT pk_precio_historial PRIMARY KEY NONCLUSTERED (id)
+                        );
+                        CREATE CLUSTERED INDEX idx_historial_producto_fecha
+                            ON Hardos.precio_historial (producto_id, fecha_observacion);
+                    END
+                """))
+        except Exception as e:
+            logger.warning(f"No se pudo verificar la tabla precio_historial: {e}")
+    
+    def _crear_staging(self, spider):
+        """Crea la tabla de staging de esta ejecucion (heap sin indices: carga rapida)"""
+        sufijo = re.sub(r'\W', '_', spider.name)
+        self.tabla_staging = f"Hardos.stg_productos_{sufijo}_{uuid.uuid4().hex[:8]}"
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE {self.tabla_staging} (
+                    seq INT IDENTITY(1, 1) NOT NULL,
+                    supermercado NVARCHAR(100) NOT NULL,
+                    nombre NVARCHAR(500) NOT NULL,
+                    marca NVARCHAR(200) NULL,
+                    categoria NVARCHAR(200) NULL,
+                    presentacion NVARCHAR(100) NULL,
+                    precio_actual DECIMAL(10, 2) NOT NULL,
+                    precio_anterior DECIMAL(10, 2) NULL,
+                    descuento DECIMAL(5, 2) NULL,
+                    url NVARCHAR(2000) NULL,
+                    imagen_url NVARCHAR(2000) NULL,
+                    sku NVARCHAR(50) NULL,
+                    ean NVARCHAR(20) NULL,
+                    hash_contenido BIGINT NOT NULL
+                )
+            """))
+        logger.info(f"Modo staging: cargando items en {self.tabla_staging}")
+    
+    def _cargar_staging(self, conn, lote):
+        """Inserta el lote en staging con executemany (fast_executemany en pyodbc)"""
+        conn.execute(text(f"""
+            INSERT INTO {self.tabla_staging}
+            (supermercado, nombre, marca, categoria, presentacion,
+             precio_actual, precio_anterior, descuento, url, imagen_url, sku, ean, hash_contenido)
+            VALUES
+            (:supermercado, :nombre, :marca, :categoria, :presentacion,
+             :precio_actual, :precio_anterior, :descuento, :url, :imagen_url, :sku, :ean, :hash_contenido)
+        """), lote)
+    
+    def _merge_staging(self):
+        """Reconcilia staging con Hardos.productos en un solo MERGE y elimina staging
+        
+        Por producto gana la ultima fila cargada. Los productos con el mismo
+        hash_contenido solo actualizan fecha_extraccion; los nuevos se insertan y
+        los que cambiaron se reescriben, rotando precio_anterior si cambio el
+        precio. Los productos nuevos y los cambios de precio quedan registrados en
+        Hardos.precio_historial.
+        """
+        if not self.tabla_staging:
+            return
+        
+        inicio = time.monotonic()
+        try:
+            with self.engine.begin() as conn:
+                insertados, actualizados, vistos = conn.execute(text(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @vistos INT;
+                    DECLARE @cambios TABLE (
+                        accion NVARCHAR(10),
+                        producto_id INT,
+                        supermercado NVARCHAR(100),
+                        precio DECIMAL(10, 2),
+                        descuento DECIMAL(5, 2),
+                        precio_previo DECIMAL(10, 2)
+                    );
+                    
+                    WITH repetidas AS (
+                        SELECT ROW_NUMBER() OVER (
+                            PARTITION BY supermercado, nombre ORDER BY seq DESC
+                        ) AS n
+                        FROM {self.tabla_staging}
+                    )
+                    DELETE FROM repetidas WHERE n > 1;
+                    
+                    UPDATE p SET fecha_extraccion = GETDATE()
+                    FROM Hardos.productos AS p
+                    JOIN {self.tabla_staging} AS s
+                        ON p.supermercado = s.supermercado AND p.nombre = s.nombre
+                    WHERE p.hash_contenido = s.hash_contenido;
+                    SET @vistos = @@ROWCOUNT;
+                    
+                    MERGE Hardos.productos WITH (HOLDLOCK) AS p
+                    USING {self.tabla_staging} AS s
+                    ON p.supermercado = s.supermercado AND p.nombre = s.nombre
+                    WHEN MATCHED AND (p.hash_contenido IS NULL OR p.hash_contenido <> s.hash_contenido) THEN
+                        UPDATE SET precio_anterior = CASE WHEN p.precio_actual <> s.precio_actual
+                                                          THEN p.precio_actual ELSE p.precio_anterior END,
+                                   precio_actual = s.precio_actual,
+                                   descuento_porcentaje = s.descuento,
+                                   presentacion = COALESCE(s.presentacion, p.presentacion),
+                                   url = COALESCE(s.url, p.url),
+                                   imagen_url = COALESCE(s.imagen_url, p.imagen_url),
+                                   sku = COALESCE(s.sku, p.sku),
+                                   ean = COALESCE(s.ean, p.ean),
+                                   hash_contenido = s.hash_contenido,
+                                   fecha_extraccion = GETDATE()
+                    WHEN NOT MATCHED BY TARGET THEN
+                        INSERT (supermercado, nombre, marca, categoria, presentacion,
+                                precio_actual, precio_anterior, descuento_porcentaje, url, imagen_url,
+                                sku, ean, hash_contenido)
+                        VALUES (s.supermercado, s.nombre, s.marca, s.categoria, s.presentacion,
+                                s.precio_actual, s.precio_anterior, s.descuento, s.url, s.imagen_url,
+                                s.sku, s.ean, s.hash_contenido)
+                    OUTPUT $action, inserted.id, inserted.supermercado,
+                           inserted.precio_actual, inserted.descuento_porcentaje,
+                           deleted.precio_actual
+                    INTO @cambios;
+                    
+                    INSERT INTO Hardos.precio_historial
+                    (producto_id, supermercado, precio, descuento_porcentaje)
+                    SELECT producto_id, supermercado, precio, descuento FROM @cambios
+                    WHERE accion = 'INSERT' OR precio <> precio_previo;
+                    
+                    SELECT
+                        COALESCE(SUM(CASE WHEN accion = 'INSERT' THEN 1 ELSE 0 END), 0),
+                        COALESCE(SUM(CASE WHEN accion = 'UPDATE' THEN 1 ELSE 0 END), 0),
+                        @vistos
+                    FROM @cambios;
+                """)).fetchone()
+                conn.execute(text(f"DROP TABLE {self.tabla_staging}"))
+        except Exception as e:
+            logger.error(f"Error en MERGE desde {self.tabla_staging}: {e} - la tabla se conserva para reintentar")
+            self.inc_stat('sqlserver/merge_fallidos')
+            return
+        
+        logger.info(
+            f"MERGE completado: {insertados} nuevos, {actualizados} actualizados, "
+            f"{vistos} sin cambios en {time.monotonic() - inicio:.2f}s"
+        )
+        self.inc_stat('sqlserver/insertados', insertados)
+        self.inc_stat('sqlserver/actualizados', actualizados)
+        self.inc_stat('sqlserver/escrituras_evitadas', vistos)
+        self.tabla_staging = None
+    
+    def _chunks(self, filas, num_columnas):
+        tamano = min(self.MAX_FILAS_VALUES, self.MAX_PARAMETROS // num_columnas)
+        for i in range(0, len(filas), tamano):
+            yield filas[i:i + tamano]
+
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    supermercado TEXT NOT NULL COLLATE NOCASE,
+    nombre TEXT NOT NULL COLLATE NOCASE,
+    marca TEXT,
+    categoria TEXT,
+    presentacion TEXT,
+    precio_actual REAL NOT NULL,
+    precio_anterior REAL,
+    descuento_porcentaje REAL,
+    url TEXT,
+    imagen_url TEXT,
+    sku TEXT,
+    ean TEXT,
+    hash_contenido INTEGER,
+    fecha_extraccion TEXT DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_nombre_supermercado ON productos (nombre, supermercado);
+CREATE TABLE IF NOT EXISTS precio_historial (
+    id INTEGER PRIMARY KEY,
+    producto_id INTEGER NOT NULL,
+    supermercado TEXT NOT NULL,
+    precio REAL NOT NULL,
+    descuento_porcentaje REAL,
+    fecha_observacion TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_historial_producto_fecha ON precio_historial (producto_id, fecha_observacion);
+"""
+
+
+class SQLiteSink(Sink):
+    """Sink con el mismo upsert que SQLServerSink sobre un archivo SQLite local
+    
+    Replica Hardos.productos y Hardos.precio_historial; sirve para crawls sin
+    SQL Server y para probar la ingestion completa sin red.
+    """
+    
+    nombre = 'sqlite'
+    
+    def __init__(self, ruta='productos.sqlite'):
+        self.ruta = ruta
+        self.conn = None
+        self.indice = ProductoKeyIndex()
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(ruta=settings.get('SQLITE_SINK_PATH', 'productos.sqlite'))
+    
+    def abrir(self, spider):
+        # El escritor asincrono usa la conexion desde su propio hilo
+        self.conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(ESQUEMA_SQLITE)
+        # Archivos creados antes de las columnas sku/ean
+        columnas = {fila[1] for fila in self.conn.execute("PRAGMA table_info(productos)")}
+        for columna in ('sku', 'ean'):
+            if columna not in columnas:
+                self.conn.execute(f"ALTER TABLE productos ADD COLUMN {columna} TEXT")
+    
+    def escribir(self, lote):
+        with self.conn:
+            for supermercado in {fila['supermercado'] for fila in lote}:
+                if not self.indice.cargado(supermercado):
+                    filas = self.conn.execute(
+                        "SELECT id, nombre, precio_actual, hash_contenido FROM productos WHERE supermercado = ?",
+                        (supermercado,),
+                    ).fetchall()
+                    self.indice.cargar(supermercado, filas)
+            
+            insertar, actualizar, vistos, historial = clasificar_filas(self.indice, lote)
+            self.conn.executemany("""
+                UPDATE productos
+                SET precio_anterior = CASE WHEN precio_actual <> :precio_actual
+                                           THEN precio_actual ELSE precio_anterior END,
+                    precio_actual = :precio_actual,
+                    descuento_porcentaje = :descuento,
+                    presentacion = COALESCE(:presentacion, presentacion),
+                    url = COALESCE(:url, url),
+                    imagen_url = COALESCE(:imagen_url, imagen_url),
+                    sku = COALESCE(:sku, sku),
+                    ean = COALESCE(:ean, ean),
+                    hash_contenido = :hash_contenido,
+                    fecha_extraccion = CURRENT_TIMESTAMP,
+                    fecha_actualizacion = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """, actualizar)
+            self.conn.executemany(
+                "UPDATE productos SET fecha_extraccion = CURRENT_TIMESTAMP WHERE id = ?",
+                [(producto_id,) for producto_id in vistos],
+            )
+            
+            cambios = [(f['supermercado'], f['nombre'], f['id'], f['precio_actual'], f['hash_contenido'])
+                       for f in actualizar]
+            for fila in insertar:
+                cursor = self.conn.execute("""
+                    INSERT INTO productos
+                    (supermercado, nombre, marca, categoria, presentacion,
+                     precio_actual, precio_anterior, descuento_porcentaje, url, imagen_url,
+                     sku, ean, hash_contenido)
+                    VALUES (:supermercado, :nombre, :marca, :categoria, :presentacion,
+                            :precio_actual, :precio_anterior, :descuento, :url, :imagen_url,
+                            :sku, :ean, :hash_contenido)
+                """, fila)
+                historial.append(fila_historial(cursor.lastrowid, fila))
+                cambios.append((fila['supermercado'], fila['nombre'], cursor.lastrowid,
+                                fila['precio_actual'], fila['hash_contenido']))
+            
+            self.conn.executemany("""
+                INSERT INTO precio_historial (producto_id, supermercado, precio, descuento_porcentaje)
+                VALUES (:producto_id, :supermercado, :precio, :descuento)
+            """, historial)
+        
+        for supermercado, nombre, producto_id, precio, hash_fila in cambios:
+            self.indice.set(supermercado, nombre, producto_id, precio, hash_fila)
+        return {
+            'insertados': len(insertar),
+            'actualizados': len(actualizar),
+            'escrituras_evitadas': len(vistos),
+            'historial': len(historial),
+        }
+    
+    def cerrar(self, spider):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        logger.info(f"Productos guardados en {self.ruta}")
+
+
+class NDJSONSink(Sink):
+    """Sink que escribe cada fila apenas llega como JSON Lines, rotando por tamano
+    
+    Es el destino del modo prueba (sin DATABASE_URL).
+    """
+    
+    nombre = 'ndjson'
+    streaming = True
+    items_completos = True
+    
+    def __init__(self, directorio='output', compresion=None, max_bytes=64 * 1024 * 1024):
+        self.directorio = directorio
+        self.compresion = compresion
+        self.max_bytes = max_bytes
+        self.writer = None
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            directorio=settings.get('EXPORT_DIR', 'output'),
+            compresion=settings.get('EXPORT_COMPRESSION'),
+            max_bytes=settings.getint('EXPORT_MAX_BYTES', 64 * 1024 * 1024),
+        )
+    
+    def abrir(self, spider):
+        self.writer = RotatingJSONLWriter(
+            self.directorio, f"{spider.name}_productos",
+            compresion=self.compresion, max_bytes=self.max_bytes,
+        )
+    
+    def escribir(self, lote):
+        for fila in lote:
+            self.writer.escribir(fila)
+        return {'exportados': len(lote)}
+    
+    def cerrar(self, spider):
+        if self.writer is None:
+            return
+        self.writer.cerrar()
+        logger.info(
+            f"Guardados {self.writer.total} productos en {len(self.writer.archivos)} archivos "
+            f"(indice: {self.writer.ruta_indice})"
+        )
+
+
+class ParquetSink(Sink):
+    """Sink que escribe un row group de Parquet por lote (requiere pyarrow)
+    
+    Las columnas son los campos de los items; los que un spider no llena quedan
+    en null.
+    """
+    
+    nombre = 'parquet'
+    items_completos = True
+    
+    DECIMALES = ('precio_actual', 'precio_anterior', 'precio_lista', 'descuento_porcentaje')
+    TEXTOS = (
+        'supermercado', 'nombre', 'marca', 'categoria', 'presentacion', 'url', 'imagen_url',
+        'sku', 'ean', 'vendedor', 'fecha_extraccion',
+    )
+    
+    def __init__(self, directorio='output'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("INGESTION_SINK = 'parquet' necesita pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        self.pq = pq
+        self.directorio = directorio
+        self.writer = None
+        self.ruta = None
+        self.esquema = pa.schema(
+            [(campo, pa.string()) for campo in self.TEXTOS] + [(campo, pa.float64()) for campo in self.DECIMALES]
+        )
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(directorio=settings.get('EXPORT_DIR', 'output'))
+    
+    def abrir(self, spider):
+        os.makedirs(self.directorio, exist_ok=True)
+        self.ruta = os.path.join(self.directorio, f"{spider.name}_productos.parquet")
+        self.writer = self.pq.ParquetWriter(self.ruta, self.esquema, compression='zstd')
+    
+    def escribir(self, lote):
+        filas = [self._columnas(item) for item in lote]
+        self.writer.write_table(self.pa.Table.from_pylist(filas, schema=self.esquema))
+        return {'exportados': len(lote)}
+    
+    def _columnas(self, item):
+        fila = {}
+        for campo in self.TEXTOS:
+            valor = item.get(campo)
+            fila[campo] = str(valor) if valor is not None else None
+        for campo in self.DECIMALES:
+            valor = item.get(campo)
+            fila[campo] = float(valor) if valor not in (None, '') else None
+        return fila
+    
+    def cerrar(self, spider):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            logger.info(f"Productos guardados en {self.ruta}")
+
+
+SINKS = {
+    'sqlserver': SQLServerSink,
+    'sqlite': SQLiteSink,
+    'ndjson': NDJSONSink,
+    'parquet': ParquetSink,
+}
+
+
+def crear_sink(settings, nombre=None):
+    """Crea el sink de INGESTION_SINK (nombre corto o ruta a una clase Sink)
+    
+    Si SQL Server no esta configurado se usa NDJSONSink (modo prueba).
+    """
+    nombre = nombre or settings.get('INGESTION_SINK', 'sqlserver')
+    if nombre in SINKS:
+        sink_cls = SINKS[nombre]
+    else:
+        from scrapy.utils.misc import load_object
+        sink_cls = load_object(nombre)
+    
+    sink = sink_cls.from_settings(settings)
+    if getattr(sink, 'test_mode', False):
+        logger.warning("SQL Server no configurado - Modo prueba: los items se exportan como JSON Lines")
+        return NDJSONSink.from_settings(settings)
+    return sink
+
+
+def clasificar_filas(indice, lote):
+    """Separa un lote segun el indice en (insertar, actualizar, vistos, historial)
+    
+    actualizar lleva el id de cada fila; vistos son los ids sin cambios de
+    contenido e historial las observaciones de productos existentes cuyo precio
+    cambio (los insertados se agregan al conocer su id).
+    """
+    insertar = []
+    actualizar = []
+    vistos = []
+    historial = []
+    for fila in lote:
+        existente = indice.get(fila['supermercado'], fila['nombre'])
+        if existente is None:
+            insertar.append(fila)
+            continue
+        
+        producto_id, precio_previo, hash_previo = existente
+        if hash_previo == fila['hash_contenido']:
+            vistos.append(producto_id)
+            continue
+        
+        actualizar.append(dict(fila, id=producto_id))
+        if round(precio_previo, 2) != round(fila['precio_actual'], 2):
+            historial.append(fila_historial(producto_id, fila))
+    return insertar, actualizar, vistos, historial
+
+
+def fila_historial(producto_id, fila):
+    return {
+        'producto_id': producto_id,
+        'supermercado': fila['supermercado'],
+        'precio': fila['precio_actual'],
+        'descuento': fila['descuento'],
+    }
+
+
+@lru_cache(maxsize=64)
+def sql_values(sql):
+    """text() de una sentencia con VALUES, cacheado por su texto
+    
+    Parsear miles de parametros en cada lote cuesta mas CPU que armar las filas;
+    con grupos de tamano fijo el texto se repite y se parsea una sola vez.
+    """
+    return text(sql)
+
+
+def construir_values(filas, columnas):
+    """Construye un bloque VALUES (...), (...) con parametros nombrados"""
+    tuplas = []
+    params = {}
+    for i, fila in enumerate(filas):
+        marcadores = []
+        for columna in columnas:
+            nombre = f"{columna}_{i}"
+            marcadores.append(f":{nombre}")
+            params[nombre] = fila[columna]
+        tuplas.append(f"({', '.join(marcadores)})")
+    return ', '.join(tuplas), params
@@ -1,10 +1,15 @@
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
 import re
 
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_espera
+from ..items import fecha_extraccion
+
+_PARAMETRO_PAGINA = re.compile(r'[?&]p=(\d+)')
+
 class AraSpider(scrapy.Spider):
     name = "ara"
+    supermercado = "ARA"
     allowed_domains = ["losprecios.co"]
     
     custom_settings = {
@@ -13,51 +18,65 @@ class AraSpider(scrapy.Spider):
         'PLAYWRIGHT_BROWSER_TYPE': 'chromium',
         'PLAYWRIGHT_LAUNCH_OPTIONS': {
             'headless': True,
-        }
+        },
+        # Los productos se leen de los atributos data-* de sus botones (ESPEC): tampoco hace falta el CSS
+        'BLOQUEO_TIPOS': ['image', 'font', 'media', 'stylesheet'],
     }
     
+    # Cada producto es un boton "editar precio" con los datos en atributos
+    PRODUCT_SELECTOR = 'button.b-ed-pr[data-n-tienda="Ara"]'
+    
+    ESPEC = EspecExtraccion(PRODUCT_SELECTOR, {
+        'nombre': '::attr(data-n-ítem)',
+        'precio': '::attr(data-precio)',
+        'imagen': '::attr(data-img-ítem)',
+    })
+    
+    # Paginador: enlaces "Página N" al pie de la lista (hoy solo la siguiente)
+    PAGINADOR_SELECTOR = '.cn-b-pag a[href*="p="]::attr(href)'
+    
     def start_requests(self):
         urls = [
             'https://losprecios.co/ara_t2',
         ]
         
         for url in urls:
-            yield scrapy.Request(
-                url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 10000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000),
-                    ],
-                    'page': 1
-                },
-                callback=self.parse,
-            )
+            yield self.peticion_pagina(url, 1)
+    
+    def peticion_pagina(self, url, page):
+        return scrapy.Request(
+            url,
+            meta={
+                'playwright': True,
+                'playwright_page_methods': metodos_espera(self.PRODUCT_SELECTOR, self.settings),
+                'page': page
+            },
+            callback=self.parse,
+        )
     
     def parse(self, response):
         page = response.meta.get('page', 1)
         self.logger.info(f'URL scrapeada: {response.url} (Página {page})')
         
-        html = response.text
+        productos = self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
         
-        productos = []
-        patrón = r'<button[^>]*class="btn btn-secondary btn-xs b-ed-pr"[^>]*data-n-tienda="Ara"[^>]*data-n-ítem="([^"]+)"[^>]*data-precio="([^"]+)"[^>]*data-img-ítem="([^"]*)"[^>]*>'
+        self.logger.info(f'Productos encontrados en página {page}: {len(productos)}')
         
-        matches = re.findall(patrón, html)
-        
-        self.logger.info(f'Productos encontrados en página {page}: {len(matches)}')
-        
-        if not matches and page == 1:
-            self.logger.warning('No se encontraron productos en la primera página. Guardando HTML para debug...')
-            with open('ara_debug.html', 'w', encoding='utf-8') as f:
-                f.write(html)
-            self.logger.warning('HTML guardado en ara_debug.html')
+        if not productos:
+            if page == 1:
+                self.logger.warning('No se encontraron productos en la primera página. Guardando HTML para debug...')
+                with open('ara_debug.html', 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+                self.logger.warning('HTML guardado en ara_debug.html')
+            else:
+                self.logger.info(f'Página {page} sin productos. Fin de la paginación.')
             return
         
         productos_scraped = 0
-        for nombre, precio_texto, imagen in matches:
+        for producto in productos:
+            nombre, precio_texto, imagen = producto['nombre'], producto['precio'], producto['imagen']
+            if not nombre:
+                continue
             try:
                 precio_actual = self.limpiar_precio(precio_texto)
                 if precio_actual:
@@ -72,7 +91,7 @@ class AraSpider(scrapy.Spider):
                         'descuento_porcentaje': None,
                         'url': response.url,
                         'imagen_url': imagen if imagen else None,
-                        'fecha_extraccion': datetime.utcnow().isoformat(),
+                        'fecha_extraccion': fecha_extraccion(),
                     }
                     yield item
                     productos_scraped += 1
@@ -82,37 +101,45 @@ class AraSpider(scrapy.Spider):
         
         self.logger.info(f'Productos scrapeados en página {page}: {productos_scraped}')
         
-        next_page = page + 1
-        next_url = f'https://losprecios.co/ara_t2?p={next_page}'
+        siguientes = self.paginas_siguientes(response, page)
+        if not siguientes:
+            self.logger.info(f'Página {page} es la última. Fin de la paginación.')
+            return
         
-        yield scrapy.Request(
-            next_url,
-            meta={
-                'playwright': True,
-                'playwright_page_methods': [
-                    PageMethod('wait_for_timeout', 10000),
-                    PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                    PageMethod('wait_for_timeout', 3000),
-                ],
-                'page': next_page
-            },
-            callback=self.parse,
-        )
+        # Se piden todas las paginas que muestra el paginador: si trae el total
+        # salen a la vez desde la pagina 1; el dupefilter descarta las repetidas
+        for numero, url in siguientes:
+            yield self.peticion_pagina(url, numero)
+    
+    def paginas_siguientes(self, response, page):
+        """(numero, url) de las paginas posteriores a `page` enlazadas en el paginador"""
+        paginas = {}
+        for href in response.css(self.PAGINADOR_SELECTOR).getall():
+            numero = _PARAMETRO_PAGINA.search(href)
+            if numero and int(numero.group(1)) > page:
+                paginas[int(numero.group(1))] = response.urljoin(href)
+        return sorted(paginas.items())
     
     def limpiar_precio(self, precio_texto):
-        """Limpia precio en formato Colombia (miles con punto, decimales con coma)"""
+        """Limpia precio en formato Colombia (miles con punto, decimales con coma)
+
+        data-precio viene como 17000,0000: la coma es decimal salvo que separe
+        exactamente tres digitos (16,990).
+        """
         if not precio_texto:
             return None
         try:
-            precio_texto = precio_texto.strip()
-            precio_texto = re.sub(r'[^\d.,]', '', precio_texto)
+            precio_texto = re.sub(r'[^\d.,]', '', precio_texto.strip())
             
+            decimales = ''
             if ',' in precio_texto:
-                parts = precio_texto.rsplit(',', 1)
-                if len(parts[1]) <= 2:
-                    precio_texto = precio_texto.replace('.', '').replace(',', '.')
+                entero, parte = precio_texto.rsplit(',', 1)
+                if len(parte) != 3:
+                    precio_texto, decimales = entero, parte
             
-            precio_texto = precio_texto.replace('.', '')
+            precio_texto = precio_texto.replace('.', '').replace(',', '')
+            if decimales:
+                precio_texto = f'{precio_texto}.{decimales}'
             
             return float(precio_texto) if precio_texto else None
         except (ValueError, AttributeError):
@@ -1,11 +1,16 @@
 # https://www.carulla.com/aseo-del-hogar
 # scrapy runspider carulla_spider.py -o productos.json  esto es para correr el spider y guardar los productos en un archivo json
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
 import re
 from urllib.parse import urlparse, urlunparse
 
+from ..captura import CapturaJsonMixin
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_scroll
+from ..estado_crawl import SinCambios
+from ..items import fecha_extraccion
+from ..vtex import CatalogoVtexMixin
+
 # ============================================================================
 # SELECTORES CORREGIDOS BASADOS EN EL HTML REAL DE CARULLA
 # ============================================================================
@@ -17,11 +22,13 @@ from urllib.parse import urlparse, urlunparse
 # Imagen: a[data-testid="product-link"] img::attr(src)
 # Link: a[data-testid="product-link"]::attr(href)
 # Precio unitario: span.product-unit_price-unit__text__qeheS
+# Vendedor: p[data-fs-product-name-container="true"] (texto despues de "Vendido por:")
 # ============================================================================
 
 
-class CarullaSpider(scrapy.Spider):
+class CarullaSpider(CapturaJsonMixin, CatalogoVtexMixin, scrapy.Spider):
     name = "carulla"
+    supermercado = "Carulla"
     allowed_domains = ["www.carulla.com"]
 
     custom_settings = {
@@ -36,87 +43,96 @@ class CarullaSpider(scrapy.Spider):
             'https': 'scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler',
         },
         'TWISTED_REACTOR': 'twisted.internet.asyncioreactor.AsyncioSelectorReactor',
+        # Crawl grande: carga en staging y un solo MERGE al terminar
+        'SQLSERVER_INGESTION_MODE': 'staging',
+        'INGESTION_BATCH_SIZE': 5000,
     }
 
     # Selector principal para productos (usar clase más estable)
     PRODUCT_SELECTOR = 'article[class*="productCard"]'
 
+    ESPEC = EspecExtraccion(PRODUCT_SELECTOR, {
+        'nombre': ('h3[class*="styles_name"]::text', 'h3::text'),
+        'precio': ('p[data-fs-container-price-otros="true"]::text', 'p[class*="ProductPrice_container__price"]::text'),
+        'precio_unitario': 'span[class*="price-unit__text"]::text',
+        'imagen': ('a[data-testid="product-link"] img::attr(src)', 'img::attr(src)'),
+        'url': 'a[data-testid="product-link"]::attr(href)',
+        'vendedor': 'p[data-fs-product-name-container="true"]::text',
+    })
+
+    CATEGORIAS = [
+        ('https://www.carulla.com/delicatessen', 'Delicatessen'), 
+        ('https://www.carulla.com/delicatessen/quesos','Quesos'),
+        ('https://www.carulla.com/delicatessen/carnes-maduradas','Carnes Maduradas'),
+        ('https://www.carulla.com/delicatessen/encurtidos-pates-y-dulces','Encurtidos, Pates y Dulces'),
+        ('https://www.carulla.com/aseo-del-hogar', 'Aseo del Hogar'),
+        ('https://www.carulla.com/lacteos-huevos-y-refrigerados', 'Lacteos, Huevos y Refrigerados'),
+        ('https://www.carulla.com/frutas-y-verduras', 'Frutas y Verduras'),
+        ('https://www.carulla.com/confiteria', 'Confitería'),
+        ('https://www.carulla.com/cuidado-personal', 'Cuidado Personal'),
+        ('https://www.carulla.com/despensa', 'Despensa'),
+        ('https://www.carulla.com/electrodomesticos', 'Electrodomesticos'),
+        ('https://www.carulla.com/juguetes', 'Juguetes'),
+        ('https://www.carulla.com/libros', 'Libros'),
+        ('https://www.carulla.com/mascotas', 'Mascotas'),
+        ('https://www.carulla.com/tecnologia', 'Tecnología'),
+        ('https://www.carulla.com/viajes', 'Viajes'),
+        ('https://www.carulla.com/vinos-y-licores', 'Vinos y Licores'),
+        ('https://www.carulla.com/bebidas-snacks-y-dulces', 'Bebidas, Snacks y Dulces'),
+        ('https://www.carulla.com/panaderia', 'Panadería'),
+        ('https://www.carulla.com/congelados', 'Congelados'),
+        ('https://www.carulla.com/salud-y-belleza', 'Salud y Belleza'),
+        ('https://www.carulla.com/jugueteria', 'Jugueteria'),
+        ('https://www.carulla.com/hogar-y-decoracion/mesa', 'Mesa'),
+        ('https://www.carulla.com/hogar-y-decoracion','Hogar y Decoración'),
+        ('https://www.carulla.com/papeleria','Papelería'),
+        ('https://www.carulla.com/tecnologia-electrodomesticos-moda','Tecnología, Electrodomesticos y Moda'),
+    ]
+
     def start_requests(self):
-        urls = [
-            ('https://www.carulla.com/delicatessen', 'Delicatessen'), 
-            ('https://www.carulla.com/delicatessen/quesos','Quesos'),
-            ('https://www.carulla.com/delicatessen/carnes-maduradas','Carnes Maduradas'),
-            ('https://www.carulla.com/delicatessen/encurtidos-pates-y-dulces','Encurtidos, Pates y Dulces'),
-            ('https://www.carulla.com/aseo-del-hogar', 'Aseo del Hogar'),
-            ('https://www.carulla.com/lacteos-huevos-y-refrigerados', 'Lacteos, Huevos y Refrigerados'),
-            ('https://www.carulla.com/frutas-y-verduras', 'Frutas y Verduras'),
-            ('https://www.carulla.com/confiteria', 'Confitería'),
-            ('https://www.carulla.com/cuidado-personal', 'Cuidado Personal'),
-            ('https://www.carulla.com/despensa', 'Despensa'),
-            ('https://www.carulla.com/electrodomesticos', 'Electrodomesticos'),
-            ('https://www.carulla.com/juguetes', 'Juguetes'),
-            ('https://www.carulla.com/libros', 'Libros'),
-            ('https://www.carulla.com/mascotas', 'Mascotas'),
-            ('https://www.carulla.com/tecnologia', 'Tecnología'),
-            ('https://www.carulla.com/viajes', 'Viajes'),
-            ('https://www.carulla.com/vinos-y-licores', 'Vinos y Licores'),
-            ('https://www.carulla.com/bebidas-snacks-y-dulces', 'Bebidas, Snacks y Dulces'),
-            ('https://www.carulla.com/panaderia', 'Panadería'),
-            ('https://www.carulla.com/congelados', 'Congelados'),
-            ('https://www.carulla.com/salud-y-belleza', 'Salud y Belleza'),
-            ('https://www.carulla.com/jugueteria', 'Jugueteria'),
-            ('https://www.carulla.com/hogar-y-decoracion/mesa', 'Mesa'),
-            ('https://www.carulla.com/hogar-y-decoracion','Hogar y Decoración'),
-            ('https://www.carulla.com/papeleria','Papelería'),
-            ('https://www.carulla.com/tecnologia-electrodomesticos-moda','Tecnología, Electrodomesticos y Moda'),
-           
-            
-        ]
+        for url, categoria in self.CATEGORIAS:
+            yield self.peticion_categoria(url, categoria)
 
-        for url, categoria in urls:
-            yield scrapy.Request(
-                url,
-                meta={
-                    'playwright': True,
-                    'playwright_include_page': True,
-                    'playwright_page_methods': [
-                        # Esperar carga inicial
-                        PageMethod('wait_for_timeout', 3000),
-                        
-                        # Esperar que aparezcan productos
-                        PageMethod('wait_for_selector', self.PRODUCT_SELECTOR, timeout=30000),
-                        
-                        # Scroll para lazy loading (3 veces)
-                        PageMethod('evaluate', '''
-                            async () => {
-                                for(let i = 0; i < 3; i++) {
-                                    window.scrollTo(0, document.body.scrollHeight);
-                                    await new Promise(r => setTimeout(r, 2000));
-                                }
-                                window.scrollTo(0, 0);
-                                await new Promise(r => setTimeout(r, 1000));
-                            }
-                        '''),
-                    ],
-                    'page': 1,  
-                    'categoria': categoria
-                },
-                callback=self.parse,
-                errback=self.error_handler
-            )
+    def peticion_playwright(self, url, categoria, page=1):
+        return scrapy.Request(
+            url,
+            meta={
+                'playwright': True,
+                # Scroll infinito hasta que dejen de aparecer productos
+                **self.meta_captura(metodos_scroll(self.PRODUCT_SELECTOR, self.settings)),
+                # Por HTTP solo llegaria el primer lote: siempre con navegador
+                'hibrido': False,
+                'page': page,
+                'categoria': categoria
+            },
+            callback=self.parse,
+            errback=self.error_handler,
+            dont_filter=page > 1
+        )
     
-    async def parse(self, response):
+    def parse(self, response):
         page_num = response.meta.get('page', 1)
         categoria = response.meta.get('categoria', 'sin-categoria')
-        playwright_page = response.meta.get('playwright_page')
 
         self.logger.info(f"📄 Procesando página {page_num}: {response.url}")
+        pasos = (response.meta.get('espera') or {}).get('pasos')
+        if pasos:
+            self.logger.info(f"🔽 Scroll en {len(pasos)} pasos: {' → '.join(map(str, pasos))} productos")
 
-        # ============================================================================
-        # SELECTORES CORREGIDOS
-        # ============================================================================
-        # Buscar productos usando el selector correcto
-        productos = response.css('article[class*="productCard"]')
+        # Primero el JSON que la pagina pidio mientras hacia scroll; si no hubo, el DOM
+        capturados = self.productos_capturados(response)
+        if capturados:
+            self.logger.info(f"✅ Productos en el JSON de la página {page_num}: {len(capturados)}")
+            for index, producto in enumerate(capturados, 1):
+                try:
+                    yield self.item_vtex(producto, categoria, response)
+                except Exception as e:
+                    self.logger.error(f'❌ Error procesando producto {index} del JSON: {e}')
+                    continue
+            yield from self.siguiente_pagina(response, page_num, categoria)
+            return
+
+        productos = self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
         
         self.logger.info(f"✅ Productos encontrados en página {page_num}: {len(productos)}")
 
@@ -128,55 +144,18 @@ class CarullaSpider(scrapy.Spider):
                 self.logger.warning(f'📝 HTML guardado en carulla_debug_page{page_num}.html')
             else:
                 self.logger.info(f"✓ No hay más productos en página {page_num}. Finalizando paginación.")
-            
-            # Cerrar la página de Playwright
-            if playwright_page:
-                await playwright_page.close()
             return
 
         productos_validos = 0
 
         for index, product in enumerate(productos, 1):
             try:
-                # ============================================================================
-                # NOMBRE - h3.styles_name__qQJiK
-                # ============================================================================
-                name = product.css('h3[class*="styles_name"]::text').get()
-                if not name:
-                    name = product.css('h3::text').get()
-                
-                # ============================================================================
-                # PRECIO - p[data-fs-container-price-otros="true"]
-                # El precio está en: <p class="ProductPrice_container__price__XmMWA">$ 7.970</p>
-                # ============================================================================
-                price = product.css('p[data-fs-container-price-otros="true"]::text').get()
-                if not price:
-                    # Fallback: buscar cualquier precio
-                    price = product.css('p[class*="ProductPrice_container__price"]::text').get()
-                
-                # ============================================================================
-                # PRECIO UNITARIO (opcional) - span.product-unit_price-unit__text__qeheS
-                # Formato: "(Gr a $ 99,63)"
-                # ============================================================================
-                unit_price = product.css('span[class*="price-unit__text"]::text').get()
-                
-                # ============================================================================
-                # IMAGEN - a[data-testid="product-link"] img::attr(src)
-                # ============================================================================
-                image = product.css('a[data-testid="product-link"] img::attr(src)').get()
-                if not image:
-                    image = product.css('img::attr(src)').get()
-                
-                # ============================================================================
-                # LINK - a[data-testid="product-link"]::attr(href)
-                # Formato: "/jamon-serrano-1901-80-gr-3010835/p"
-                # ============================================================================
-                product_link = product.css('a[data-testid="product-link"]::attr(href)').get()
-                
-                # ============================================================================
-                # VENDEDOR (opcional) - span[data-fs-product-details-seller__name="true"]
-                # ============================================================================
-                seller = product.css('span[data-fs-product-details-seller__name="true"] + ::text').get()
+                name = product['nombre']
+                price = product['precio']
+                unit_price = product['precio_unitario']
+                image = product['imagen']
+                product_link = product['url']
+                seller = product['vendedor']
                 if seller:
                     seller = seller.strip()
 
@@ -198,7 +177,7 @@ class CarullaSpider(scrapy.Spider):
                             'imagen_url': image if image and image.startswith('http') else None,
                             'categoria': categoria,
                             'vendedor': seller if seller else 'Carulla',
-                            'fecha_extraccion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            'fecha_extraccion': fecha_extraccion(),
                         }
                         productos_validos += 1
                         yield item
@@ -210,7 +189,9 @@ class CarullaSpider(scrapy.Spider):
                 continue
 
         self.logger.info(f"✅ Productos válidos extraídos en página {page_num}: {productos_validos}")
-        
+        yield from self.siguiente_pagina(response, page_num, categoria)
+
+    def siguiente_pagina(self, response, page_num, categoria):
         # ============================================================================
         # PAGINACIÓN
         # ============================================================================
@@ -230,37 +211,14 @@ class CarullaSpider(scrapy.Spider):
             
             self.logger.info(f"➡️  Navegando a página {next_page_num}: {next_url}")
             
-            yield scrapy.Request(
-                next_url,
-                meta={
-                    'playwright': True,
-                    'playwright_include_page': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 3000),
-                        PageMethod('wait_for_selector', self.PRODUCT_SELECTOR, timeout=30000),
-                        PageMethod('evaluate', '''
-                            async () => {
-                                for(let i = 0; i < 3; i++) {
-                                    window.scrollTo(0, document.body.scrollHeight);
-                                    await new Promise(r => setTimeout(r, 2000));
-                                }
-                                window.scrollTo(0, 0);
-                            }
-                        '''),
-                    ],
-                    'page': next_page_num,
-                    'categoria': categoria
-                },
-                callback=self.parse,
-                errback=self.error_handler,
-                dont_filter=True
-            )
+            yield self.peticion_playwright(next_url, categoria, next_page_num)
         else:
             self.logger.info(f"✓ Categoría '{categoria}' completada. Total páginas: {page_num}")
-        
-        # Cerrar la página de Playwright
-        if playwright_page:
-            await playwright_page.close()
+
+    def item_vtex(self, producto, categoria, response):
+        item = super().item_vtex(producto, categoria, response)
+        item['vendedor'] = producto['vendedor'] or 'Carulla'
+        return item
 
     def clean_price(self, price_text):
         """
@@ -296,6 +254,8 @@ class CarullaSpider(scrapy.Spider):
             return None
     
     def error_handler(self, failure):
+        if failure.check(SinCambios):
+            return
         self.logger.error(f"❌ ERROR: {failure.request.url}")
         self.logger.error(f"Tipo: {failure.type}")
         self.logger.error(f"Detalle: {failure.value}")
\ No newline at end of file
@@ -1,10 +1,15 @@
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
 import re
 
-class D1Spider(scrapy.Spider):
+from ..captura import CapturaJsonMixin
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_espera
+from ..items import fecha_extraccion
+from ..vtex import precios_oferta
+
+class D1Spider(CapturaJsonMixin, scrapy.Spider):
     name = "d1"
+    supermercado = "D1"
     allowed_domains = ["tiendasd1.com", "domicilios.tiendasd1.com"]
     
     custom_settings = {
@@ -16,6 +21,23 @@ class D1Spider(scrapy.Spider):
         }
     }
     
+    ESPEC = EspecExtraccion(
+        ('[class*="product-card"]', '[class*="productCard"]', '[class*="item-product"]',
+         '.vtex-search-result-3-x-galleryItem', '[data-testid*="product"]'),
+        {
+            'nombre': ('[class*="name"]::text', '[class*="Name"]::text', 'h3::text', 'h4::text',
+                       '[data-testid*="name"]::text'),
+            'precio': ('[class*="price"]::text', '[class*="Price"]::text', '.value::text',
+                       '[data-testid*="price"]::text'),
+            'precio_anterior': ('[class*="oldPrice"]::text', '[class*="old-price"]::text'),
+            'imagen': ('img::attr(src)', 'img::attr(data-src)', 'img::attr(data-original)'),
+            'url': 'a::attr(href)',
+            'marca': ('[class*="brand"]::text', '[class*="Brand"]::text'),
+        },
+    )
+    
+    PRODUCT_SELECTOR = ', '.join(ESPEC.contenedor)
+    
     def start_requests(self):
         urls = [
             'https://domicilios.tiendasd1.com/ca/aseo%20hogar/ASEO%20HOGAR',
@@ -26,11 +48,7 @@ class D1Spider(scrapy.Spider):
                 url,
                 meta={
                     'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 8000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000),
-                    ],
+                    **self.meta_captura(metodos_espera(self.PRODUCT_SELECTOR, self.settings)),
                 },
                 callback=self.parse
             )
@@ -38,15 +56,19 @@ class D1Spider(scrapy.Spider):
     def parse(self, response):
         self.logger.info(f'URL scrapeada: {response.url}')
         
-        productos = response.css('[class*="product-card"]')
-        if not productos:
-            productos = response.css('[class*="productCard"]')
-        if not productos:
-            productos = response.css('[class*="item-product"]')
-        if not productos:
-            productos = response.css('.vtex-search-result-3-x-galleryItem')
-        if not productos:
-            productos = response.css('[data-testid*="product"]')
+        # El JSON que la pagina pidio para la grilla; si no hubo, el DOM
+        capturados = self.productos_capturados(response)
+        if capturados:
+            self.logger.info(f'Productos en el JSON capturado: {len(capturados)}')
+            for producto in capturados:
+                try:
+                    yield self.item_capturado(producto, response)
+                except Exception as e:
+                    self.logger.error(f'Error extrayendo producto del JSON: {e}')
+                    continue
+            return
+        
+        productos = self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
         
         self.logger.info(f'Productos encontrados: {len(productos)}')
         
@@ -67,13 +89,8 @@ class D1Spider(scrapy.Spider):
                 continue
     
     def extraer_producto(self, producto, response):
-        nombre = producto.css('[class*="name"]::text, [class*="Name"]::text, h3::text, h4::text').get()
-        if not nombre:
-            nombre = producto.css('[data-testid*="name"]::text').get()
-        
-        precio_texto = producto.css('[class*="price"]::text, [class*="Price"]::text, .value::text').get()
-        if not precio_texto:
-            precio_texto = producto.css('[data-testid*="price"]::text').get()
+        nombre = producto['nombre']
+        precio_texto = producto['precio']
         
         if not nombre or not precio_texto:
             return None
@@ -85,16 +102,15 @@ class D1Spider(scrapy.Spider):
         precio_anterior = None
         descuento_porcentaje = None
         
-        precio_anterior_texto = producto.css('[class*="oldPrice"]::text, [class*="old-price"]::text').get()
+        precio_anterior_texto = producto['precio_anterior']
         if precio_anterior_texto:
             precio_anterior = self.limpiar_precio(precio_anterior_texto)
             if precio_anterior and precio_actual < precio_anterior:
                 descuento_porcentaje = round(((precio_anterior - precio_actual) / precio_anterior) * 100, 2)
         
-        imagen = producto.css('img::attr(src), img::attr(data-src), img::attr(data-original)').get()
-        url_producto = producto.css('a::attr(href)').get()
-        
-        marca = producto.css('[class*="brand"]::text, [class*="Brand"]::text').get()
+        imagen = producto['imagen']
+        url_producto = producto['url']
+        marca = producto['marca']
         
         return {
             'supermercado': 'D1',
@@ -107,7 +123,25 @@ class D1Spider(scrapy.Spider):
             'descuento_porcentaje': descuento_porcentaje,
             'url': response.urljoin(url_producto) if url_producto else response.url,
             'imagen_url': imagen,
-            'fecha_extraccion': datetime.utcnow().isoformat(),
+            'fecha_extraccion': fecha_extraccion(),
+        }
+    
+    def item_capturado(self, producto, response):
+        precio_actual, precio_anterior, descuento_porcentaje = precios_oferta(producto['precio'], producto['precio_lista'])
+        return {
+            'supermercado': 'D1',
+            'nombre': producto['nombre'].strip(),
+            'marca': producto['marca'],
+            'categoria': 'Aseo Hogar',
+            'presentacion': self.extraer_presentacion(producto['nombre']),
+            'precio_actual': precio_actual,
+            'precio_anterior': precio_anterior,
+            'descuento_porcentaje': descuento_porcentaje,
+            'url': response.urljoin(producto['url']) if producto['url'] else response.url,
+            'imagen_url': producto['imagen'],
+            'sku': producto['sku'],
+            'ean': producto['ean'],
+            'fecha_extraccion': fecha_extraccion(),
         }
     
     def limpiar_precio(self, precio_texto):
@@ -1,11 +1,19 @@
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
+import math
 import re
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
-class ExitoSpider(scrapy.Spider):
+from ..captura import CapturaJsonMixin
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_espera
+from ..items import fecha_extraccion
+from ..vtex import CatalogoVtexMixin
+
+_NUMERO = re.compile(r'\d[\d.,]*')
+
+class ExitoSpider(CapturaJsonMixin, CatalogoVtexMixin, scrapy.Spider):
     name = "exito"
+    supermercado = "Exito"
     allowed_domains = ["exito.com"]
     
     custom_settings = {
@@ -17,43 +25,61 @@ class ExitoSpider(scrapy.Spider):
         }
     }
     
+    ESPEC = EspecExtraccion(
+        ('.vtex-search-result-3-x-galleryItem', '[class*="galleryItem"]', '.product-item',
+         '[class*="productCard"]', '[class*="product-item"]'),
+        {
+            'nombre': ('[class*="productName"]::text', '[class*="product-name"]::text', '.name::text',
+                       'h3::text', 'h4::text', '[data-testid="product-name"]::text'),
+            'precio': ('[class*="price"]::text', '[class*="Price"]::text', '.value::text',
+                       '.price-current::text', '[data-testid="product-price"]::text'),
+            'precio_anterior': ('[class*="oldPrice"]::text', '[class*="old-price"]::text', '.price-before::text'),
+            'imagen': ('img::attr(src)', 'img::attr(data-src)', 'img::attr(data-original)'),
+            'url': 'a::attr(href)',
+            'marca': ('[class*="brand"]::text', '[class*="Brand"]::text'),
+        },
+    )
+    
+    PRODUCT_SELECTOR = ', '.join(ESPEC.contenedor)
+    
+    # Total de productos de la categoria (tema de busqueda VTEX y FastStore)
+    TOTAL_SELECTORES = (
+        '[data-fs-product-listing-results-count]::attr(data-count)',
+        '[class*="totalProducts"] ::text',
+        '[data-fs-product-listing-results-count] ::text',
+    )
+    
+    CATEGORIAS = [
+        ('https://www.exito.com/mercado/frutas-y-verduras/verduras-y-hortalizas', 'Verduras y Hortalizas'),
+        ('https://www.exito.com/mercado/despensa', 'Despensa'),
+        ('https://www.exito.com/mercado/aseo-del-hogar?page=1', 'Aseo del Hogar'),
+    ]
+    
     def start_requests(self):
-        urls = [
-            ('https://www.exito.com/mercado/frutas-y-verduras/verduras-y-hortalizas', 'Verduras y Hortalizas'),
-            ('https://www.exito.com/mercado/despensa', 'Despensa'),
-            ('https://www.exito.com/mercado/aseo-del-hogar?page=1', 'Aseo del Hogar'),
-        ]
-        
-        for url, categoria in urls:
-            yield scrapy.Request(
-                url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 8000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000),
-                    ],
-                    'categoria': categoria,
-                    'page': 1
-                },
-                callback=self.parse
-            )
+        for url, categoria in self.CATEGORIAS:
+            yield self.peticion_categoria(url, categoria)
+    
+    def peticion_playwright(self, url, categoria, page=1, **paginacion):
+        return scrapy.Request(
+            url,
+            meta={
+                'playwright': True,
+                **self.meta_captura(metodos_espera(self.PRODUCT_SELECTOR, self.settings)),
+                'categoria': categoria,
+                'page': page,
+                **paginacion
+            },
+            callback=self.parse
+        )
     
     def parse(self, response):
         page = response.meta.get('page', 1)
         categoria = response.meta.get('categoria', 'General')
         self.logger.info(f'URL scrapeada: {response.url} (Página {page}, Categoría: {categoria})')
         
-        productos = response.css('.vtex-search-result-3-x-galleryItem')
-        if not productos:
-            productos = response.css('[class*="galleryItem"]')
-        if not productos:
-            productos = response.css('.product-item')
-        if not productos:
-            productos = response.css('[class*="productCard"]')
-        if not productos:
-            productos = response.css('[class*="product-item"]')
+        # El JSON que la pagina pidio para la grilla; si no hubo, el DOM
+        capturados = self.productos_capturados(response)
+        productos = capturados or self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
         
         self.logger.info(f'Productos encontrados: {len(productos)}')
         
@@ -67,7 +93,10 @@ class ExitoSpider(scrapy.Spider):
         productos_scraped = 0
         for producto in productos:
             try:
-                item = self.extraer_producto(producto, response, categoria)
+                if capturados:
+                    item = self.item_vtex(producto, categoria, response)
+                else:
+                    item = self.extraer_producto(producto, response, categoria)
                 if item:
                     yield item
                     productos_scraped += 1
@@ -81,23 +110,38 @@ class ExitoSpider(scrapy.Spider):
             self.logger.info(f'No hay más productos en página {page}. Deteniendo paginación.')
             return
         
-        next_page = page + 1
-        next_url = self._increment_page(response.url, next_page)
+        # Las paginas repartidas desde la pagina 1 no piden mas
+        if 'paginas' in response.meta:
+            return
         
-        yield scrapy.Request(
-            next_url,
-            meta={
-                'playwright': True,
-                'playwright_page_methods': [
-                    PageMethod('wait_for_timeout', 8000),
-                    PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                    PageMethod('wait_for_timeout', 3000),
-                ],
-                'categoria': categoria,
-                'page': next_page
-            },
-            callback=self.parse
-        )
+        por_pagina = response.meta.get('por_pagina') or len(productos)
+        paginas = self.total_paginas(response, por_pagina) if page == 1 else None
+        if paginas:
+            self.logger.info(f'{categoria}: {paginas} páginas, se piden todas a la vez')
+            siguientes = range(2, paginas + 1)
+        elif len(productos) >= por_pagina:
+            # Sin total: pagina a pagina hasta una incompleta
+            siguientes = [page + 1]
+        else:
+            self.logger.info(f'Página {page} incompleta: es la última.')
+            return
+        
+        for numero in siguientes:
+            next_url = self._increment_page(response.url, numero)
+            if paginas:
+                yield self.peticion_playwright(next_url, categoria, numero, paginas=paginas)
+            else:
+                yield self.peticion_playwright(next_url, categoria, numero, por_pagina=por_pagina)
+    
+    def total_paginas(self, response, por_pagina):
+        """Paginas de la categoria segun el total de productos que muestra la pagina"""
+        for selector in self.TOTAL_SELECTORES:
+            for texto in response.css(selector).getall():
+                numero = _NUMERO.search(texto)
+                if numero:
+                    total = int(re.sub(r'[.,]', '', numero.group(0)))
+                    return math.ceil(total / por_pagina) if total and por_pagina else None
+        return None
     
     def _increment_page(self, url, next_page):
         parsed = urlparse(url)
@@ -108,13 +152,8 @@ class ExitoSpider(scrapy.Spider):
         return urlunparse(new_parsed)
     
     def extraer_producto(self, producto, response, categoria):
-        nombre = producto.css('[class*="productName"]::text, [class*="product-name"]::text, .name::text, h3::text, h4::text').get()
-        if not nombre:
-            nombre = producto.css('[data-testid="product-name"]::text').get()
-        
-        precio_texto = producto.css('[class*="price"]::text, [class*="Price"]::text, .value::text, .price-current::text').get()
-        if not precio_texto:
-            precio_texto = producto.css('[data-testid="product-price"]::text').get()
+        nombre = producto['nombre']
+        precio_texto = producto['precio']
         
         if not nombre or not precio_texto:
             return None
@@ -126,16 +165,15 @@ class ExitoSpider(scrapy.Spider):
         precio_anterior = None
         descuento_porcentaje = None
         
-        precio_anterior_texto = producto.css('[class*="oldPrice"]::text, [class*="old-price"]::text, .price-before::text').get()
+        precio_anterior_texto = producto['precio_anterior']
         if precio_anterior_texto:
             precio_anterior = self.limpiar_precio(precio_anterior_texto)
             if precio_anterior and precio_actual < precio_anterior:
                 descuento_porcentaje = round(((precio_anterior - precio_actual) / precio_anterior) * 100, 2)
         
-        imagen = producto.css('img::attr(src), img::attr(data-src), img::attr(data-original)').get()
-        url_producto = producto.css('a::attr(href)').get()
-        
-        marca = producto.css('[class*="brand"]::text, [class*="Brand"]::text').get()
+        imagen = producto['imagen']
+        url_producto = producto['url']
+        marca = producto['marca']
         
         return {
             'supermercado': 'Exito',
@@ -148,9 +186,14 @@ class ExitoSpider(scrapy.Spider):
             'descuento_porcentaje': descuento_porcentaje,
             'url': response.urljoin(url_producto) if url_producto else response.url,
             'imagen_url': imagen,
-            'fecha_extraccion': datetime.utcnow().isoformat(),
+            'fecha_extraccion': fecha_extraccion(),
         }
     
+    def item_vtex(self, producto, categoria, response):
+        item = super().item_vtex(producto, categoria, response)
+        item['presentacion'] = self.extraer_presentacion(item['nombre'])
+        return item
+    
     def limpiar_precio(self, precio_texto):
         """Limpia precio en formato Colombia (miles con punto, decimales con coma)"""
         if not precio_texto:
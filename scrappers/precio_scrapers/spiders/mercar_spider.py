@@ -3,64 +3,83 @@
 # https://supermercadomercar.com/product-category/aseo-general/
 
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
 import re
 from urllib.parse import urlparse, urlunparse
 
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_espera
+from ..estado_crawl import SinCambios
+from ..items import fecha_extraccion
+from ..woocommerce import CatalogoWooCommerceMixin
+
 # Selectores Mercar (Elementor + WooCommerce):
 # Productos: div[data-elementor-type="loop-item"] o div.e-loop-item.product
 # Precio: span.woocommerce-Price-amount.amount
 # Nombre: h2.elementor-heading-title (primer h2 del producto)
 # Paginacion: WooCommerce usa /page/N/ en la URL (infinite scroll en frontend)
+# Modo API: /wp-json/wc/store/v1/products?category=<slug> (ver woocommerce.py)
 
 
-class MercarSpider(scrapy.Spider):
+class MercarSpider(CatalogoWooCommerceMixin, scrapy.Spider):
     name = "mercar"
+    supermercado = "Mercar"
     allowed_domains = ["supermercadomercar.com"]
 
     custom_settings = {
         'DOWNLOAD_DELAY': 2,
-        'CONCURRENT_REQUESTS': 4,
+        # Las paginas con Playwright siguen limitadas por dominio; el resto es para la API
+        'CONCURRENT_REQUESTS': 8,
         'PLAYWRIGHT_BROWSER_TYPE': 'chromium',
         'PLAYWRIGHT_LAUNCH_OPTIONS': {
             'headless': True,
-        }
+        },
+        # Estadisticas de Jetpack (WordPress)
+        'BLOQUEO_DOMINIOS_TIENDA': ['stats.wp.com', 'pixel.wp.com'],
     }
 
     # Selector para esperar a que carguen los productos
     PRODUCT_SELECTOR = 'div[data-elementor-type="loop-item"]'
 
+    ESPEC = EspecExtraccion((PRODUCT_SELECTOR, 'div.e-loop-item.product'), {
+        'nombre': ('h2.elementor-heading-title::text',
+                   'div.elementor-element-22159c6 h2.elementor-heading-title::text'),
+        # Precio: todo el texto de span.woocommerce-Price-amount.amount (formato: $16,990),
+        # el simbolo va en un span interno
+        'precio': 'span.woocommerce-Price-amount.amount',
+        'imagen': ('img::attr(src)', 'img::attr(data-src)'),
+        'url': ('a[href*="/product/"]::attr(href)', 'a::attr(href)'),
+    })
+
+    CATEGORIAS = [
+        ('https://supermercadomercar.com/product-category/aseo-general/', 'Limpieza Hogar'),
+        ('https://supermercadomercar.com/product-category/aseo-personal/', 'Aseo Personal'),
+        ('https://supermercadomercar.com/product-category/cervezas-y-licores/', 'Bebidas con Alcohol'),
+        ('https://supermercadomercar.com/product-category/confiteria/', 'Confitería'),
+        ('https://supermercadomercar.com/product-category/cuidado-del-bebe/', 'Cuidado del Bebé'),
+        ('https://supermercadomercar.com/product-category/cuidado-personal/', 'Cuidado Personal'),
+        ('https://supermercadomercar.com/product-category/despensa/', 'Despensa'),
+        ('https://supermercadomercar.com/product-category/frutas-y-verduras/', 'Frutas y Verduras'),
+        ('https://supermercadomercar.com/product-category/lacteos-huevos-refrigerados/', 'Lácteos y Huevos Refrigerados'),
+        ('https://supermercadomercar.com/product-category/pollo-carnes-pescado/', 'Pollo, Carnes y Pescado'),
+    ]
+
     def start_requests(self):
-        urls = [
-            ('https://supermercadomercar.com/product-category/aseo-general/', 'Limpieza Hogar'),
-            ('https://supermercadomercar.com/product-category/aseo-personal/', 'Aseo Personal'),
-            ('https://supermercadomercar.com/product-category/cervezas-y-licores/', 'Bebidas con Alcohol'),
-            ('https://supermercadomercar.com/product-category/confiteria/', 'Confitería'),
-            ('https://supermercadomercar.com/product-category/cuidado-del-bebe/', 'Cuidado del Bebé'),
-            ('https://supermercadomercar.com/product-category/cuidado-personal/', 'Cuidado Personal'),
-            ('https://supermercadomercar.com/product-category/despensa/', 'Despensa'),
-            ('https://supermercadomercar.com/product-category/frutas-y-verduras/', 'Frutas y Verduras'),
-            ('https://supermercadomercar.com/product-category/lacteos-huevos-refrigerados/', 'Lácteos y Huevos Refrigerados'),
-            ('https://supermercadomercar.com/product-category/pollo-carnes-pescado/', 'Pollo, Carnes y Pescado'),
-        ]
-
-        for url, categoria in urls:
-            yield scrapy.Request(
-                url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 5000),
-                        PageMethod('wait_for_selector', self.PRODUCT_SELECTOR, timeout=20000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000)
-                    ],
-                    'pageNumber': 1,
-                    'categoria': categoria
-                },
-                callback=self.parse
-            )
+        for url, categoria in self.CATEGORIAS:
+            yield self.peticion_categoria(url, categoria)
+
+    def peticion_playwright(self, url, categoria, page=1):
+        return scrapy.Request(
+            url,
+            meta={
+                'playwright': True,
+                'playwright_page_methods': metodos_espera(self.PRODUCT_SELECTOR, self.settings),
+                'pageNumber': page,
+                'categoria': categoria
+            },
+            callback=self.parse,
+            errback=self.error_handler,
+            dont_filter=page > 1
+        )
     
     def parse(self, response):
         page = response.meta.get('pageNumber', 1)
@@ -69,9 +88,7 @@ class MercarSpider(scrapy.Spider):
         self.logger.info(f"Procesando pagina {page}: {response.url}")
 
         # Mercar: div[data-elementor-type="loop-item"] o div.e-loop-item.product
-        productos = response.css('div[data-elementor-type="loop-item"]')
-        if not productos:
-            productos = response.css('div.e-loop-item.product')
+        productos = self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
 
         self.logger.info(f"Productos encontrados en pagina {page}: {len(productos)}")
 
@@ -89,26 +106,12 @@ class MercarSpider(scrapy.Spider):
 
         for index, product in enumerate(productos, 1):
             try:
-                # Nombre: primer h2.elementor-heading-title del producto
-                name = product.css('h2.elementor-heading-title::text').get()
-                if not name:
-                    name = product.css('div.elementor-element-22159c6 h2.elementor-heading-title::text').get()
-
-                # Precio: span.woocommerce-Price-amount.amount (formato: $16,990)
-                price_parts = product.css('span.woocommerce-Price-amount.amount *::text').getall()
-                price = ''.join(price_parts).strip() if price_parts else None
-                if not price:
-                    price = product.css('span.woocommerce-Price-amount.amount::text').get()
+                name = product['nombre']
+                price = product['precio']
+                image = product['imagen']
+                product_link = product['url']
 
-                image = product.css('img::attr(src)').get()
-                if not image:
-                    image = product.css('img::attr(data-src)').get()
-
-                product_link = product.css('a[href*="/product/"]::attr(href)').get()
-                if not product_link:
-                    product_link = product.css('a::attr(href)').get()
-
-                self.logger.info(f"  {index}. {name.strip() if name else 'Sin nombre'} - {price.strip() if price else 'Sin precio'}")
+                self.logger.debug(f"  {index}. {name.strip() if name else 'Sin nombre'} - {price.strip() if price else 'Sin precio'}")
 
                 if name and price:
                     precio_numerico = self.clean_price(price)
@@ -124,7 +127,7 @@ class MercarSpider(scrapy.Spider):
                             'url': response.urljoin(product_link) if product_link else response.url,
                             'imagen_url': response.urljoin(image) if image else None,
                             'categoria': categoria,
-                            'fecha_extraccion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            'fecha_extraccion': fecha_extraccion(),
                         }
                         productos_validos += 1
                         yield item
@@ -143,23 +146,7 @@ class MercarSpider(scrapy.Spider):
             
             self.logger.info(f"Boton 'siguiente' encontrado. Navegando a pagina {next_page}: {next_url}")
             
-            yield scrapy.Request(
-                next_url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 5000),
-                        PageMethod('wait_for_selector', self.PRODUCT_SELECTOR, timeout=20000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000),
-                    ],
-                    'pageNumber': next_page,
-                    'categoria': categoria
-                },
-                callback=self.parse,
-                errback=self.error_handler,
-                dont_filter=True
-            )
+            yield self.peticion_playwright(next_url, categoria, next_page)
         else:
             self.logger.info(f"✓ Categoria '{categoria}' completada. Total paginas: {page}")
 
@@ -202,6 +189,8 @@ class MercarSpider(scrapy.Spider):
             return None
     
     def error_handler(self, failure):
+        if failure.check(SinCambios):
+            return
         self.logger.error(f"ERROR: {failure.request.url}")
         self.logger.error(f"Tipo: {failure.type}")
         self.logger.error(f"Detalle: {failure.value}")
\ No newline at end of file
@@ -1,11 +1,19 @@
 import scrapy
-from scrapy_playwright.page import PageMethod
-from datetime import datetime
+import math
 import re
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+from ..extraccion import EspecExtraccion
+from ..espera import metodos_espera
+from ..estado_crawl import SinCambios
+from ..items import fecha_extraccion
+
+# Texto sobre la lista: "Mostrando 1 a 12 de 46 productos"
+_MOSTRANDO = re.compile(r'Mostrando\s+(\d+)\s+a\s+(\d+)\s+de\s+([\d.,]+)')
+
 class SurtifamiliarSpider(scrapy.Spider):
     name = "surtifamiliar"
+    supermercado = "Surtifamiliar"
     allowed_domains = ["surtifamiliar.com"]
     
     custom_settings = {
@@ -17,6 +25,15 @@ class SurtifamiliarSpider(scrapy.Spider):
         }
     }
     
+    ESPEC = EspecExtraccion(('.box-product .box-product-item', '[class*="product-item"]'), {
+        'nombre': ('[class*="name"]::text', 'h4::text'),
+        'precio': ('span[class*="price"]::text', '[class*="price"]::text'),
+        'imagen': ('img::attr(src)', 'img::attr(data-src)'),
+        'url': 'a::attr(href)',
+    })
+    
+    PRODUCT_SELECTOR = ', '.join(ESPEC.contenedor)
+    
     def start_requests(self):
         urls = [
             ('https://surtifamiliar.com/limpieza-hogar-limpiadores-516/products', 'Limpieza Hogar'),
@@ -30,21 +47,21 @@ class SurtifamiliarSpider(scrapy.Spider):
         ]
         
         for url, categoria in urls:
-            yield scrapy.Request(
-                url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 5000),
-                        PageMethod('wait_for_selector', '.box-product', timeout=20000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000)
-                    ],
-                    'pageNumber': 1,
-                    'categoria': categoria
-                },
-                callback=self.parse
-            )
+            yield self.peticion_pagina(url, categoria, 1)
+    
+    def peticion_pagina(self, url, categoria, page, **paginacion):
+        return scrapy.Request(
+            url,
+            meta={
+                'playwright': True,
+                'playwright_page_methods': metodos_espera(self.PRODUCT_SELECTOR, self.settings),
+                'pageNumber': page,
+                'categoria': categoria,
+                **paginacion
+            },
+            callback=self.parse,
+            errback=self.error_handler
+        )
     
     def parse(self, response):
         page = response.meta.get('pageNumber', 1)
@@ -52,12 +69,7 @@ class SurtifamiliarSpider(scrapy.Spider):
         
         self.logger.info(f"Procesando pagina {page}: {response.url}")
         
-        productos_contenedor = response.css('.box-product')
-        
-        if productos_contenedor:
-            productos = productos_contenedor[0].css('.box-product-item')
-        else:
-            productos = response.css('[class*="product-item"]')
+        productos = self.ESPEC.extraer(response, self.settings.get('EXTRACCION_BACKEND', 'lxml'))
         
         self.logger.info(f"Productos encontrados en pagina {page}: {len(productos)}")
         
@@ -75,21 +87,12 @@ class SurtifamiliarSpider(scrapy.Spider):
         
         for index, product in enumerate(productos, 1):
             try:
-                name = product.css('[class*="name"]::text').get()
-                if not name:
-                    name = product.css('h4::text').get()
-                
-                price = product.css('span[class*="price"]::text').get()
-                if not price:
-                    price = product.css('[class*="price"]::text').get()
+                name = product['nombre']
+                price = product['precio']
+                image = product['imagen']
+                product_link = product['url']
                 
-                image = product.css('img::attr(src)').get()
-                if not image:
-                    image = product.css('img::attr(data-src)').get()
-                
-                product_link = product.css('a::attr(href)').get()
-                
-                self.logger.info(f"  {index}. {name.strip() if name else 'Sin nombre'} - {price.strip() if price else 'Sin precio'}")
+                self.logger.debug(f"  {index}. {name.strip() if name else 'Sin nombre'} - {price.strip() if price else 'Sin precio'}")
                 
                 if name and price:
                     precio_numerico = self.clean_price(price)
@@ -102,7 +105,7 @@ class SurtifamiliarSpider(scrapy.Spider):
                             'imagen': response.urljoin(image) if image else None,
                             'url': response.urljoin(product_link) if product_link else response.url,
                             'categoria': categoria,
-                            'fecha_extraccion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            'fecha_extraccion': fecha_extraccion(),
                         }
                         productos_validos += 1
                         yield item
@@ -112,31 +115,53 @@ class SurtifamiliarSpider(scrapy.Spider):
         
         self.logger.info(f"Productos validos extraidos en pagina {page}: {productos_validos}")
         
-        if productos_validos > 0:
-            next_page = page + 1
-            next_url = self._increment_page(response.url, next_page)
-            
-            self.logger.info(f"Solicitando siguiente pagina: {next_page}")
-            
-            yield scrapy.Request(
-                next_url,
-                meta={
-                    'playwright': True,
-                    'playwright_page_methods': [
-                        PageMethod('wait_for_timeout', 5000),
-                        PageMethod('wait_for_selector', '.box-product', timeout=20000),
-                        PageMethod('evaluate', 'window.scrollTo(0, document.body.scrollHeight)'),
-                        PageMethod('wait_for_timeout', 3000),
-                    ],
-                    'pageNumber': next_page,
-                    'categoria': categoria
-                },
-                callback=self.parse,
-                errback=self.error_handler,
-                dont_filter=True
-            )
-        else:
+        if productos_validos == 0:
             self.logger.info(f"Scraping completado. Ultima pagina: {page}")
+            return
+        
+        # Las paginas repartidas desde la pagina 1 no piden mas
+        if 'paginas' in response.meta:
+            return
+        
+        por_pagina = response.meta.get('por_pagina') or len(productos)
+        paginas = self.total_paginas(response) if page == 1 else None
+        if paginas:
+            self.logger.info(f"{categoria}: {paginas} paginas, se piden todas a la vez")
+            for numero in range(2, paginas + 1):
+                yield self.peticion_pagina(self._increment_page(response.url, numero), categoria, numero, paginas=paginas)
+            return
+        
+        # El paginador solo muestra una ventana de paginas: se reparten las visibles
+        # y la ultima sigue pagina a pagina
+        visibles = self.paginas_visibles(response) if page == 1 else None
+        if visibles and visibles > 2:
+            self.logger.info(f"{categoria}: sin total, se reparten las paginas 2 a {visibles}")
+            for numero in range(2, visibles):
+                yield self.peticion_pagina(self._increment_page(response.url, numero), categoria, numero, paginas=visibles)
+            yield self.peticion_pagina(self._increment_page(response.url, visibles), categoria, visibles, por_pagina=por_pagina)
+            return
+        
+        # Sin total: pagina a pagina hasta una incompleta
+        if len(productos) < por_pagina:
+            self.logger.info(f"Scraping completado. Ultima pagina: {page}")
+            return
+        next_page = page + 1
+        self.logger.info(f"Solicitando siguiente pagina: {next_page}")
+        yield self.peticion_pagina(self._increment_page(response.url, next_page), categoria, next_page, por_pagina=por_pagina)
+    
+    def total_paginas(self, response):
+        """Paginas de la categoria segun "Mostrando X a Y de N productos" (None si no esta)"""
+        mostrando = _MOSTRANDO.search(' '.join(response.xpath('//text()[contains(., "Mostrando")]').getall()))
+        if not mostrando:
+            return None
+        desde, hasta = int(mostrando.group(1)), int(mostrando.group(2))
+        total = int(re.sub(r'[.,]', '', mostrando.group(3)))
+        return math.ceil(total / (hasta - desde + 1)) if hasta >= desde else None
+    
+    def paginas_visibles(self, response):
+        """Mayor numero de pagina del paginador (ngb-pagination muestra solo una ventana)"""
+        numeros = [int(n) for n in response.css('ul.pagination a.page-link::text').re(r'\d+')]
+        return max(numeros) if numeros else None
     
     def _increment_page(self, url, next_page):
         """Incrementa el numero de pagina en la URL"""
@@ -170,6 +195,8 @@ class SurtifamiliarSpider(scrapy.Spider):
             return None
     
     def error_handler(self, failure):
+        if failure.check(SinCambios):
+            return
         self.logger.error(f"ERROR: {failure.request.url}")
         self.logger.error(f"Tipo: {failure.type}")
         self.logger.error(f"Detalle: {failure.value}")
@@ -0,0 +1,99 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+class NDJSONSpool:
+    """Spool append-only en JSON Lines, comprimido con gzip si la ruta termina en .gz
+
+    Cada llamada a escribir() hace flush, asi lo escrito sobrevive a una caida del proceso.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        if ruta.endswith('.gz'):
+            self.archivo = gzip.open(ruta, 'at', encoding='utf-8')
+        else:
+            self.archivo = open(ruta, 'a', encoding='utf-8')
+
+    def escribir(self, filas):
+        for fila in filas:
+            self.archivo.write(json.dumps(fila, ensure_ascii=False) + '\n')
+        self.archivo.flush()
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class SQLiteSpool:
+    """Spool en una base SQLite en modo WAL: una transaccion por lote"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        # El escritor asincrono escribe desde su hilo y el cierre llega desde otro
+        self.conn = sqlite3.connect(ruta, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS filas (seq INTEGER PRIMARY KEY, fila TEXT NOT NULL)")
+
+    def escribir(self, filas):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO filas (fila) VALUES (?)",
+                [(json.dumps(fila, ensure_ascii=False),) for fila in filas],
+            )
+
+    def cerrar(self):
+        self.conn.close()
+
+
+FORMATOS = {
+    'ndjson': NDJSONSpool,
+    'ndjson.gz': NDJSONSpool,
+    'sqlite': SQLiteSpool,
+}
+
+
+def ruta_spool(directorio, nombre, formato):
+    if formato not in FORMATOS:
+        raise ValueError(f"SQLSERVER_SPOOL_FORMAT invalido: {formato} (opciones: {', '.join(FORMATOS)})")
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, f"{nombre}.{formato}")
+
+
+def abrir_spool(ruta):
+    """Abre (o continua) un spool; el formato se deduce de la extension"""
+    if ruta.endswith('.sqlite'):
+        return SQLiteSpool(ruta)
+    return NDJSONSpool(ruta)
+
+
+def leer_spool(ruta):
+    """Devuelve las filas de un spool en el orden en que se escribieron"""
+    if ruta.endswith('.sqlite'):
+        conn = sqlite3.connect(ruta)
+        try:
+            for (fila,) in conn.execute("SELECT fila FROM filas ORDER BY seq"):
+                yield json.loads(fila)
+        finally:
+            conn.close()
+        return
+
+    abrir = gzip.open if ruta.endswith('.gz') else open
+    with abrir(ruta, 'rt', encoding='utf-8') as archivo:
+        try:
+            for numero, linea in enumerate(archivo, 1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError:
+                    # Solo puede pasar con la ultima linea si el proceso murio escribiendola
+                    logger.warning(f"Linea {numero} de {ruta} incompleta - se descarta")
+        except EOFError:
+            logger.warning(f"{ruta} termina en un bloque gzip incompleto - se cargan las filas previas")
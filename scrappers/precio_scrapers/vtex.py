@@ -0,0 +1,176 @@
+import json
+import math
+import re
+from urllib.parse import urlencode, urlsplit
+
+import scrapy
+
+from .estado_crawl import SinCambios
+from .items import fecha_extraccion
+
+RUTA_BUSQUEDA = '/api/catalog_system/pub/products/search/'
+TAMANO_PAGINA = 50
+# La API de busqueda no devuelve resultados con _from mayor a 2500
+MAX_DESDE = 2500
+
+_RECURSOS = re.compile(r'(\d+)-(\d+)/(\d+)')
+
+
+def url_busqueda(url_categoria, pagina=1, tamano=TAMANO_PAGINA):
+    """URL de la API de busqueda para la pagina `pagina` de una categoria de la tienda
+
+    https://www.exito.com/mercado/despensa ->
+    https://www.exito.com/api/catalog_system/pub/products/search/mercado/despensa?map=c,c&_from=0&_to=49
+    """
+    partes = urlsplit(url_categoria)
+    ruta = partes.path.strip('/')
+    desde = (pagina - 1) * tamano
+    consulta = urlencode({
+        'map': ','.join('c' for _ in ruta.split('/')),
+        '_from': desde,
+        '_to': desde + tamano - 1,
+    })
+    return f'{partes.scheme}://{partes.netloc}{RUTA_BUSQUEDA}{ruta}?{consulta}'
+
+
+def total_productos(response):
+    """Total de productos de la categoria segun la cabecera resources (0-49/312), o None"""
+    recursos = response.headers.get('resources', b'').decode('latin-1')
+    coincidencia = _RECURSOS.search(recursos)
+    return int(coincidencia.group(3)) if coincidencia else None
+
+
+def ultima_pagina(total, tamano=TAMANO_PAGINA):
+    return math.ceil(min(total, MAX_DESDE + tamano) / tamano)
+
+
+def productos_vtex(datos):
+    """Un dict por producto de la respuesta de la API, con precios numericos
+
+    Se usa el primer SKU y la oferta de su vendedor por defecto. Los productos
+    sin precio (agotados) se omiten.
+    """
+    productos = []
+    for producto in datos:
+        sku = (producto.get('items') or [{}])[0]
+        vendedores = sku.get('sellers') or []
+        vendedor = next((v for v in vendedores if v.get('sellerDefault')), vendedores[0] if vendedores else {})
+        oferta = vendedor.get('commertialOffer') or {}
+        if not producto.get('productName') or not oferta.get('Price'):
+            continue
+        imagenes = sku.get('images') or []
+        link_text = producto.get('linkText')
+        productos.append({
+            'nombre': producto['productName'],
+            'marca': producto.get('brand') or None,
+            'precio': float(oferta['Price']),
+            'precio_lista': float(oferta['ListPrice']) if oferta.get('ListPrice') else None,
+            'sku': sku.get('itemId') or None,
+            'ean': sku.get('ean') or None,
+            'imagen': imagenes[0].get('imageUrl') if imagenes else None,
+            'url': producto.get('link') or (f'/{link_text}/p' if link_text else None),
+            'vendedor': vendedor.get('sellerName'),
+        })
+    return productos
+
+
+def precios_oferta(precio, precio_lista):
+    """(precio_actual, precio_anterior, descuento_porcentaje) de un producto de productos_vtex
+
+    El precio de lista solo es precio anterior si es mayor que el precio.
+    """
+    precio_anterior = precio_lista if precio_lista and precio_lista > precio else None
+    descuento = round((precio_anterior - precio) / precio_anterior * 100, 2) if precio_anterior else None
+    return precio, precio_anterior, descuento
+
+
+class CatalogoVtexMixin:
+    """Modo sin navegador para tiendas VTEX (Exito, Carulla)
+
+    Con VTEX_API_ENABLED cada categoria se pide como JSON paginado a la API de
+    busqueda del catalogo, sin Chromium ni DOM. La primera pagina trae el total
+    y las demas se piden a la vez. Si la API falla o la primera pagina no trae
+    productos, la categoria se renderiza con Playwright: el spider define
+    peticion_playwright(url, categoria).
+    """
+
+    def peticion_categoria(self, url, categoria):
+        if self.settings.getbool('VTEX_API_ENABLED'):
+            return self.peticion_api(url, categoria)
+        return self.peticion_playwright(url, categoria)
+
+    def peticion_api(self, url, categoria, pagina=1):
+        tamano = self.settings.getint('VTEX_TAMANO_PAGINA', TAMANO_PAGINA)
+        return scrapy.Request(
+            url_busqueda(url, pagina, tamano),
+            headers={'Accept': 'application/json'},
+            meta={'categoria': categoria, 'page': pagina, 'url_categoria': url},
+            callback=self.parse_api,
+            errback=self.error_api,
+        )
+
+    def parse_api(self, response):
+        pagina = response.meta['page']
+        categoria = response.meta['categoria']
+        url = response.meta['url_categoria']
+        try:
+            datos = json.loads(response.body)
+            productos = productos_vtex(datos)
+        except (ValueError, TypeError, AttributeError) as e:
+            self.logger.warning(f'Respuesta invalida de la API ({response.url}): {e}')
+            datos, productos = [], []
+
+        if not datos:
+            if pagina == 1:
+                yield self.fallback_playwright(url, categoria, 'sin productos en la API')
+            return
+
+        self.crawler.stats.inc_value('vtex/paginas')
+        self.crawler.stats.inc_value('vtex/productos', len(productos))
+        self.logger.info(f'API {categoria} pagina {pagina}: {len(productos)} productos')
+        for producto in productos:
+            yield self.item_vtex(producto, categoria, response)
+
+        tamano = self.settings.getint('VTEX_TAMANO_PAGINA', TAMANO_PAGINA)
+        total = total_productos(response)
+        if total is None:
+            # Sin cabecera resources: pagina a pagina hasta una incompleta
+            if len(datos) >= tamano and pagina * tamano <= MAX_DESDE:
+                yield self.peticion_api(url, categoria, pagina + 1)
+        elif pagina == 1:
+            for siguiente in range(2, ultima_pagina(total, tamano) + 1):
+                yield self.peticion_api(url, categoria, siguiente)
+
+    def error_api(self, failure):
+        if failure.check(SinCambios):
+            # 304: la categoria no cambio desde el ultimo crawl
+            return
+        request = failure.request
+        self.crawler.stats.inc_value('vtex/errores')
+        if request.meta['page'] == 1:
+            yield self.fallback_playwright(request.meta['url_categoria'], request.meta['categoria'], repr(failure.value))
+        else:
+            self.logger.error(f'Error en la API {request.url}: {failure.value}')
+
+    def fallback_playwright(self, url, categoria, motivo):
+        self.logger.warning(f'API no disponible para {categoria} ({motivo}) - se usa Playwright')
+        self.crawler.stats.inc_value('vtex/fallback_playwright')
+        return self.peticion_playwright(url, categoria)
+
+    def item_vtex(self, producto, categoria, response):
+        precio, precio_anterior, descuento = precios_oferta(producto['precio'], producto['precio_lista'])
+        return {
+            'supermercado': self.supermercado,
+            'nombre': producto['nombre'].strip(),
+            'marca': producto['marca'],
+            'categoria': categoria,
+            'presentacion': None,
+            'precio_actual': precio,
+            'precio_anterior': precio_anterior,
+            'descuento_porcentaje': descuento,
+            'url': response.urljoin(producto['url']) if producto['url'] else response.meta.get('url_categoria', response.url),
+            'imagen_url': producto['imagen'],
+            'sku': producto['sku'],
+            'ean': producto['ean'],
+            'fecha_extraccion': fecha_extraccion(),
+        }
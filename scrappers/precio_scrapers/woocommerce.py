@@ -0,0 +1,161 @@
+import html
+import json
+from urllib.parse import urlencode, urlsplit
+
+import scrapy
+
+from .estado_crawl import SinCambios
+from .items import fecha_extraccion
+
+RUTA_PRODUCTOS = '/wp-json/wc/store/v1/products'
+# Maximo que acepta la Store API
+POR_PAGINA = 100
+
+
+def slug_categoria(url_categoria):
+    """https://tienda.com/product-category/aseo-general/ -> aseo-general"""
+    return urlsplit(url_categoria).path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def url_productos(url_categoria, pagina=1, por_pagina=POR_PAGINA):
+    """URL de la Store API de WooCommerce para la pagina `pagina` de una categoria"""
+    partes = urlsplit(url_categoria)
+    consulta = urlencode({'category': slug_categoria(url_categoria), 'page': pagina, 'per_page': por_pagina})
+    return f'{partes.scheme}://{partes.netloc}{RUTA_PRODUCTOS}?{consulta}'
+
+
+def total_paginas(response):
+    """Paginas de la categoria segun la cabecera X-WP-TotalPages, o None"""
+    valor = response.headers.get('X-WP-TotalPages')
+    return int(valor) if valor and valor.isdigit() else None
+
+
+def precio(prices, campo):
+    """Los precios vienen como texto en unidades menores (centavos si currency_minor_unit=2)"""
+    valor = prices.get(campo)
+    if not valor:
+        return None
+    return int(valor) / 10 ** int(prices.get('currency_minor_unit') or 0)
+
+
+def productos_woocommerce(datos):
+    """Un dict por producto de la respuesta de la Store API, con precios numericos
+
+    Los productos sin precio (variables sin variacion elegida, agotados sin
+    precio) se omiten.
+    """
+    productos = []
+    for producto in datos:
+        prices = producto.get('prices') or {}
+        actual = precio(prices, 'price')
+        if not producto.get('name') or not actual:
+            continue
+        imagenes = producto.get('images') or []
+        marcas = producto.get('brands') or []
+        productos.append({
+            'nombre': html.unescape(producto['name']),
+            'marca': html.unescape(marcas[0]['name']) if marcas else None,
+            'precio': actual,
+            'precio_regular': precio(prices, 'regular_price'),
+            'sku': producto.get('sku') or None,
+            'imagen': imagenes[0].get('src') if imagenes else None,
+            'url': producto.get('permalink'),
+        })
+    return productos
+
+
+class CatalogoWooCommerceMixin:
+    """Modo JSON para tiendas WooCommerce (Mercar)
+
+    Con WOOCOMMERCE_API_ENABLED cada categoria se pide a la Store API
+    (/wp-json/wc/store/v1/products) por HTTP, sin navegador. La primera pagina
+    trae X-WP-TotalPages y las demas se piden a la vez, en el slot de descarga
+    WOOCOMMERCE_SLOT (su concurrencia y delay van en DOWNLOAD_SLOTS). Si la API
+    falla o no trae productos, la categoria se renderiza con Playwright: el
+    spider define peticion_playwright(url, categoria).
+    """
+
+    def peticion_categoria(self, url, categoria):
+        if self.settings.getbool('WOOCOMMERCE_API_ENABLED'):
+            return self.peticion_api(url, categoria)
+        return self.peticion_playwright(url, categoria)
+
+    def peticion_api(self, url, categoria, pagina=1):
+        meta = {'categoria': categoria, 'pageNumber': pagina, 'url_categoria': url}
+        slot = self.settings.get('WOOCOMMERCE_SLOT')
+        if slot:
+            meta.update(download_slot=slot, autothrottle_dont_adjust_delay=True)
+        return scrapy.Request(
+            url_productos(url, pagina, self.settings.getint('WOOCOMMERCE_POR_PAGINA', POR_PAGINA)),
+            headers={'Accept': 'application/json'},
+            meta=meta,
+            callback=self.parse_api,
+            errback=self.error_api,
+        )
+
+    def parse_api(self, response):
+        pagina = response.meta['pageNumber']
+        categoria = response.meta['categoria']
+        url = response.meta['url_categoria']
+        try:
+            datos = json.loads(response.body)
+            productos = productos_woocommerce(datos)
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            self.logger.warning(f'Respuesta invalida de la API ({response.url}): {e}')
+            datos, productos = [], []
+
+        if not datos:
+            if pagina == 1:
+                yield self.fallback_playwright(url, categoria, 'sin productos en la API')
+            return
+
+        self.crawler.stats.inc_value('woocommerce/paginas')
+        self.crawler.stats.inc_value('woocommerce/productos', len(productos))
+        self.logger.info(f'API {categoria} pagina {pagina}: {len(productos)} productos')
+        for producto in productos:
+            yield self.item_woocommerce(producto, categoria, response)
+
+        por_pagina = self.settings.getint('WOOCOMMERCE_POR_PAGINA', POR_PAGINA)
+        paginas = total_paginas(response)
+        if paginas is None:
+            # Sin cabecera: pagina a pagina hasta una incompleta
+            if len(datos) >= por_pagina:
+                yield self.peticion_api(url, categoria, pagina + 1)
+        elif pagina == 1:
+            for siguiente in range(2, paginas + 1):
+                yield self.peticion_api(url, categoria, siguiente)
+
+    def error_api(self, failure):
+        if failure.check(SinCambios):
+            # 304: la categoria no cambio desde el ultimo crawl
+            return
+        request = failure.request
+        self.crawler.stats.inc_value('woocommerce/errores')
+        if request.meta['pageNumber'] == 1:
+            yield self.fallback_playwright(request.meta['url_categoria'], request.meta['categoria'], repr(failure.value))
+        else:
+            self.logger.error(f'Error en la API {request.url}: {failure.value}')
+
+    def fallback_playwright(self, url, categoria, motivo):
+        self.logger.warning(f'API no disponible para {categoria} ({motivo}) - se usa Playwright')
+        self.crawler.stats.inc_value('woocommerce/fallback_playwright')
+        return self.peticion_playwright(url, categoria)
+
+    def item_woocommerce(self, producto, categoria, response):
+        precio_actual = producto['precio']
+        regular = producto['precio_regular']
+        precio_anterior = regular if regular and regular > precio_actual else None
+        descuento = round((precio_anterior - precio_actual) / precio_anterior * 100, 2) if precio_anterior else None
+        return {
+            'supermercado': self.supermercado,
+            'nombre': producto['nombre'].strip(),
+            'precio_actual': precio_actual,
+            'precio_anterior': precio_anterior,
+            'descuento_porcentaje': descuento,
+            'marca': producto['marca'],
+            'presentacion': None,
+            'url': response.urljoin(producto['url']) if producto['url'] else response.meta['url_categoria'],
+            'imagen_url': producto['imagen'],
+            'categoria': categoria,
+            'fecha_extraccion': fecha_extraccion(),
+        }
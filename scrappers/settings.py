@@ -23,8 +23,8 @@ TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
 # Pipelines activos - SQL Server
 ITEM_PIPELINES = {
-    'scrapers.pipelines.DataCleaningPipeline': 100,
-    'scrapers.pipelines.SQLServerPipeline': 300,
+    'scrappers.pipelines.DataCleaningPipeline': 100,
+    'scrappers.pipelines.SQLServerPipeline': 300,
 }
 
 # AutoThrottle (ajuste automático de velocidad)
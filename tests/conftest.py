@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from unittest.mock import MagicMock
+
+from tests.helpers import cargar_fixture
+
+
+@pytest.fixture
+def sink(monkeypatch, tmp_path):
+    """SQLServerSink con engine simulado"""
+    from scrappers.precio_scrapers.sinks import SQLServerSink
+
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    sink = SQLServerSink(spool_dir=str(tmp_path / "spool"))
+    sink.test_mode = False
+    sink.engine = MagicMock()
+    return sink
+
+
+@pytest.fixture
+def pipeline(sink):
+    """IngestionPipeline sobre el SQLServerSink simulado"""
+    from scrappers.precio_scrapers.pipelines import IngestionPipeline
+
+    return IngestionPipeline(sink, batch_size=3, flush_interval=60)
+
+
+@pytest.fixture
+def spider():
+    spider = MagicMock()
+    spider.name = "test"
+    return spider
+
+
+@pytest.fixture
+def servidor_local():
+    """Servidor HTTP local; responder(ruta, consulta) devuelve (status, cabeceras, cuerpo)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+
+    servidores = []
+
+    def iniciar(responder):
+        pedidas = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                partes = urlsplit(self.path)
+                pedidas.append(self.path)
+                status, cabeceras, cuerpo = responder(partes.path, parse_qs(partes.query))
+                self.send_response(status)
+                for nombre, valor in {**cabeceras, "Content-Length": str(len(cuerpo))}.items():
+                    self.send_header(nombre, valor)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        return f"http://127.0.0.1:{servidor.server_address[1]}", pedidas
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+
+
+@pytest.fixture
+def servidor_vtex(servidor_local):
+    """API de busqueda de VTEX con el fixture grabado, paginada por _from/_to"""
+    productos = cargar_fixture("vtex_despensa.json")
+
+    def responder(ruta, consulta):
+        if ruta != "/api/catalog_system/pub/products/search/mercado/frutas-y-verduras/verduras-y-hortalizas":
+            return 404, {}, b""
+        desde, hasta = int(consulta["_from"][0]), int(consulta["_to"][0])
+        return 206, {
+            "Content-Type": "application/json",
+            "resources": f"{desde}-{hasta}/{len(productos)}",
+        }, json.dumps(productos[desde:hasta + 1]).encode()
+
+    return servidor_local(responder)
@@ -0,0 +1,87 @@
+"""Datos y dobles de prueba compartidos por los tests de precio_scrapers"""
+import json
+import os
+
+from unittest.mock import MagicMock
+
+
+RESUMEN_VACIO = {"insertados": 0, "actualizados": 0, "escrituras_evitadas": 0, "historial": 0}
+
+
+def make_item(nombre, precio=1000.0, **extra):
+    item = {
+        "supermercado": "Exito",
+        "nombre": nombre,
+        "precio_actual": precio,
+        "precio_anterior": None,
+        "descuento_porcentaje": None,
+        "url": f"https://exito.com/{nombre}",
+    }
+    item.update(extra)
+    return item
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def cargar_fixture(nombre):
+    with open(os.path.join(FIXTURES, nombre), encoding="utf-8") as f:
+        return json.load(f)
+
+
+CRAWL_LOCAL = """
+import importlib
+import json
+import sys
+from scrapy.crawler import CrawlerProcess
+
+modulo, clase = sys.argv[1].rsplit(".", 1)
+Spider = getattr(importlib.import_module(modulo), clase)
+
+class SpiderLocal(Spider):
+    allowed_domains = ["127.0.0.1"]
+    CATEGORIAS = [(sys.argv[2] + "/" + Spider.CATEGORIAS[0][0].split("/", 3)[3], Spider.CATEGORIAS[0][1])]
+    custom_settings = {**Spider.custom_settings, "DOWNLOAD_DELAY": 0}
+
+    # Scrapy >= 2.13 arranca desde start()
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+proceso = CrawlerProcess({
+    "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+    "FEEDS": {sys.argv[3]: {"format": "json"}},
+    "LOG_LEVEL": "WARNING",
+    **json.loads(sys.argv[4]),
+})
+proceso.crawl(SpiderLocal)
+proceso.start()
+"""
+
+
+def crawl_local(spider, base, salida, settings):
+    """Corre la primera categoria del spider contra el servidor local, sin Playwright"""
+    import subprocess
+    import sys
+
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, "-c", CRAWL_LOCAL, spider, base, str(salida), json.dumps(settings)],
+        cwd=raiz, check=True, timeout=60,
+    )
+    return json.loads(salida.read_text(encoding="utf-8"))
+
+
+class PaginaPool:
+    """Pagina de Playwright simulada para el pool"""
+
+    def __init__(self):
+        self.cerrada = False
+        self.context = MagicMock()
+        self.context.browser = None
+
+    def is_closed(self):
+        return self.cerrada
+
+    async def close(self):
+        self.cerrada = True
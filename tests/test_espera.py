@@ -0,0 +1,153 @@
+class PaginaFalsa:
+    """Pagina de Playwright simulada: cada consulta devuelve la siguiente cantidad de productos"""
+
+    def __init__(self, cantidades, aparece=True):
+        self.cantidades = list(cantidades)
+        self.aparece = aparece
+        self.scrolls = 0
+
+    async def wait_for_selector(self, selector, timeout):
+        if not self.aparece:
+            from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+            raise PlaywrightTimeoutError(f"Timeout {timeout}ms exceeded")
+
+    async def wait_for_load_state(self, estado, timeout):
+        assert estado == "networkidle"
+
+    async def evaluate(self, script):
+        self.scrolls += 1
+
+    def locator(self, selector):
+        pagina = self
+
+        class Locator:
+            async def count(self):
+                return pagina.cantidades.pop(0) if len(pagina.cantidades) > 1 else pagina.cantidades[0]
+
+        return Locator()
+
+
+class PaginaScroll(PaginaFalsa):
+    """Pagina con scroll infinito: cada scroll carga la siguiente cantidad de productos"""
+
+    def __init__(self, cantidades):
+        super().__init__([])
+        self.siguientes = iter(cantidades)
+        self.actual = next(self.siguientes)
+
+    async def evaluate(self, script):
+        self.scrolls += 1
+        self.actual = next(self.siguientes, self.actual)
+
+    async def wait_for_function(self, expresion, arg, timeout):
+        if self.actual <= arg[1]:
+            import asyncio
+            from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+            await asyncio.sleep(timeout / 1000)
+            raise PlaywrightTimeoutError(f"Timeout {timeout}ms exceeded")
+
+    def locator(self, selector):
+        pagina = self
+
+        class Locator:
+            async def count(self):
+                return pagina.actual
+
+        return Locator()
+
+
+class TestEsperaProductos:
+    """Tests para la espera por eventos de las paginas de Playwright"""
+
+    async def test_termina_cuando_los_productos_no_cambian(self):
+        """Test que la espera termina al estabilizarse la cantidad de productos"""
+        from scrappers.precio_scrapers.espera import esperar_productos
+
+        pagina = PaginaFalsa([0, 12, 24, 36, 36])
+        resultado = await esperar_productos(pagina, "article", timeout_ms=5000, estable_ms=30, intervalo_ms=5)
+
+        assert resultado["motivo"] == "estable"
+        assert resultado["productos"] == 36
+        assert resultado["espera_ms"] < 5000
+        assert pagina.scrolls >= 5
+
+    async def test_timeout_si_nunca_se_estabiliza(self):
+        """Test que la espera no pasa del timeout aunque sigan llegando productos"""
+        from scrappers.precio_scrapers.espera import esperar_productos
+
+        pagina = PaginaFalsa(range(1000))
+        resultado = await esperar_productos(pagina, "article", timeout_ms=50, estable_ms=30, intervalo_ms=5)
+
+        assert resultado["motivo"] == "timeout"
+        assert resultado["productos"] > 0
+
+    async def test_selector_que_no_aparece(self):
+        """Test que si el selector no aparece la pagina se procesa igual, sin excepcion"""
+        from scrappers.precio_scrapers.espera import esperar_productos
+
+        resultado = await esperar_productos(PaginaFalsa([0], aparece=False), "article", timeout_ms=50)
+
+        assert resultado["motivo"] == "timeout"
+        assert resultado["productos"] == 0
+
+    async def test_sin_selector_espera_la_red(self):
+        """Test que sin selector se espera a que la red quede inactiva"""
+        from scrappers.precio_scrapers.espera import esperar_productos
+
+        resultado = await esperar_productos(PaginaFalsa([0]))
+
+        assert resultado["motivo"] == "red_inactiva"
+
+    async def test_scroll_hasta_que_no_crecen(self):
+        """Test que el scroll sigue mientras aparecen productos y reporta la cantidad de cada paso"""
+        from scrappers.precio_scrapers.espera import scroll_infinito
+
+        pagina = PaginaScroll([24, 48, 72, 80, 80])
+        resultado = await scroll_infinito(pagina, "article", timeout_ms=5000, pasos_sin_cambio=2, espera_ms=10)
+
+        assert resultado["motivo"] == "estable"
+        assert resultado["productos"] == 80
+        assert resultado["pasos"] == [48, 72, 80, 80, 80]
+        # Los pasos con productos nuevos no esperan: solo los dos ultimos agotan espera_ms
+        assert resultado["espera_ms"] < 1000
+
+    async def test_scroll_con_limite_de_tiempo(self):
+        """Test que el scroll no pasa de timeout_ms aunque sigan llegando productos"""
+        from scrappers.precio_scrapers.espera import scroll_infinito
+
+        import itertools
+
+        pagina = PaginaScroll(itertools.count(0, 24))
+        resultado = await scroll_infinito(pagina, "article", timeout_ms=50, pasos_sin_cambio=2, espera_ms=10)
+
+        assert resultado["motivo"] == "timeout"
+        assert resultado["productos"] == resultado["pasos"][-1] > 0
+
+    def test_middleware_registra_esperas(self, spider):
+        """Test que el middleware publica el tiempo de espera de cada pagina en las stats"""
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.espera import metodos_espera
+        from scrappers.precio_scrapers.middlewares import EsperaStatsMiddleware
+
+        stats = MemoryStatsCollector(get_crawler())
+        middleware = EsperaStatsMiddleware(stats)
+        for espera_ms, motivo in ((1200, "estable"), (30000, "timeout")):
+            metodos = metodos_espera("article")
+            metodos[0].result = {"espera_ms": espera_ms, "productos": 10, "motivo": motivo}
+            request = Request("https://exito.com/mercado", meta={"playwright_page_methods": metodos})
+            middleware.process_response(request, HtmlResponse(request.url, request=request), spider)
+
+        assert request.meta["espera"]["motivo"] == "timeout"
+        assert stats.get_value("playwright/espera/paginas") == 2
+        assert stats.get_value("playwright/espera/ms_total") == 31200
+        assert stats.get_value("playwright/espera/ms_max") == 30000
+        assert stats.get_value("playwright/espera/timeout") == 1
+
+        metodos = metodos_espera("article")
+        metodos[0].result = {"espera_ms": 4000, "productos": 80, "motivo": "estable", "pasos": [48, 72, 80, 80]}
+        request = Request("https://www.carulla.com/despensa", meta={"playwright_page_methods": metodos})
+        middleware.process_response(request, HtmlResponse(request.url, request=request), spider)
+        assert stats.get_value("playwright/scroll/pasos") == 4
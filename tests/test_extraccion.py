@@ -0,0 +1,70 @@
+import pytest
+
+
+HTML_TIENDA = """
+<div class="grid">
+  <article class="card"><h3 class="nombre">Arroz 1kg</h3><p class="precio"><span>$</span><span>4.500</span></p>
+    <a href="/arroz"><img data-src="/arroz.jpg"></a></article>
+  <article class="card"><h4>  </h4><h4>Leche</h4><p class="precio"><span>3.200</span></p>
+    <a href="/leche"><img src="/leche.jpg"></a></article>
+</div>
+"""
+
+
+class TestExtraccion:
+    """Tests para el motor de extraccion por especificacion"""
+
+    def espec(self):
+        from scrappers.precio_scrapers.extraccion import EspecExtraccion
+
+        return EspecExtraccion(("li.producto", "article.card"), {
+            "nombre": ("h3.nombre::text", "h4::text"),
+            "precio": "p.precio",
+            "imagen": ("img::attr(src)", "img::attr(data-src)"),
+            "url": "a::attr(href)",
+            "marca": ".marca::text",
+        })
+
+    def test_fallbacks_en_orden(self):
+        """Test que gana el primer selector con texto y los campos faltantes quedan en None"""
+        filas = self.espec().extraer(HTML_TIENDA)
+
+        assert filas == [
+            {"nombre": "Arroz 1kg", "precio": "$4.500", "imagen": "/arroz.jpg", "url": "/arroz", "marca": None},
+            {"nombre": "Leche", "precio": "3.200", "imagen": "/leche.jpg", "url": "/leche", "marca": None},
+        ]
+
+    def test_compila_una_vez(self):
+        """Test que los selectores se compilan solo la primera vez"""
+        espec = self.espec()
+        espec.extraer(HTML_TIENDA)
+        compilados = espec.compilar("lxml")
+        espec.extraer(HTML_TIENDA)
+
+        assert espec.compilar("lxml") is compilados
+
+    def test_igual_que_parsel_en_pagina_guardada(self):
+        """Test que sobre la pagina real de Carulla se obtiene lo mismo que con parsel"""
+        from pathlib import Path
+        from parsel import Selector
+        from scrappers.precio_scrapers.spiders.carulla_spider import CarullaSpider
+
+        html = (Path(__file__).parent.parent / "scrappers" / "precio_scrapers" / "carulla_page.html").read_text(encoding="utf-8")
+        filas = CarullaSpider.ESPEC.extraer(Selector(text=html))
+        tarjetas = Selector(text=html).css(CarullaSpider.PRODUCT_SELECTOR)
+
+        assert len(filas) == len(tarjetas) == 16
+        assert [f["nombre"] for f in filas] == [t.css('h3[class*="styles_name"]::text').get() for t in tarjetas]
+        assert filas[0]["precio"] == "$ 7.970"
+        assert filas[0]["vendedor"].strip() == "Carulla"
+
+    def test_selectolax(self):
+        """Test que selectolax extrae lo mismo que lxml"""
+        pytest.importorskip("selectolax")
+
+        assert self.espec().extraer(HTML_TIENDA, "selectolax") == self.espec().extraer(HTML_TIENDA)
+
+    def test_backend_invalido(self):
+        """Test que un EXTRACCION_BACKEND desconocido falla con un mensaje claro"""
+        with pytest.raises(ValueError, match="EXTRACCION_BACKEND"):
+            self.espec().extraer(HTML_TIENDA, "html5lib")
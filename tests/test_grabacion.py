@@ -0,0 +1,127 @@
+import pytest
+from unittest.mock import MagicMock
+
+from tests.helpers import crawl_local
+
+
+class TestGrabacion:
+    """Tests para el modo grabar/reproducir sobre el cache de respuestas"""
+
+    def almacen(self, directorio, modo):
+        from scrapy.settings import Settings
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.grabacion import AlmacenGrabacion
+
+        almacen = AlmacenGrabacion(Settings({"HTTPCACHE_DIR": str(directorio), "GRABACION_MODO": modo}))
+        spider = MagicMock()
+        spider.name = "carulla"
+        spider.crawler = get_crawler()
+        almacen.open_spider(spider)
+        return almacen, spider
+
+    def test_respuesta_grabada_comprimida(self, tmp_path):
+        """Test que la respuesta vuelve igual, con el cuerpo comprimido en el SQLite del spider"""
+        import sqlite3
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+
+        html = "<html><body>" + '<div class="producto">Arroz $ 5.290</div>' * 200 + "</body></html>"
+        url = "https://www.carulla.com/despensa"
+        request = Request(url, meta={"playwright": True})
+        response = HtmlResponse(url, body=html.encode(), headers={"Content-Type": "text/html; charset=utf-8"})
+
+        almacen, spider = self.almacen(tmp_path, "grabar")
+        almacen.store_response(spider, request, response)
+        # Grabando nunca se sirve lo grabado
+        assert almacen.retrieve_response(spider, request) is None
+        almacen.close_spider(spider)
+
+        almacen, spider = self.almacen(tmp_path, "reproducir")
+        # La huella no depende del meta: la misma peticion sin Playwright tambien la encuentra
+        grabada = almacen.retrieve_response(spider, Request(url))
+        assert isinstance(grabada, HtmlResponse)
+        assert grabada.text == html and grabada.status == 200
+        assert almacen.retrieve_response(spider, Request(f"{url}?page=2")) is None
+        almacen.close_spider(spider)
+
+        cuerpo, = sqlite3.connect(tmp_path / "carulla.sqlite").execute("SELECT cuerpo FROM respuestas").fetchone()
+        assert len(cuerpo) < len(html) / 10
+
+    def test_json_capturado_se_reproduce(self, tmp_path):
+        """Test que los JSON capturados en el navegador se graban y vuelven a la captura de la peticion"""
+        import sqlite3
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+        from scrappers.precio_scrapers.captura import CapturaJson
+
+        url = "https://www.carulla.com/despensa"
+        grilla = {"data": {"search": {"products": {"edges": []}}}}
+        captura = CapturaJson()
+        captura.payloads.append(grilla)
+        response = HtmlResponse(url, body=b"<html></html>")
+
+        almacen, spider = self.almacen(tmp_path, "grabar")
+        almacen.store_response(spider, Request(url, meta=captura.meta()), response)
+        almacen.store_response(spider, Request(f"{url}?page=2"), response)
+        almacen.close_spider(spider)
+
+        almacen, spider = self.almacen(tmp_path, "reproducir")
+        nueva = CapturaJson()
+        request = Request(url, meta=nueva.meta())
+        grabada = almacen.retrieve_response(spider, request)
+        assert nueva.payloads == [grilla]
+        # Una respuesta grabada sin captura no agrega nada
+        otra = CapturaJson()
+        almacen.retrieve_response(spider, Request(f"{url}?page=2", meta=otra.meta()))
+        assert otra.payloads == []
+        almacen.close_spider(spider)
+        assert grabada.status == 200
+
+        capturas = sqlite3.connect(tmp_path / "carulla.sqlite").execute(
+            "SELECT capturas FROM respuestas ORDER BY url").fetchall()
+        assert capturas[0][0] is not None and capturas[1][0] is None
+
+    def test_grabacion_anterior_sin_capturas(self, tmp_path):
+        """Test que un SQLite grabado antes de la columna capturas se sigue pudiendo abrir"""
+        import sqlite3
+        from scrapy import Request
+
+        conn = sqlite3.connect(tmp_path / "carulla.sqlite")
+        conn.execute("CREATE TABLE respuestas (huella TEXT PRIMARY KEY, metodo TEXT NOT NULL, url TEXT NOT NULL, "
+                     "url_respuesta TEXT NOT NULL, status INTEGER NOT NULL, cabeceras BLOB NOT NULL, "
+                     "cuerpo BLOB NOT NULL, fecha REAL NOT NULL)")
+        conn.commit()
+        conn.close()
+
+        almacen, spider = self.almacen(tmp_path, "reproducir")
+        assert almacen.retrieve_response(spider, Request("https://www.carulla.com/despensa")) is None
+        almacen.close_spider(spider)
+
+    def test_modo_invalido(self):
+        """Test que un GRABACION_MODO desconocido falla en vez de correr contra produccion"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.grabacion import GrabacionAddon
+
+        with pytest.raises(ValueError, match="GRABACION_MODO"):
+            GrabacionAddon.from_crawler(get_crawler(settings_dict={"GRABACION_MODO": "grabando"}))
+
+    def test_reproducir_sin_red(self, servidor_vtex, tmp_path):
+        """Test que lo grabado contra el servidor local se reproduce sin hacerle ninguna peticion"""
+        base, pedidas = servidor_vtex
+        spider = "scrappers.precio_scrapers.spiders.exito_spider.ExitoSpider"
+        settings = {
+            "ADDONS": {"scrappers.precio_scrapers.grabacion.GrabacionAddon": 200},
+            "GRABACION_DIR": str(tmp_path / "grabaciones"),
+            "VTEX_API_ENABLED": True, "VTEX_TAMANO_PAGINA": 2,
+        }
+        grabados = crawl_local(spider, base, tmp_path / "1.json", {**settings, "GRABACION_MODO": "grabar"})
+        assert len(grabados) == 3 and len(pedidas) == 2
+
+        pedidas.clear()
+        reproducidos = crawl_local(spider, base, tmp_path / "2.json", {**settings, "GRABACION_MODO": "reproducir"})
+        assert pedidas == []
+        assert self.sin_fecha(reproducidos) == self.sin_fecha(grabados)
+
+    def sin_fecha(self, items):
+        return sorted(({k: v for k, v in item.items() if k != "fecha_extraccion"} for item in items),
+                      key=lambda item: item["nombre"])
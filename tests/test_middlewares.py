@@ -0,0 +1,468 @@
+import json
+
+import pytest
+from unittest.mock import MagicMock
+
+from tests.helpers import make_item, cargar_fixture, crawl_local, PaginaPool
+
+
+class TestBloqueoRecursos:
+    """Tests para el bloqueo de recursos de Playwright"""
+
+    def peticion(self, url, tipo):
+        request = MagicMock()
+        request.url = url
+        request.resource_type = tipo
+        return request
+
+    def test_bloquea_por_tipo_y_dominio(self):
+        """Test que se bloquean los tipos y dominios de la lista y se cuentan los bytes estimados"""
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.bloqueo import BloqueoRecursos
+
+        stats = MemoryStatsCollector(get_crawler())
+        bloqueo = BloqueoRecursos(
+            tipos=["image", "font"], dominios=["google-analytics.com"],
+            bytes_por_tipo={"image": 40_000, "script": 25_000}, stats=stats,
+        )
+
+        assert bloqueo(self.peticion("https://carulla.vtexassets.com/arroz.jpg", "image"))
+        assert bloqueo(self.peticion("https://www.google-analytics.com/analytics.js", "script"))
+        assert not bloqueo(self.peticion("https://www.carulla.com/despensa", "document"))
+        assert not bloqueo(self.peticion("https://www.carulla.com/_next/app.js", "script"))
+        assert not bloqueo(self.peticion("https://notgoogle-analytics.com/x.js", "script"))
+
+        assert stats.get_value("bloqueo/peticiones") == 2
+        assert stats.get_value("bloqueo/tipo/image") == 1
+        assert stats.get_value("bloqueo/dominio/google-analytics.com") == 1
+        assert stats.get_value("bloqueo/bytes_estimados") == 65_000
+
+    def test_addon_usa_la_configuracion_del_spider(self):
+        """Test que el addon instala el predicado con los BLOQUEO_* de la tienda"""
+        import scrapy
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.bloqueo import BloqueoRecursos
+
+        class TiendaSpider(scrapy.Spider):
+            name = "tienda"
+            custom_settings = {"BLOQUEO_TIPOS": ["media"], "BLOQUEO_DOMINIOS_TIENDA": ["stats.wp.com"]}
+
+        crawler = get_crawler(TiendaSpider, {
+            "ADDONS": {"scrappers.precio_scrapers.bloqueo.BloqueoRecursosAddon": 100},
+            "BLOQUEO_ENABLED": True,
+            "BLOQUEO_DOMINIOS": ["hotjar.com"],
+        })
+        bloqueo = crawler.settings["PLAYWRIGHT_ABORT_REQUEST"]
+
+        assert isinstance(bloqueo, BloqueoRecursos)
+        assert bloqueo.tipos == {"media"}
+        assert bloqueo.dominios == ("hotjar.com", "stats.wp.com")
+
+        crawler.signals.send_catch_log(scrapy.signals.spider_opened, spider=TiendaSpider())
+        assert bloqueo.stats is crawler.stats
+
+    def test_respeta_un_abort_request_propio(self):
+        """Test que el addon no reemplaza un PLAYWRIGHT_ABORT_REQUEST ya definido"""
+        from scrapy.utils.test import get_crawler
+
+        propio = lambda request: False  # noqa: E731
+        crawler = get_crawler(settings_dict={
+            "ADDONS": {"scrappers.precio_scrapers.bloqueo.BloqueoRecursosAddon": 100},
+            "BLOQUEO_ENABLED": True,
+            "PLAYWRIGHT_ABORT_REQUEST": propio,
+        })
+
+        assert crawler.settings["PLAYWRIGHT_ABORT_REQUEST"] is propio
+
+
+class TestPoolPaginas:
+    """Tests para el pool de paginas de Playwright"""
+
+    async def test_reutiliza_paginas_libres(self):
+        """Test que una pagina devuelta se entrega a la siguiente peticion del contexto"""
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        pool = PoolPaginas(max_paginas=2)
+        assert await pool.tomar("default") is None
+        pagina = PaginaPool()
+        await pool.devolver("default", pagina)
+
+        assert await pool.tomar("otro") is None
+        assert await pool.tomar("default") is pagina
+        assert pool.vivas["default"] == 1
+
+    async def test_espera_si_el_contexto_esta_lleno(self):
+        """Test que con max_paginas vivas la peticion espera a que se libere una"""
+        import asyncio
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        pool = PoolPaginas(max_paginas=1)
+        assert await pool.tomar("default") is None
+        espera = asyncio.ensure_future(pool.tomar("default"))
+        await asyncio.sleep(0)
+        assert not espera.done()
+
+        pagina = PaginaPool()
+        await pool.devolver("default", pagina)
+        assert await asyncio.wait_for(espera, 1) is pagina
+
+    async def test_recicla_despues_de_max_usos(self):
+        """Test que una pagina se cierra al llegar a max_usos y libera su lugar"""
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        pool = PoolPaginas(max_paginas=1, max_usos=2)
+        pagina = PaginaPool()
+        await pool.tomar("default")
+        assert await pool.devolver("default", pagina)
+        assert await pool.tomar("default") is pagina
+        assert not await pool.devolver("default", pagina)
+
+        assert pagina.cerrada
+        assert pool.vivas["default"] == 0
+
+    async def test_middleware_cierra_la_pagina_si_falla_la_descarga(self, spider):
+        """Test que un error de descarga cierra la pagina, aunque el spider la haya pedido"""
+        from scrapy import Request
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.middlewares import PoolPaginasMiddleware
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        stats = MemoryStatsCollector(get_crawler())
+        middleware = PoolPaginasMiddleware(stats, PoolPaginas(max_paginas=1))
+
+        request = Request("https://www.carulla.com/despensa", meta={"playwright": True})
+        await middleware.process_request(request, spider)
+        assert request.meta["playwright_include_page"]
+        request.meta["playwright_page"] = pagina = PaginaPool()
+        await middleware.process_exception(request, TimeoutError(), spider)
+        assert pagina.cerrada
+        assert middleware.pool.vivas["default"] == 0
+
+        propia = Request("https://www.carulla.com/quesos", meta={"playwright": True, "playwright_include_page": True})
+        await middleware.process_request(propia, spider)
+        propia.meta["playwright_page"] = pagina = PaginaPool()
+        await middleware.process_exception(propia, TimeoutError(), spider)
+        assert pagina.cerrada
+        assert "playwright_page" not in propia.meta
+        assert stats.get_value("playwright/pool/cerradas_por_error") == 2
+
+    async def test_middleware_devuelve_la_pagina_al_pool(self, spider):
+        """Test que tras la respuesta la pagina vuelve al pool y la usa la siguiente peticion"""
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.middlewares import PoolPaginasMiddleware
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        stats = MemoryStatsCollector(get_crawler())
+        middleware = PoolPaginasMiddleware(stats, PoolPaginas(max_paginas=1))
+
+        primera = Request("https://www.exito.com/mercado/despensa", meta={"playwright": True})
+        await middleware.process_request(primera, spider)
+        primera.meta["playwright_page"] = pagina = PaginaPool()
+        respuesta = await middleware.process_response(primera, HtmlResponse(primera.url, request=primera), spider)
+        assert "playwright_page" not in respuesta.meta
+
+        segunda = Request("https://www.exito.com/mercado/despensa?page=2", meta={"playwright": True})
+        await middleware.process_request(segunda, spider)
+        assert segunda.meta["playwright_page"] is pagina
+        assert stats.get_value("playwright/pool/reutilizadas") == 1
+
+
+class TestRenderizadoHibrido:
+    """Tests para el renderizado HTTP primero con escalado aprendido a Playwright"""
+
+    HTML_CON_PRODUCTOS = b'<html><body><div class="box-product-item">Arroz</div></body></html>'
+    HTML_SIN_PRODUCTOS = b'<html><body><div id="app"></div></body></html>'
+
+    @pytest.fixture
+    def spider_html(self):
+        spider = MagicMock()
+        spider.name = "surtifamiliar"
+        spider.PRODUCT_SELECTOR = ".box-product-item"
+        return spider
+
+    def middleware(self, ruta, spider):
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.middlewares import RenderizadoHibridoMiddleware
+
+        middleware = RenderizadoHibridoMiddleware(MemoryStatsCollector(get_crawler()), str(ruta))
+        middleware.spider_opened(spider)
+        return middleware
+
+    def test_patron_url(self):
+        """Test que las categorias de una tienda comparten patron y los parametros cuentan"""
+        from scrappers.precio_scrapers.renderizado import patron_url
+
+        assert patron_url("https://surtifamiliar.com/verduras/products") == "surtifamiliar.com/*/*"
+        assert patron_url("https://surtifamiliar.com/pollo/products?page=2") == "surtifamiliar.com/*/*?page"
+        assert patron_url("https://losprecios.co/ara_t2?p=3&orden=") == "losprecios.co/*?orden&p"
+
+    def test_decisiones_entre_ejecuciones(self, tmp_path, monkeypatch):
+        """Test que las decisiones se guardan por spider, no pisan otros spiders y caducan"""
+        import time
+        from scrappers.precio_scrapers.renderizado import DecisionesRenderizado
+
+        ruta = tmp_path / "cache" / "renderizado.json"
+        exito = DecisionesRenderizado(str(ruta), "exito").cargar()
+        exito.registrar("www.exito.com/*/*", "navegador")
+        exito.guardar()
+        ara = DecisionesRenderizado(str(ruta), "ara").cargar()
+        ara.registrar("losprecios.co/*", "http")
+        ara.guardar()
+
+        assert DecisionesRenderizado(str(ruta), "exito").cargar().modo("www.exito.com/*/*") == "navegador"
+        assert DecisionesRenderizado(str(ruta), "ara").cargar().modo("losprecios.co/*") == "http"
+
+        ahora = time.time()
+        monkeypatch.setattr(time, "time", lambda: ahora + 8 * 86400)
+        assert DecisionesRenderizado(str(ruta), "exito", ttl_dias=7).cargar().modo("www.exito.com/*/*") is None
+
+    @pytest.mark.parametrize("captura", [True, False])
+    def test_scroll_y_captura_siempre_con_navegador(self, tmp_path, captura):
+        """Test que las peticiones con scroll infinito o captura de JSON nunca se prueban por HTTP"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.carulla_spider import CarullaSpider
+        from scrappers.precio_scrapers.spiders.exito_spider import ExitoSpider
+
+        peticiones = []
+        for spidercls in (CarullaSpider, ExitoSpider):
+            spider = spidercls.from_crawler(get_crawler(spidercls, {"CAPTURA_JSON_ENABLED": captura}))
+            middleware = self.middleware(tmp_path / "renderizado.json", spider)
+            request = spider.peticion_playwright(f"https://www.{spider.name}.com/despensa", "Despensa")
+            assert middleware.process_request(request, spider) is None
+            peticiones.append(request)
+
+        carulla, exito = peticiones
+        assert carulla.meta["playwright"] is True
+        # Exito sin captura solo espera productos: puede probar por HTTP
+        assert exito.meta["playwright"] is captura
+
+    def test_http_con_productos_no_usa_navegador(self, tmp_path, spider_html):
+        """Test que si el HTML servido trae productos la peticion nunca pasa por Playwright"""
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+
+        middleware = self.middleware(tmp_path / "renderizado.json", spider_html)
+        request = Request("https://surtifamiliar.com/verduras/products", meta={"playwright": True})
+        assert middleware.process_request(request, spider_html) is None
+        assert request.meta["playwright"] is False
+
+        response = HtmlResponse(request.url, body=self.HTML_CON_PRODUCTOS, request=request)
+        assert middleware.process_response(request, response, spider_html) is response
+        assert middleware.decisiones.modo("surtifamiliar.com/*/*") == "http"
+        assert middleware.stats.get_value("hibrido/http") == 1
+
+    def test_escala_y_recuerda_el_navegador(self, tmp_path, spider_html):
+        """Test que sin productos por HTTP se repite con Playwright y la siguiente ejecucion va directo"""
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+
+        ruta = tmp_path / "renderizado.json"
+        middleware = self.middleware(ruta, spider_html)
+        request = Request("https://www.exito.com/mercado/despensa", meta={"playwright": True})
+        middleware.process_request(request, spider_html)
+        vacia = HtmlResponse(request.url, body=self.HTML_SIN_PRODUCTOS, request=request)
+        escalada = middleware.process_response(request, vacia, spider_html)
+        assert escalada.meta["playwright"] is True and escalada.dont_filter
+        assert middleware.process_request(escalada, spider_html) is None
+        assert escalada.meta["playwright"] is True
+
+        # Ultima pagina vacia tambien en el navegador: no se aprende nada
+        middleware.process_response(escalada, HtmlResponse(request.url, body=self.HTML_SIN_PRODUCTOS), spider_html)
+        assert middleware.decisiones.modo("www.exito.com/*/*") is None
+        middleware.process_response(escalada, HtmlResponse(request.url, body=self.HTML_CON_PRODUCTOS), spider_html)
+        middleware.spider_closed(spider_html)
+
+        siguiente = self.middleware(ruta, spider_html)
+        request = Request("https://www.exito.com/mercado/carnes", meta={"playwright": True})
+        siguiente.process_request(request, spider_html)
+        assert request.meta["playwright"] is True
+        assert siguiente.stats.get_value("hibrido/navegador_aprendido") == 1
+
+    def test_error_http_escala(self, tmp_path, spider_html):
+        """Test que un error de descarga por HTTP se repite con Playwright"""
+        from scrapy import Request
+
+        middleware = self.middleware(tmp_path / "renderizado.json", spider_html)
+        request = Request("https://surtifamiliar.com/pollo/products", meta={"playwright": True})
+        middleware.process_request(request, spider_html)
+        escalada = middleware.process_exception(request, ConnectionRefusedError(), spider_html)
+        assert escalada.meta["playwright"] is True
+        assert middleware.process_exception(escalada, ConnectionRefusedError(), spider_html) is None
+
+
+class TestCrawlIncremental:
+    """Tests para el salto de categorias sin cambios entre crawls"""
+
+    URL = "https://www.exito.com/api/catalog_system/pub/products/search/mercado/despensa?_from=0"
+    MIDDLEWARES = {
+        "DOWNLOADER_MIDDLEWARES": {"scrappers.precio_scrapers.middlewares.PeticionesCondicionalesMiddleware": 520},
+        "SPIDER_MIDDLEWARES": {"scrappers.precio_scrapers.middlewares.CrawlIncrementalMiddleware": 550},
+    }
+
+    def spider(self):
+        spider = MagicMock()
+        spider.name = "exito"
+        return spider
+
+    def crawler(self, ruta, **settings):
+        from scrapy.utils.test import get_crawler
+
+        crawler = get_crawler(settings_dict={"INCREMENTAL_ENABLED": True, "INCREMENTAL_DB_PATH": str(ruta), **settings})
+        crawler.stats.open_spider()
+        return crawler
+
+    def salida_pagina_1(self, middleware, productos, categoria="Despensa"):
+        from scrapy import Request
+        from scrapy.http import TextResponse
+
+        request = Request(self.URL, meta={"categoria": categoria, "page": 1})
+        response = TextResponse(self.URL, body=b"[]", request=request)
+        resultado = [make_item(nombre, precio) for nombre, precio in productos] + [
+            Request(f"{self.URL}&pagina={n}", meta={"categoria": categoria, "page": n}) for n in (2, 3)
+        ]
+        return list(middleware.process_spider_output(response, resultado, MagicMock()))
+
+    def recorrer(self, ruta, productos, reason="finished", **settings):
+        from scrappers.precio_scrapers.middlewares import CrawlIncrementalMiddleware
+
+        crawler = self.crawler(ruta, **settings)
+        middleware = CrawlIncrementalMiddleware.from_crawler(crawler)
+        middleware.spider_opened(self.spider())
+        salida = self.salida_pagina_1(middleware, productos)
+        middleware.spider_closed(None, reason)
+        return salida, crawler.stats
+
+    def test_huella_ignora_el_orden(self):
+        """Test que el hash depende de nombres y precios, no del orden de los productos"""
+        from scrappers.precio_scrapers.estado_crawl import huella_productos
+
+        arroz, aceite = make_item("Arroz", 5290.0), make_item("Aceite", 12450.0)
+        assert huella_productos([arroz, aceite]) == huella_productos([aceite, arroz])
+        assert huella_productos([arroz, aceite]) != huella_productos([arroz, make_item("Aceite", 11990.0)])
+
+    def test_categoria_sin_cambios_omite_paginas(self, tmp_path):
+        """Test que con la primera pagina igual al crawl anterior se emiten sus items pero no las paginas 2 y 3"""
+        from scrapy import Request
+
+        ruta = tmp_path / "estado.sqlite"
+        productos = [("Arroz", 5290.0), ("Aceite", 12450.0)]
+        primera, _ = self.recorrer(ruta, productos)
+        assert sum(isinstance(s, Request) for s in primera) == 2
+        assert all(s.meta["incremental_categoria"] == self.URL for s in primera if isinstance(s, Request))
+
+        segunda, stats = self.recorrer(ruta, list(reversed(productos)))
+        assert [s["nombre"] for s in segunda] == ["Aceite", "Arroz"]
+        assert stats.get_value("incremental/categorias_sin_cambios") == 1
+        assert stats.get_value("incremental/paginas_omitidas") == 2
+
+        cambio, _ = self.recorrer(ruta, [("Arroz", 4990.0), ("Aceite", 12450.0)])
+        assert sum(isinstance(s, Request) for s in cambio) == 2
+
+    def test_crawl_interrumpido_o_viejo_recorre_completo(self, tmp_path, monkeypatch):
+        """Test que un crawl cerrado sin terminar no cuenta como completo y el estado caduca"""
+        import time
+        from scrapy import Request
+
+        ruta = tmp_path / "estado.sqlite"
+        productos = [("Arroz", 5290.0)]
+        self.recorrer(ruta, productos, reason="shutdown")
+        salida, _ = self.recorrer(ruta, productos)
+        assert sum(isinstance(s, Request) for s in salida) == 2
+
+        ahora = time.time()
+        monkeypatch.setattr(time, "time", lambda: ahora + 8 * 86400)
+        salida, _ = self.recorrer(ruta, productos, INCREMENTAL_MAX_DIAS=7)
+        assert sum(isinstance(s, Request) for s in salida) == 2
+
+    async def test_paginas_siguientes_pasan_sin_juntar(self, tmp_path):
+        """Test que la salida de una pagina > 1 se entrega a medida que el callback la produce"""
+        from scrapy import Request
+        from scrapy.http import TextResponse
+        from scrappers.precio_scrapers.middlewares import CrawlIncrementalMiddleware
+
+        middleware = CrawlIncrementalMiddleware.from_crawler(self.crawler(tmp_path / "estado.sqlite"))
+        middleware.spider_opened(self.spider())
+        request = Request(f"{self.URL}&pagina=2", meta={"categoria": "Despensa", "page": 2, "incremental_categoria": self.URL})
+        response = TextResponse(request.url, body=b"[]", request=request)
+        producidos = []
+
+        def callback():
+            for n in range(3):
+                producidos.append(n)
+                yield make_item(f"Producto {n}")
+            yield Request(f"{self.URL}&pagina=3", meta={"categoria": "Despensa", "page": 3})
+
+        salida = middleware.process_spider_output(response, callback(), MagicMock())
+        next(salida)
+        assert producidos == [0]
+        assert list(salida)[-1].meta["incremental_categoria"] == self.URL
+
+        async def callback_async():
+            for s in callback():
+                yield s
+
+        producidos.clear()
+        salida = middleware.process_spider_output_async(response, callback_async(), MagicMock())
+        await salida.__anext__()
+        assert producidos == [0]
+
+    def test_peticion_condicional_y_304(self, tmp_path):
+        """Test que la primera pagina por HTTP lleva If-None-Match y un 304 termina en SinCambios"""
+        from scrapy import Request
+        from scrapy.http import Response
+        from scrappers.precio_scrapers.estado_crawl import EstadoCrawl, SinCambios
+        from scrappers.precio_scrapers.middlewares import PeticionesCondicionalesMiddleware
+
+        ruta = tmp_path / "estado.sqlite"
+        estado = EstadoCrawl(str(ruta))
+        estado.abrir("exito")
+        estado.registrar_validadores(self.URL, '"v1"', None)
+        estado.guardar()
+
+        crawler = self.crawler(ruta)
+        middleware = PeticionesCondicionalesMiddleware.from_crawler(crawler)
+        spider = self.spider()
+        middleware.spider_opened(spider)
+
+        navegador = Request(self.URL, meta={"page": 1, "playwright": True})
+        middleware.process_request(navegador, spider)
+        assert b"If-None-Match" not in navegador.headers
+
+        request = Request(self.URL, meta={"page": 1})
+        middleware.process_request(request, spider)
+        assert request.headers["If-None-Match"] == b'"v1"'
+        with pytest.raises(SinCambios):
+            middleware.process_response(request, Response(self.URL, status=304, request=request), spider)
+        assert crawler.stats.get_value("incremental/respuestas_304") == 1
+
+    def test_segundo_crawl_contra_servidor_local(self, servidor_local, tmp_path):
+        """Test que si la primera pagina no cambio el segundo crawl no pide las demas"""
+        productos = cargar_fixture("vtex_despensa.json")
+
+        def responder(ruta, consulta):
+            desde, hasta = int(consulta["_from"][0]), int(consulta["_to"][0])
+            return 200, {
+                "Content-Type": "application/json",
+                "resources": f"{desde}-{hasta}/{len(productos)}",
+                "ETag": f'"{desde}"',
+            }, json.dumps(productos[desde:hasta + 1]).encode()
+
+        base, pedidas = servidor_local(responder)
+        spider = "scrappers.precio_scrapers.spiders.exito_spider.ExitoSpider"
+        settings = {
+            **self.MIDDLEWARES, "INCREMENTAL_ENABLED": True, "INCREMENTAL_DB_PATH": str(tmp_path / "estado.sqlite"),
+            "VTEX_API_ENABLED": True, "VTEX_TAMANO_PAGINA": 2,
+        }
+        assert len(crawl_local(spider, base, tmp_path / "1.json", settings)) == 3
+        assert len(pedidas) == 2
+
+        # El servidor no implementa If-None-Match: responde 200 y decide el hash
+        pedidas.clear()
+        assert len(crawl_local(spider, base, tmp_path / "2.json", settings)) == 2
+        assert len(pedidas) == 1
@@ -0,0 +1,212 @@
+import json
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from tests.helpers import RESUMEN_VACIO, make_item
+
+
+class TestEscrituraPorLotes:
+    """Tests para el modo buffered de SQLServerPipeline"""
+
+    def test_acumula_hasta_batch_size(self, pipeline, spider):
+        """Test que no se escribe nada hasta llenar el lote"""
+        with patch.object(pipeline.sink, "_escribir_lote", return_value=(RESUMEN_VACIO, [])) as escribir:
+            pipeline.process_item(make_item("a"), spider)
+            pipeline.process_item(make_item("b"), spider)
+            assert escribir.call_count == 0
+
+            pipeline.process_item(make_item("c"), spider)
+            assert escribir.call_count == 1
+            assert len(escribir.call_args[0][1]) == 3
+            assert pipeline.buffer == []
+
+    def test_flush_por_intervalo(self, pipeline, spider):
+        """Test que un buffer antiguo se escribe aunque no este lleno"""
+        pipeline.flush_interval = 0
+        with patch.object(pipeline.sink, "_escribir_lote", return_value=(RESUMEN_VACIO, [])) as escribir:
+            pipeline.process_item(make_item("a"), spider)
+            assert escribir.call_count == 1
+
+    def test_close_spider_escribe_restantes(self, pipeline, spider):
+        """Test que close_spider guarda lo que quede en el buffer"""
+        with patch.object(pipeline.sink, "_escribir_lote", return_value=(RESUMEN_VACIO, [])) as escribir:
+            pipeline.process_item(make_item("a"), spider)
+            pipeline.close_spider(spider)
+            assert escribir.call_count == 1
+
+    def test_lote_deduplicado(self, pipeline, spider):
+        """Test que un producto repetido en el lote se escribe una sola vez"""
+        with patch.object(pipeline.sink, "_escribir_lote", return_value=(RESUMEN_VACIO, [])) as escribir:
+            pipeline.process_item(make_item("Arroz", 1000.0), spider)
+            pipeline.process_item(make_item("arroz ", 1200.0), spider)
+            pipeline.process_item(make_item("Leche"), spider)
+            lote = escribir.call_args[0][1]
+            assert len(lote) == 2
+            assert lote[0]["precio_actual"] == 1200.0
+
+    def test_error_en_lote_no_detiene_crawl(self, pipeline, spider):
+        """Test que un error de BD se registra y el lote va al spool"""
+        from scrappers.precio_scrapers.spool import leer_spool
+
+        with patch.object(pipeline.sink, "_escribir_lote", side_effect=Exception("timeout")):
+            for nombre in ("a", "b", "c"):
+                pipeline.process_item(make_item(nombre), spider)
+        assert pipeline.buffer == []
+        assert [f["nombre"] for f in leer_spool(pipeline.sink.spool.ruta)] == ["a", "b", "c"]
+
+
+class ReactorInmediato:
+    """Reactor falso que ejecuta callFromThread en el acto"""
+
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+
+@pytest.fixture
+def async_pipeline(sink):
+    """AsyncIngestionPipeline con engine simulado y reactor falso"""
+    from scrappers.precio_scrapers.pipelines import AsyncIngestionPipeline
+
+    pipeline = AsyncIngestionPipeline(sink, queue_size=2, batch_size=2, flush_interval=60)
+    pipeline.reactor = ReactorInmediato()
+    return pipeline
+
+
+class TestEscritorAsincrono:
+    """Tests para AsyncIngestionPipeline"""
+
+    def test_backpressure_con_cola_llena(self, async_pipeline, spider):
+        """Test que con la cola llena process_item devuelve un Deferred pendiente"""
+        from twisted.internet.defer import Deferred
+
+        item = make_item("c")
+        async_pipeline.escritor = MagicMock()
+        async_pipeline.process_item(make_item("a"), spider)
+        async_pipeline.process_item(make_item("b"), spider)
+        resultado = async_pipeline.process_item(item, spider)
+
+        assert isinstance(resultado, Deferred)
+        assert not resultado.called
+
+        async_pipeline.cola.get_nowait()
+        async_pipeline._liberar_esperas()
+        assert resultado.called
+        assert resultado.result is item
+        assert async_pipeline.cola.qsize() == 2
+
+    def test_escritor_vacia_la_cola_al_cerrar(self, async_pipeline, spider):
+        """Test que el hilo escritor guarda todos los items antes de cerrar"""
+        async_pipeline.cola.maxsize = 10
+        with patch.object(async_pipeline.sink, "_escribir_lote", return_value=(RESUMEN_VACIO, [])) as escribir:
+            async_pipeline.open_spider(spider)
+            for nombre in ("a", "b", "c"):
+                assert async_pipeline.process_item(make_item(nombre), spider)["nombre"] == nombre
+            async_pipeline._cerrar_en_hilo(spider)
+
+        assert [len(c[0][1]) for c in escribir.call_args_list] == [2, 1]
+        assert async_pipeline.escritor is None
+
+
+class TestDeduplicacion:
+    """Tests para DeduplicationPipeline"""
+
+    def test_descarta_repetidos_y_registra_solapamientos(self, spider):
+        """Test que un producto visto en otra categoria se descarta y se cuenta el solapamiento"""
+        from scrapy.exceptions import DropItem
+        from scrappers.precio_scrapers.pipelines import DeduplicationPipeline
+
+        pipeline = DeduplicationPipeline()
+        pipeline.process_item(make_item("Queso Brie", categoria="Delicatessen"), spider)
+        pipeline.process_item(make_item("Queso Gouda", categoria="Quesos"), spider)
+        with pytest.raises(DropItem):
+            pipeline.process_item(make_item("queso brie ", categoria="Quesos"), spider)
+
+        assert pipeline.descartados == 1
+        assert pipeline.solapamientos == {("Delicatessen", "Quesos"): 1}
+
+    def test_clave_por_url_normalizada(self, spider):
+        """Test que con DEDUP_KEY = 'url' se ignoran query, fragmento y '/' final"""
+        from scrapy.exceptions import DropItem
+        from scrappers.precio_scrapers.pipelines import DeduplicationPipeline
+
+        pipeline = DeduplicationPipeline(campo="url", backend="bloom", capacidad=1000)
+        pipeline.process_item(make_item("A", url="https://Exito.com/arroz/p/?sc=1"), spider)
+        pipeline.process_item(make_item("A", url="https://exito.com/leche/p"), spider)
+        with pytest.raises(DropItem):
+            pipeline.process_item(make_item("B", url="https://exito.com/arroz/p#x"), spider)
+
+    def test_repetidos_se_registran_en_debug(self, spider):
+        """Test que FormatoLog baja a DEBUG solo el descarte de repetidos"""
+        import logging
+        from scrapy.exceptions import DropItem
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.pipelines import DeduplicationPipeline, FormatoLog
+
+        pipeline = DeduplicationPipeline()
+        item = make_item("Arroz")
+        pipeline.process_item(item, spider)
+        with pytest.raises(DropItem) as repetido:
+            pipeline.process_item(item, spider)
+
+        spider.crawler = get_crawler()
+        formato = FormatoLog()
+        assert formato.dropped(item, repetido.value, None, spider)["level"] == logging.DEBUG
+        assert formato.dropped(item, DropItem("sin precio"), None, spider)["level"] == logging.WARNING
+
+    def test_bloom_sin_falsos_negativos(self):
+        """Test que el filtro de Bloom reconoce todas las claves ya agregadas"""
+        from scrappers.precio_scrapers.dedup import BloomFilter
+
+        bloom = BloomFilter(capacidad=5000, error=1e-4)
+        assert all(bloom.agregar(f"producto {i}")[0] for i in range(5000))
+        assert not any(bloom.agregar(f"producto {i}")[0] for i in range(5000))
+        assert len(bloom) == 5000
+
+
+class TestMetricasIngestion:
+    """Tests para las metricas y el resumen de ingestion"""
+
+    def test_percentil(self):
+        """Test que el percentil usa el rango mas cercano"""
+        from scrappers.precio_scrapers.metrics import percentil
+
+        valores = list(range(1, 101))
+        assert percentil(valores, 50) == 50
+        assert percentil(valores, 99) == 99
+        assert percentil([7], 99) == 7
+        assert percentil([], 50) is None
+
+    def test_resumen_en_stats_y_json(self, tmp_path, spider):
+        """Test que close_spider publica el resumen en stats y en un JSON"""
+        from scrappers.precio_scrapers.pipelines import IngestionPipeline
+        from scrappers.precio_scrapers.sinks import SQLiteSink
+
+        pipeline = IngestionPipeline(
+            SQLiteSink(str(tmp_path / "productos.sqlite")), batch_size=2, summary_dir=str(tmp_path)
+        )
+        pipeline.stats = MagicMock()
+        pipeline.open_spider(spider)
+        for nombre in ("a", "b", "c"):
+            pipeline.process_item(make_item(nombre), spider)
+        pipeline.close_spider(spider)
+
+        stats = {c[0][0]: c[0][1] for c in pipeline.stats.set_value.call_args_list}
+        assert stats["ingestion/items"] == 3
+        assert stats["ingestion/lotes"] == 2
+        assert stats["ingestion/insertados"] == 3
+        resumen = json.loads(next(tmp_path.glob("test_*_ingestion.json")).read_text(encoding="utf-8"))
+        assert resumen["lote_max"] == 2
+        assert resumen["latencia_ms_p99"] is not None
+
+    def test_round_trips_sql(self, sink):
+        """Test que el sink cuenta cada sentencia enviada a la base de datos"""
+        from sqlalchemy import create_engine, event, text
+
+        sink.engine = create_engine("sqlite://")
+        event.listen(sink.engine, "before_cursor_execute", sink._contar_round_trip)
+        with sink.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+        assert sink.round_trips == 2
@@ -0,0 +1,229 @@
+import json
+import os
+
+import pytest
+
+from tests.helpers import cargar_fixture, crawl_local
+
+
+@pytest.fixture
+def servidor_woocommerce(servidor_local):
+    """Store API de WooCommerce con el fixture grabado, paginada por page/per_page"""
+    productos = cargar_fixture("woocommerce_aseo.json")
+
+    def responder(ruta, consulta):
+        if ruta != "/wp-json/wc/store/v1/products" or consulta["category"] != ["aseo-general"]:
+            return 404, {}, b""
+        pagina, por_pagina = int(consulta["page"][0]), int(consulta["per_page"][0])
+        return 200, {
+            "Content-Type": "application/json",
+            "X-WP-Total": str(len(productos)),
+            "X-WP-TotalPages": str(-(-len(productos) // por_pagina)),
+        }, json.dumps(productos[(pagina - 1) * por_pagina:pagina * por_pagina]).encode()
+
+    return servidor_local(responder)
+
+
+class TestCatalogoWooCommerce:
+    """Tests para el modo Store API de Mercar"""
+
+    def test_mapeo_del_json_grabado(self):
+        """Test que los precios en unidades menores y los nombres con entidades se convierten"""
+        from scrappers.precio_scrapers.woocommerce import productos_woocommerce, url_productos
+
+        assert url_productos("https://supermercadomercar.com/product-category/aseo-general/", 2) == (
+            "https://supermercadomercar.com/wp-json/wc/store/v1/products?category=aseo-general&page=2&per_page=100"
+        )
+
+        # El producto variable no tiene precio
+        ariel, jabon = productos_woocommerce(cargar_fixture("woocommerce_aseo.json"))
+        assert ariel["precio"] == 16990 and ariel["precio_regular"] == 18990
+        assert ariel["marca"] == "Ariel" and ariel["imagen"].endswith("ariel-1kg.jpg")
+        assert jabon["nombre"] == "Jabón Rey Barra x 3 & Esponja"
+        assert jabon["precio"] == 8500 and jabon["marca"] is None and jabon["imagen"] is None
+
+    def test_crawl_contra_servidor_local(self, servidor_woocommerce, tmp_path):
+        """Test que el spider pagina la Store API del servidor local y arma los items de siempre"""
+        base, pedidas = servidor_woocommerce
+        items = crawl_local(
+            "scrappers.precio_scrapers.spiders.mercar_spider.MercarSpider", base, tmp_path / "items.json",
+            {"WOOCOMMERCE_API_ENABLED": True, "WOOCOMMERCE_POR_PAGINA": 2},
+        )
+
+        items = {item["nombre"]: item for item in items}
+        assert set(items) == {"Detergente en Polvo Ariel 1 kg", "Jabón Rey Barra x 3 & Esponja"}
+        ariel = items["Detergente en Polvo Ariel 1 kg"]
+        assert ariel["supermercado"] == "Mercar" and ariel["categoria"] == "Limpieza Hogar"
+        assert ariel["precio_actual"] == 16990
+        assert ariel["precio_anterior"] == 18990
+        assert ariel["descuento_porcentaje"] == 10.53
+        assert ariel["url"] == "https://supermercadomercar.com/product/detergente-en-polvo-ariel-1-kg/"
+        # 3 productos en paginas de 2: X-WP-TotalPages de la primera lanza la segunda
+        assert sorted(p.split("page=")[1].split("&")[0] for p in pedidas) == ["1", "2"]
+
+    def test_slot_propio_y_fallback(self):
+        """Test que la API va en su slot de descarga y que sin productos se usa Playwright"""
+        from scrapy.http import TextResponse
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.mercar_spider import MercarSpider
+
+        crawler = get_crawler(MercarSpider, {"WOOCOMMERCE_API_ENABLED": True, "WOOCOMMERCE_SLOT": "woocommerce-api"})
+        crawler.stats.open_spider()
+        spider = MercarSpider.from_crawler(crawler)
+        request = spider.peticion_categoria("https://supermercadomercar.com/product-category/despensa/", "Despensa")
+        assert request.meta["download_slot"] == "woocommerce-api"
+        assert "playwright" not in request.meta
+
+        fallback, = spider.parse_api(TextResponse(request.url, body=b'{"code": "rest_no_route"}', request=request))
+        assert fallback.url == "https://supermercadomercar.com/product-category/despensa/"
+        assert fallback.meta["playwright"]
+        assert crawler.stats.get_value("woocommerce/fallback_playwright") == 1
+
+
+class TestPaginacionAra:
+    """Tests para la paginacion y la extraccion de AraSpider"""
+
+    @pytest.fixture
+    def ara(self):
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.ara_spider import AraSpider
+
+        return AraSpider.from_crawler(get_crawler(AraSpider))
+
+    def respuesta(self, url, html, page):
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+
+        return HtmlResponse(url, body=html.encode("utf-8"), encoding="utf-8", request=Request(url, meta={"page": page}))
+
+    def test_pagina_guardada(self, ara):
+        """Test que se extraen los productos de los atributos y se sigue el enlace a la pagina 2"""
+        from scrapy import Request
+
+        ruta = os.path.join(os.path.dirname(__file__), "..", "scrappers", "precio_scrapers", "ara_debug.html")
+        with open(ruta, encoding="utf-8") as f:
+            html = f.read()
+        resultado = list(ara.parse(self.respuesta("https://losprecios.co/ara_t2", html, 1)))
+
+        items = [r for r in resultado if isinstance(r, dict)]
+        peticiones = [r for r in resultado if isinstance(r, Request)]
+        assert len(items) == 10
+        assert items[0]["nombre"].startswith("Aceite de Girasol Olisun")
+        assert items[0]["precio_actual"] == 17000.0
+        assert [(p.url, p.meta["page"]) for p in peticiones] == [("https://losprecios.co/ara_t2?p=2", 2)]
+
+    def test_termina_en_la_ultima_pagina(self, ara):
+        """Test que sin enlace a una pagina posterior, o sin productos, no se piden mas paginas"""
+        producto = '<button class="btn b-ed-pr" data-n-tienda="Ara" data-n-ítem="Sal 1 kg" data-precio="2100,0000"></button>'
+        anterior = '<div class="cn-b-pag"><a href="/ara_t2?p=6" class="btn-paginación">Página 6</a></div>'
+        assert len(list(ara.parse(self.respuesta("https://losprecios.co/ara_t2?p=7", producto + anterior, 7)))) == 1
+        assert list(ara.parse(self.respuesta("https://losprecios.co/ara_t2?p=8", "<html></html>", 8))) == []
+
+    def test_total_conocido_reparte_todas_las_paginas(self, ara):
+        """Test que si el paginador de la pagina 1 muestra el total, todas las paginas salen a la vez"""
+        producto = '<button class="btn b-ed-pr" data-n-tienda="Ara" data-n-ítem="Sal 1 kg" data-precio="2100,0000"></button>'
+        paginador = '<div class="cn-b-pag">' + "".join(
+            f'<a href="/ara_t2?p={n}">{n}</a>' for n in (2, 3, 4, 5)
+        ) + "</div>"
+        resultado = list(ara.parse(self.respuesta("https://losprecios.co/ara_t2", producto + paginador, 1)))
+        assert [r.meta["page"] for r in resultado[1:]] == [2, 3, 4, 5]
+
+    @pytest.mark.parametrize("texto,precio", [
+        ("17000,0000", 17000.0), ("16,990", 16990.0), ("$ 1.234,50", 1234.5), ("$ 7.970", 7970.0),
+    ])
+    def test_limpiar_precio(self, ara, texto, precio):
+        assert ara.limpiar_precio(texto) == precio
+
+
+class TestRepartoDePaginas:
+    """Tests para el reparto de paginas de Exito y Surtifamiliar desde la pagina 1"""
+
+    def respuesta(self, url, html, **meta):
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+
+        return HtmlResponse(url, body=html.encode("utf-8"), encoding="utf-8", request=Request(url, meta=meta))
+
+    def peticiones(self, resultado):
+        from scrapy import Request
+
+        return [r for r in resultado if isinstance(r, Request)]
+
+    def tarjetas_exito(self, cantidad):
+        return "".join(
+            f'<div class="vtex-search-result-3-x-galleryItem"><h3 class="productName">Producto {n}</h3>'
+            f'<span class="price">$ 1.{n:03d}</span><a href="/producto-{n}/p"></a></div>'
+            for n in range(cantidad)
+        )
+
+    def test_surtifamiliar_pagina_guardada(self):
+        """Test que "Mostrando 1 a 12 de 46 productos" reparte las paginas 2 a 4 y estas no piden mas"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.surtifamiliar_spider import SurtifamiliarSpider
+
+        spider = SurtifamiliarSpider.from_crawler(get_crawler(SurtifamiliarSpider))
+        ruta = os.path.join(os.path.dirname(__file__), "..", "scrappers", "precio_scrapers", "surtifamiliar_page.html")
+        with open(ruta, encoding="utf-8") as f:
+            html = f.read()
+
+        url = "https://surtifamiliar.com/verduras/products"
+        peticiones = self.peticiones(spider.parse(self.respuesta(url, html, pageNumber=1, categoria="Verduras")))
+        assert [(p.meta["pageNumber"], p.meta["paginas"]) for p in peticiones] == [(2, 4), (3, 4), (4, 4)]
+        assert peticiones[-1].url == f"{url}?pageNumber=4"
+
+        repartida = self.respuesta(peticiones[0].url, html, pageNumber=2, categoria="Verduras", paginas=4)
+        assert self.peticiones(spider.parse(repartida)) == []
+
+    def test_surtifamiliar_paginador_truncado(self):
+        """Test que sin "Mostrando" el paginador no se toma como total: la ultima pagina visible sigue encadenando"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.surtifamiliar_spider import SurtifamiliarSpider
+
+        spider = SurtifamiliarSpider.from_crawler(get_crawler(SurtifamiliarSpider))
+        tarjetas = "".join(
+            f'<div class="box-product-item"><h4>Producto {n}</h4><span class="price">$ 1.{n:03d}</span>'
+            f'<a href="/p/{n}"></a></div>'
+            for n in range(12)
+        )
+        # ngb-pagination de una categoria con mas paginas: solo se ve la ventana 1 a 5
+        paginador = '<ul class="pagination">' + "".join(
+            f'<li><a class="page-link">{n}</a></li>' for n in range(1, 6)
+        ) + '<li><a class="page-link">»</a></li></ul>'
+
+        url = "https://surtifamiliar.com/verduras/products"
+        peticiones = self.peticiones(spider.parse(self.respuesta(url, tarjetas + paginador, pageNumber=1, categoria="Verduras")))
+        assert [p.meta["pageNumber"] for p in peticiones] == [2, 3, 4, 5]
+        assert all(p.meta["paginas"] == 5 for p in peticiones[:-1])
+        assert "paginas" not in peticiones[-1].meta and peticiones[-1].meta["por_pagina"] == 12
+
+        # La pagina 5 esta llena: pide la 6 aunque el paginador de la pagina 1 terminara en 5
+        quinta = self.respuesta(peticiones[-1].url, tarjetas + paginador, pageNumber=5, categoria="Verduras", por_pagina=12)
+        siguiente, = self.peticiones(spider.parse(quinta))
+        assert siguiente.meta["pageNumber"] == 6 and "paginas" not in siguiente.meta
+
+    def test_exito_total_de_productos(self):
+        """Test que con el total de productos en la pagina 1 se piden todas las paginas y nada mas"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.exito_spider import ExitoSpider
+
+        spider = ExitoSpider.from_crawler(get_crawler(ExitoSpider))
+        html = '<div data-fs-product-listing-results-count data-count="1.007"></div>' + self.tarjetas_exito(16)
+        url = "https://www.exito.com/mercado/despensa"
+        peticiones = self.peticiones(spider.parse(self.respuesta(url, html, page=1, categoria="Despensa")))
+
+        # 1007 productos / 16 por pagina = 63 paginas
+        assert [p.meta["page"] for p in peticiones] == list(range(2, 64))
+        assert peticiones[0].url == f"{url}?page=2"
+
+    def test_exito_sin_total_para_en_la_pagina_incompleta(self):
+        """Test que sin total se sigue pagina a pagina y una pagina incompleta es la ultima, sin pedir otra vacia"""
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.exito_spider import ExitoSpider
+
+        spider = ExitoSpider.from_crawler(get_crawler(ExitoSpider))
+        url = "https://www.exito.com/mercado/despensa"
+        siguiente, = self.peticiones(spider.parse(self.respuesta(url, self.tarjetas_exito(16), page=1, categoria="Despensa")))
+        assert siguiente.meta["page"] == 2 and siguiente.meta["por_pagina"] == 16
+
+        ultima = self.respuesta(siguiente.url, self.tarjetas_exito(5), page=2, categoria="Despensa", por_pagina=16)
+        assert self.peticiones(spider.parse(ultima)) == []
@@ -0,0 +1,235 @@
+from unittest.mock import MagicMock
+
+from tests.helpers import cargar_fixture, crawl_local, PaginaPool
+
+
+class TestCatalogoVtex:
+    """Tests para el modo API de VTEX de Exito y Carulla"""
+
+    def test_url_busqueda(self):
+        """Test que la categoria se traduce a la ruta de la API con map y el rango de la pagina"""
+        from scrappers.precio_scrapers.vtex import url_busqueda, ultima_pagina
+
+        assert url_busqueda("https://www.exito.com/mercado/despensa", pagina=3) == (
+            "https://www.exito.com/api/catalog_system/pub/products/search/mercado/despensa"
+            "?map=c%2Cc&_from=100&_to=149"
+        )
+        assert ultima_pagina(312) == 7
+        assert ultima_pagina(10_000) == 51
+
+    def test_mapeo_del_json_grabado(self):
+        """Test que se toman precio, precio de lista, marca, EAN e imagen del vendedor por defecto"""
+        from scrappers.precio_scrapers.vtex import productos_vtex
+
+        productos = productos_vtex(cargar_fixture("vtex_despensa.json"))
+
+        # Las lentejas estan agotadas (precio 0)
+        assert [p["nombre"] for p in productos] == [
+            "Arroz Diana Premium 1000 g", "Aceite de Girasol Premier 900 ml", "Sal Refisal 1000 g",
+        ]
+        arroz, aceite, sal = productos
+        assert arroz["precio"] == 5290.0 and arroz["precio_lista"] == 5890.0
+        assert arroz["ean"] == "7702511000014" and arroz["marca"] == "DIANA"
+        assert arroz["imagen"].endswith("arroz-diana.jpg")
+        assert aceite["precio"] == 12450.0 and aceite["vendedor"] == "Exito"
+        assert sal["url"] == "/sal-refisal-1000-g-445566/p"
+
+    def test_crawl_contra_servidor_local(self, servidor_vtex, tmp_path):
+        """Test que el spider pagina la API del servidor local sin navegador y arma los items"""
+        from datetime import datetime
+        from scrappers.precio_scrapers.items import FORMATO_FECHA
+
+        base, pedidas = servidor_vtex
+        items = crawl_local(
+            "scrappers.precio_scrapers.spiders.exito_spider.ExitoSpider", base, tmp_path / "items.json",
+            {"VTEX_API_ENABLED": True, "VTEX_TAMANO_PAGINA": 2},
+        )
+
+        items = {item["nombre"]: item for item in items}
+        assert set(items) == {"Arroz Diana Premium 1000 g", "Aceite de Girasol Premier 900 ml", "Sal Refisal 1000 g"}
+        arroz = items["Arroz Diana Premium 1000 g"]
+        assert arroz["precio_actual"] == 5290.0
+        assert arroz["precio_anterior"] == 5890.0
+        assert arroz["descuento_porcentaje"] == 10.19
+        assert arroz["ean"] == "7702511000014"
+        assert arroz["presentacion"] == "1000 g"
+        # Misma fecha local que los items del DOM
+        assert datetime.strptime(arroz["fecha_extraccion"], FORMATO_FECHA)
+        assert items["Sal Refisal 1000 g"]["url"] == f"{base}/sal-refisal-1000-g-445566/p"
+        # 4 productos en paginas de 2: el total de la primera pagina lanza la segunda
+        assert sorted(p.split("_from=")[1].split("&")[0] for p in pedidas if "_from=" in p) == ["0", "2"]
+
+    def test_sin_productos_usa_playwright(self):
+        """Test que si la API no trae productos o falla, la categoria se pide con Playwright"""
+        from scrapy import Request
+        from scrapy.http import TextResponse
+        from scrapy.utils.test import get_crawler
+        from twisted.python.failure import Failure
+        from scrappers.precio_scrapers.spiders.carulla_spider import CarullaSpider
+
+        crawler = get_crawler(CarullaSpider, {"VTEX_API_ENABLED": True})
+        crawler.stats.open_spider()
+        spider = CarullaSpider.from_crawler(crawler)
+        request = spider.peticion_categoria("https://www.carulla.com/despensa", "Despensa")
+        assert "playwright" not in request.meta
+
+        vacia = TextResponse(request.url, body=b"[]", request=request)
+        fallback, = spider.parse_api(vacia)
+        assert fallback.url == "https://www.carulla.com/despensa"
+        assert fallback.meta["playwright"] and fallback.meta["categoria"] == "Despensa"
+
+        failure = Failure(ConnectionRefusedError())
+        failure.request = request
+        fallback, = spider.error_api(failure)
+        assert fallback.meta["playwright"]
+        assert crawler.stats.get_value("vtex/fallback_playwright") == 2
+
+
+class RespuestaXhr:
+    """Respuesta de Playwright simulada para la captura de JSON"""
+
+    def __init__(self, url, datos, tipo="fetch", status=200):
+        self.url = url
+        self.status = status
+        self.request = MagicMock(resource_type=tipo)
+        self.datos = datos
+
+    async def all_headers(self):
+        return {"content-type": "application/json"}
+
+    async def json(self):
+        if self.datos is None:
+            raise ValueError("no es JSON")
+        return self.datos
+
+
+class TestCapturaJson:
+    """Tests para los productos tomados del JSON que la pagina pide al renderizar"""
+
+    def test_formatos_faststore_y_catalogo(self):
+        """Test que se leen la grilla de FastStore y el formato de catalogo, sin repetidos ni agotados"""
+        from scrappers.precio_scrapers.captura import productos_capturados
+
+        faststore = cargar_fixture("faststore_productos.json")
+        io = {"data": {"productSearch": {"products": cargar_fixture("vtex_despensa.json")}}}
+        productos = productos_capturados([faststore, io, faststore])
+
+        assert [p["nombre"] for p in productos] == [
+            "Queso Parmesano Alpina 250 g", "Jamon Serrano Reserva 100 g",
+            "Arroz Diana Premium 1000 g", "Aceite de Girasol Premier 900 ml", "Sal Refisal 1000 g",
+        ]
+        queso = productos[0]
+        assert queso["precio"] == 21990.0 and queso["precio_lista"] == 24990.0
+        assert queso["marca"] == "Alpina" and queso["sku"] == "88001" and queso["ean"] == "7702001040015"
+        assert queso["url"] == "/queso-parmesano-alpina-250-g-88001/p"
+        assert productos[2]["sku"] == "445566"
+
+    async def test_captura_solo_las_llamadas_de_productos(self):
+        """Test que se leen solo las respuestas XHR/fetch de la grilla y esperar() aguarda las pendientes"""
+        from scrappers.precio_scrapers.captura import CapturaJson
+
+        captura = CapturaJson()
+        grilla = cargar_fixture("faststore_productos.json")
+        captura(RespuestaXhr("https://www.carulla.com/api/graphql?operationName=ProductsQuery", grilla))
+        captura(RespuestaXhr("https://www.carulla.com/api/graphql?operationName=Menu", None))
+        captura(RespuestaXhr("https://www.carulla.com/api/graphql", grilla, tipo="document"))
+        captura(RespuestaXhr("https://www.carulla.com/api/sessions", {"id": 1}))
+
+        assert await captura.esperar(page=None) == {"capturas": 1}
+        assert captura.payloads == [grilla] and captura.errores == 1
+
+    def test_carulla_usa_el_json_y_si_no_el_dom(self):
+        """Test que Carulla arma los items del JSON capturado y sin payloads extrae del DOM"""
+        from pathlib import Path
+        from scrapy.http import HtmlResponse
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.carulla_spider import CarullaSpider
+
+        crawler = get_crawler(CarullaSpider, {"CAPTURA_JSON_ENABLED": True})
+        crawler.stats.open_spider()
+        spider = CarullaSpider.from_crawler(crawler)
+        html = (Path(__file__).parent.parent / "scrappers" / "precio_scrapers" / "carulla_page.html").read_bytes()
+
+        def parse(payloads):
+            request = spider.peticion_playwright("https://www.carulla.com/delicatessen", "Delicatessen")
+            captura = request.meta["captura_json"]
+            assert request.meta["playwright_page_event_handlers"] == {"response": captura}
+            captura.payloads.extend(payloads)
+            response = HtmlResponse(request.url, body=html, encoding="utf-8", request=request)
+            return [i for i in spider.parse(response) if isinstance(i, dict)]
+
+        items = parse([cargar_fixture("faststore_productos.json")])
+        assert [i["nombre"] for i in items] == ["Queso Parmesano Alpina 250 g", "Jamon Serrano Reserva 100 g"]
+        assert items[0]["precio_anterior"] == 24990.0 and items[0]["marca"] == "Alpina"
+        assert items[0]["sku"] == "88001" and items[0]["url"] == "https://www.carulla.com/queso-parmesano-alpina-250-g-88001/p"
+
+        dom = parse([])
+        assert len(dom) > 2 and "sku" not in dom[0]
+        assert crawler.stats.get_value("captura/productos") == 2
+        assert crawler.stats.get_value("captura/fallback_dom") == 1
+
+    def test_carulla_producto_sin_slug(self):
+        """Test que un nodo sin slug toma la URL de la pagina y no corta el resto de la pagina"""
+        import copy
+        from scrapy.http import HtmlResponse
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.spiders.carulla_spider import CarullaSpider
+
+        crawler = get_crawler(CarullaSpider, {"CAPTURA_JSON_ENABLED": True})
+        crawler.stats.open_spider()
+        spider = CarullaSpider.from_crawler(crawler)
+        grilla = copy.deepcopy(cargar_fixture("faststore_productos.json"))
+        del grilla["data"]["search"]["products"]["edges"][0]["node"]["slug"]
+
+        request = spider.peticion_playwright("https://www.carulla.com/delicatessen", "Delicatessen")
+        request.meta["captura_json"].payloads.append(grilla)
+        html = b'<html><body><a rel="next" href="/delicatessen?page=2">2</a></body></html>'
+        salida = list(spider.parse(HtmlResponse(request.url, body=html, request=request)))
+
+        items = [s for s in salida if isinstance(s, dict)]
+        assert [i["url"] for i in items] == [
+            "https://www.carulla.com/delicatessen",
+            "https://www.carulla.com/jamon-serrano-reserva-100-g-88002/p",
+        ]
+        siguiente, = [s for s in salida if not isinstance(s, dict)]
+        assert siguiente.meta["page"] == 2
+
+    def test_d1_mismos_precios_que_vtex(self):
+        """Test que D1 calcula precio anterior y descuento igual que los items de la API de VTEX"""
+        from scrapy.http import HtmlResponse
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.captura import productos_capturados
+        from scrappers.precio_scrapers.spiders.d1_spider import D1Spider
+        from scrappers.precio_scrapers.spiders.exito_spider import ExitoSpider
+
+        productos = productos_capturados([cargar_fixture("vtex_despensa.json")])
+        d1 = D1Spider.from_crawler(get_crawler(D1Spider))
+        exito = ExitoSpider.from_crawler(get_crawler(ExitoSpider))
+        response = HtmlResponse("https://domicilios.tiendasd1.com/ca/aseo-hogar", body=b"")
+
+        campos = ("precio_actual", "precio_anterior", "descuento_porcentaje")
+        for producto in productos:
+            item_d1 = d1.item_capturado(producto, response)
+            item_vtex = exito.item_vtex(producto, "Despensa", response)
+            assert [item_d1[c] for c in campos] == [item_vtex[c] for c in campos]
+        assert d1.item_capturado(productos[0], response)["descuento_porcentaje"] == 10.19
+
+    async def test_pool_quita_los_manejadores(self, spider):
+        """Test que la pagina devuelta al pool no conserva el manejador de la peticion anterior"""
+        from scrapy import Request
+        from scrapy.http import HtmlResponse
+        from scrapy.utils.test import get_crawler
+        from scrappers.precio_scrapers.captura import CapturaJson
+        from scrappers.precio_scrapers.middlewares import PoolPaginasMiddleware
+        from scrappers.precio_scrapers.paginas import PoolPaginas
+
+        middleware = PoolPaginasMiddleware(get_crawler().stats, PoolPaginas(max_paginas=1))
+        captura = CapturaJson()
+        request = Request("https://www.carulla.com/quesos", meta={"playwright": True, **captura.meta()})
+        await middleware.process_request(request, spider)
+        pagina = PaginaPool()
+        pagina.remove_listener = MagicMock()
+        request.meta["playwright_page"] = pagina
+        await middleware.process_response(request, HtmlResponse(request.url, request=request), spider)
+
+        pagina.remove_listener.assert_called_once_with("response", captura)